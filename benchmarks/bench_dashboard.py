@@ -0,0 +1,208 @@
+"""
+Time every dashboard data function against synthetic data in a local MongoDB.
+
+For each collection size, the runner fills a dedicated database with
+benchmarks/generate_data.py (reused if it already holds that many
+documents), then, in a fresh process, times each get_* function,
+generate_raw_data_excel and a full main() render. Results cached by the
+dashboard are dropped before every call, so each timing includes its
+queries. It reports the first (cold) call, p50/p95/max over the repeats,
+the peak Python memory of one call (tracemalloc) and the peak RSS of the
+whole run.
+
+The dashboard's own settings apply, e.g. DASHBOARD_QUERY_MODE=parallel or
+DASHBOARD_USE_ROLLUP=0 benchmark those code paths.
+
+Usage:
+    python benchmarks/bench_dashboard.py [--sizes 10000,1000000,10000000] [--repeat 5]
+                                         [--uri URI] [--skip-export] [--skip-render] [--json FILE]
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pymongo
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DASHBOARD_PATH = os.path.join(REPO_DIR, "full-report.py")
+
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_data import populate  # noqa: E402
+
+DEFAULT_SIZES = "10000,1000000,10000000"
+
+
+def load_dashboard():
+    """Import full-report.py as a module (its main() only runs under streamlit run)."""
+    # Streamlit warns about every st.* call made outside `streamlit run`
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    spec = importlib.util.spec_from_file_location("dashboard", DASHBOARD_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def dashboard_cases(dashboard, skip_export=False):
+    """(name, callable) pairs for every data function."""
+    now = datetime.utcnow()
+    cases = [
+        ("get_total_engagements", dashboard.get_total_engagements),
+        ("get_successful_engagements", dashboard.get_successful_engagements),
+        ("get_success_ratio", dashboard.get_success_ratio),
+        ("get_engagement_time_series", dashboard.get_engagement_time_series),
+        ("get_engagement_time_series_with_filter (30d)",
+         lambda: dashboard.get_engagement_time_series_with_filter(now - timedelta(days=30), now)),
+        ("get_leaderboard_page (celebrities)", lambda: dashboard.get_leaderboard_page("celebrities")),
+        ("get_leaderboard_page (users)", lambda: dashboard.get_leaderboard_page("users")),
+        ("get_rerun_comparison_data", dashboard.get_rerun_comparison_data),
+        ("get_dashboard_metrics", dashboard.get_dashboard_metrics),
+        ("get_dashboard_metrics_concurrently", dashboard.get_dashboard_metrics_concurrently),
+    ]
+    if not skip_export:
+        cases.append(("generate_raw_data_excel", dashboard.generate_raw_data_excel))
+    return cases
+
+
+def measure(func, repeat, reset):
+    """
+    Time `func` once cold, `repeat` more times, then once under tracemalloc.
+
+    Returns:
+        dict: first, p50, p95 and max seconds, and peak_mib
+    """
+    def call():
+        reset()
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started
+
+    first = call()
+    times = [call() for _ in range(repeat)] or [first]
+
+    # Memory is measured separately, tracemalloc slows allocations down
+    reset()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "first": first,
+        "p50": float(np.percentile(times, 50)),
+        "p95": float(np.percentile(times, 95)),
+        "max": max(times),
+        "peak_mib": peak / 1024 / 1024,
+    }
+
+
+def render_case():
+    """A full main() render through Streamlit's AppTest."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(DASHBOARD_PATH, default_timeout=3600)
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+
+
+def run_worker(args):
+    """Benchmark one database in this process and print the results as JSON."""
+    dashboard = load_dashboard()
+    from cache import result_cache
+
+    cases = dashboard_cases(dashboard, args.skip_export)
+    if not args.skip_render:
+        cases.append(("main() render", render_case))
+
+    results = {}
+    for name, func in cases:
+        repeat = 1 if name == "generate_raw_data_excel" else args.repeat
+        if name == "main() render":
+            repeat = min(args.repeat, 3)
+        try:
+            results[name] = measure(func, repeat, result_cache.invalidate)
+            print(f"  {name}: {results[name]['p50']:.3f}s", file=sys.stderr)
+        except Exception as e:
+            results[name] = {"error": str(e)}
+            print(f"  {name}: failed: {e}", file=sys.stderr)
+    peak_rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"results": results, "peak_rss_mib": peak_rss_mib}))
+
+
+def prepare_database(uri, database, size):
+    """Fill `database` with `size` synthetic documents unless it already has them."""
+    client = pymongo.MongoClient(uri)
+    db = client[database]
+    if db["twitter_actions"].estimated_document_count() != size:
+        print(f"Generating {size:,} documents in {database}", file=sys.stderr)
+        # Start from a clean database, including the rollup and its watermark
+        client.drop_database(database)
+        populate(db["twitter_actions"], size)
+    client.close()
+
+
+def print_table(size, report):
+    print(f"\n{size:,} documents (peak RSS {report['peak_rss_mib']:.0f} MiB)")
+    print(f"{'function':46} {'first':>8} {'p50':>8} {'p95':>8} {'max':>8} {'peak MiB':>9}")
+    for name, row in report["results"].items():
+        if "error" in row:
+            print(f"{name:46} failed: {row['error']}")
+            continue
+        print(
+            f"{name:46} {row['first']:8.3f} {row['p50']:8.3f} {row['p95']:8.3f} "
+            f"{row['max']:8.3f} {row['peak_mib']:9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard data functions")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated collection sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed calls per function")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--skip-export", action="store_true", help="Don't time generate_raw_data_excel")
+    parser.add_argument("--skip-render", action="store_true", help="Don't time the main() render")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    reports = {}
+    for size in [int(value) for value in args.sizes.split(",")]:
+        database = f"tweetbot_bench_{size}"
+        prepare_database(args.uri, database, size)
+        # A fresh process per size, so no client, rollup or snapshot state carries over
+        env = dict(os.environ, MONGODB_URI=args.uri, MONGODB_DATABASE=database)
+        command = [sys.executable, os.path.abspath(__file__), "--worker", "--repeat", str(args.repeat)]
+        if args.skip_export:
+            command.append("--skip-export")
+        if args.skip_render:
+            command.append("--skip-render")
+        print(f"Benchmarking {database}", file=sys.stderr)
+        output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True, cwd=REPO_DIR)
+        reports[size] = json.loads(output.stdout.strip().splitlines()[-1])
+        print_table(size, reports[size])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
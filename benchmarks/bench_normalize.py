@@ -0,0 +1,83 @@
+"""
+Compare the export's original row-by-row date cleanup with normalize_dates().
+
+Usage:
+    python benchmarks/bench_normalize.py [rows]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normalize import EXPORT_DATE_FORMAT, normalize_dates  # noqa: E402
+
+
+def mixed_dates(rows, seed=42):
+    """Date column shaped like twitter_actions: mostly BSON dates, some strings and gaps."""
+    rng = np.random.default_rng(seed)
+    base = datetime(2025, 3, 1)
+    offsets = rng.integers(0, 90 * 24 * 3600, rows)
+    kinds = rng.random(rows)
+    values = np.empty(rows, dtype=object)
+    for i in range(rows):
+        moment = base + timedelta(seconds=int(offsets[i]), microseconds=250000)
+        if kinds[i] < 0.80:
+            values[i] = moment
+        elif kinds[i] < 0.95:
+            values[i] = moment.strftime('%Y-%m-%d %H:%M:%S.%f')
+        elif kinds[i] < 0.98:
+            values[i] = None
+        else:
+            values[i] = "not a date"
+    return pd.Series(values, dtype=object)
+
+
+def legacy_normalize(series):
+    """The three .apply passes generate_raw_data_excel used to run."""
+    series = series.apply(lambda x: str(x) if not isinstance(x, (str, datetime)) else x)
+
+    def safe_date_parse(date_str):
+        try:
+            if pd.isna(date_str) or date_str == '':
+                return date_str
+            return pd.to_datetime(date_str)
+        except Exception:
+            return date_str
+
+    series = series.apply(safe_date_parse)
+    return series.apply(
+        lambda x: x.strftime(EXPORT_DATE_FORMAT) if isinstance(x, datetime) else x
+    )
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    series = mixed_dates(rows)
+    print(f"Normalizing {rows:,} mixed date values")
+
+    vectorized, vectorized_s = timed(normalize_dates, series, EXPORT_DATE_FORMAT)
+    print(f"normalize_dates: {vectorized_s:8.2f}s")
+
+    legacy, legacy_s = timed(legacy_normalize, series)
+    print(f"legacy .apply:   {legacy_s:8.2f}s")
+    print(f"speedup:         {legacy_s / vectorized_s:8.1f}x")
+
+    # Both must agree, except that legacy turns missing values into the string "None"
+    comparable = series.notna()
+    mismatches = (vectorized[comparable] != legacy[comparable]).sum()
+    print(f"mismatches:      {mismatches:8d}")
+
+
+if __name__ == "__main__":
+    main()
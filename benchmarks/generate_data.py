@@ -0,0 +1,170 @@
+"""
+Write synthetic twitter_actions documents into a MongoDB database.
+
+The documents follow the schema the bot writes (see dataframe.log):
+profile_id, date, name, action, post_content, username,
+translated_comments, media_link, result, rerun, id and date_only, with
+the same quirks: most dates are BSON dates but some are strings or
+missing, results read "Like Success through link" or "Failed to Perform
+task", and celebrity usernames vary in case.
+
+Usage:
+    python benchmarks/generate_data.py COUNT [--database NAME] [--uri URI] [--drop]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pymongo
+
+DEFAULT_DATABASE = "tweetbot_bench"
+DEFAULT_BATCH_SIZE = 10000
+
+ACTIONS = ["like", "retweet", "comment"]
+ACTION_WEIGHTS = [0.45, 0.25, 0.30]
+SUCCESS_RESULTS = {
+    "like": "Like Success through link",
+    "retweet": "Retweet Success through link",
+    "comment": "Comment Success through link",
+}
+FAILED_RESULT = "Failed to Perform task"
+
+FIRST_NAMES = ["SENTHIL", "DHANDAPANI", "AATHISESHAN", "VINOTHANAN", "KARTHIK", "PRIYA", "LAKSHMI",
+               "ARUN", "DIVYA", "SURESH", "MEENA", "RAJESH", "KAVYA", "GANESH", "ANITHA"]
+LAST_NAMES = ["MAANIKAM", "MURUGESAN", "VELU", "BALU", "KUMAR", "RAJAN", "SUNDARAM", "PANDIAN",
+              "SELVAM", "NATARAJAN"]
+CELEBRITIES = ["actorvijay", "ARRahman", "imVkohli", "msdhoni", "Suriya_offl", "rajinikanth",
+               "trishtrashers", "anirudhofficial", "Karthi_Offl", "dhanushkraja", "sachin_rt",
+               "iamsrk", "SrBachchan", "narendramodi", "mkstalin", "KamalHaasan", "Samanthaprabhu2",
+               "ActorMadhavan", "Atlee_dir", "shankarshanmugh"]
+COMMENTS = ["Great news!", "Congratulations!", "All the best", "Waiting for this",
+            "Superb", "Mass!", "Proud moment", "Well said"]
+
+
+def profiles(count, rng):
+    """Bot profiles: a stable profile_id per generated display name."""
+    names = [f"{rng.choice(FIRST_NAMES)}_{rng.choice(LAST_NAMES)}" for _ in range(count)]
+    return [(str(uuid.UUID(bytes=rng.bytes(16), version=4)), name) for name in names]
+
+
+def generate_actions(count, seed=42, start=None, days=120, batch_size=DEFAULT_BATCH_SIZE,
+                     profile_count=500):
+    """
+    Yield batches of synthetic action documents.
+
+    Args:
+        count (int): Documents to generate
+        seed (int): Random seed, so runs are reproducible
+        start (datetime, optional): First action date, `days` before now by default
+        days (int): Span of the action dates
+        batch_size (int): Documents per yielded list
+        profile_count (int): Distinct bot profiles
+
+    Yields:
+        list[dict]: Up to batch_size documents
+    """
+    rng = np.random.default_rng(seed)
+    start = start or datetime.utcnow() - timedelta(days=days)
+    pool = profiles(profile_count, rng)
+    # A few celebrities get most of the engagement
+    celebrity_weights = 1 / np.arange(1, len(CELEBRITIES) + 1)
+    celebrity_weights /= celebrity_weights.sum()
+    span_ms = days * 24 * 3600 * 1000
+
+    for first in range(0, count, batch_size):
+        size = min(batch_size, count - first)
+        offsets = np.sort(rng.integers(0, span_ms, size))
+        actions = rng.choice(ACTIONS, size, p=ACTION_WEIGHTS)
+        profile_idx = rng.integers(0, len(pool), size)
+        celebrity_idx = rng.choice(len(CELEBRITIES), size, p=celebrity_weights)
+        outcome = rng.random(size)
+        date_kind = rng.random(size)
+        case_kind = rng.random(size)
+
+        batch = []
+        for i in range(size):
+            moment = start + timedelta(milliseconds=int(offsets[i]))
+            action = str(actions[i])
+            profile_id, name = pool[profile_idx[i]]
+            celebrity = CELEBRITIES[celebrity_idx[i]]
+            if case_kind[i] < 0.1:
+                celebrity = celebrity.lower()
+            post_id = int(rng.integers(10**17, 10**18))
+
+            # ~90% succeed at once; half of the failures succeed on the rerun
+            if outcome[i] < 0.90:
+                result, rerun = SUCCESS_RESULTS[action], ""
+            elif outcome[i] < 0.95:
+                result, rerun = FAILED_RESULT, "Success"
+            else:
+                result, rerun = FAILED_RESULT, "Failed"
+
+            # Mixed-type dates, as older bot versions wrote strings
+            if date_kind[i] < 0.85:
+                date, date_only = moment, datetime(moment.year, moment.month, moment.day)
+            elif date_kind[i] < 0.95:
+                date, date_only = moment.strftime('%Y-%m-%d %H:%M:%S.%f'), moment.strftime('%Y-%m-%d')
+            else:
+                date, date_only = moment, None
+
+            doc = {
+                "profile_id": profile_id,
+                "date": date,
+                "name": name,
+                "action": action,
+                "post_content": f"Post by @{celebrity} #{post_id % 1000}",
+                "username": f"@{celebrity}",
+                "translated_comments": str(rng.choice(COMMENTS)) if action == "comment" else "",
+                "media_link": f"https://x.com/{celebrity}/status/{post_id}",
+                "result": result,
+                "rerun": rerun,
+                "id": first + i + 1,
+            }
+            if date_only is not None:
+                doc["date_only"] = date_only
+            batch.append(doc)
+        yield batch
+
+
+def populate(collection, count, seed=42, batch_size=DEFAULT_BATCH_SIZE, progress=True):
+    """
+    Insert `count` synthetic documents into `collection`.
+
+    Returns:
+        float: Seconds taken
+    """
+    started = time.perf_counter()
+    written = 0
+    for batch in generate_actions(count, seed=seed, batch_size=batch_size):
+        collection.insert_many(batch, ordered=False)
+        written += len(batch)
+        if progress:
+            print(f"\r{written:,} / {count:,} documents", end="", file=sys.stderr)
+    if progress:
+        print(file=sys.stderr)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic twitter_actions documents")
+    parser.add_argument("count", type=int, help="Documents to write")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default=DEFAULT_DATABASE)
+    parser.add_argument("--drop", action="store_true", help="Drop twitter_actions first")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    client = pymongo.MongoClient(args.uri)
+    collection = client[args.database]["twitter_actions"]
+    if args.drop:
+        collection.drop()
+    seconds = populate(collection, args.count, seed=args.seed)
+    print(f"Wrote {args.count:,} documents to {args.database}.twitter_actions in {seconds:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
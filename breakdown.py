@@ -0,0 +1,149 @@
+"""
+Engagements per time bucket broken down by action class and outcome.
+
+One $group on (bucket, action class, outcome) returns every combination's
+count; the trend chart's stacked views (by action, by outcome) are both
+pivoted from that single result set. The outcomes follow the success KPI:
+"success" on the first run, "recovered" when a failed action succeeded on
+rerun, and "unsuccessful" for everything else.
+"""
+import pandas as pd
+
+from classify import INITIAL_OUTCOME_EXPR, RERUN_OUTCOME_EXPR
+from logger import setup_logger
+from metrics import (
+    CLASSIFIED_ACTION_EXPR, bucket_range, local_wall_time_expr, series_timezone, series_unit, to_utc
+)
+from rollup import ROLLUP_COLLECTION
+
+logger = setup_logger(__name__)
+
+# Stacking order of each breakdown, bottom first
+ACTION_CLASSES = ("likes", "retweets", "comments")
+OUTCOMES = ("success", "recovered", "unsuccessful")
+
+# Breakdown name -> (column, categories)
+BREAKDOWNS = {
+    "action": ("action_class", ACTION_CLASSES),
+    "outcome": ("outcome", OUTCOMES),
+}
+
+BREAKDOWN_COLUMNS = ['date', 'action_class', 'outcome', 'engagements']
+
+
+def outcome_expr(initial, rerun):
+    """Expression naming the outcome of an action from its initial and rerun outcomes."""
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": [initial, "success"]}, "then": "success"},
+                {"case": {"$and": [{"$eq": [initial, "failed"]}, {"$eq": [rerun, "success"]}]},
+                 "then": "recovered"},
+            ],
+            "default": "unsuccessful"
+        }
+    }
+
+
+def _project_buckets(bucket):
+    return {"$project": {
+        "_id": 0,
+        "bucket": bucket,
+        "action_class": "$_id.action_class",
+        "outcome": "$_id.outcome",
+        "engagements": 1,
+    }}
+
+
+def breakdown_stages(start_date, end_date, unit=None, tz=None):
+    """
+    Pipeline stages counting twitter_actions per (bucket, action class, outcome).
+
+    Buckets are truncated in the dashboard's time zone and returned as its
+    wall-clock times. Empty combinations are left out; breakdown_series()
+    fills them with zero.
+    """
+    unit = unit or series_unit(start_date, end_date)
+    tz = tz or series_timezone()
+    return [
+        {"$match": {"date": {"$gte": to_utc(start_date, tz), "$lte": to_utc(end_date, tz)}}},
+        {"$group": {
+            "_id": {
+                "bucket": {"$dateTrunc": {"date": "$date", "unit": unit, "timezone": tz, "startOfWeek": "monday"}},
+                "action_class": CLASSIFIED_ACTION_EXPR,
+                "outcome": outcome_expr(
+                    {"$ifNull": ["$initial_outcome", INITIAL_OUTCOME_EXPR]},
+                    {"$ifNull": ["$rerun_outcome", RERUN_OUTCOME_EXPR]},
+                ),
+            },
+            "engagements": {"$sum": 1}
+        }},
+        _project_buckets(local_wall_time_expr("$_id.bucket", tz)),
+    ]
+
+
+def rollup_breakdown_stages(start_date, end_date, unit="day"):
+    """
+    The same counts from the daily rollup (UTC days only), whose buckets
+    already hold the action class and outcomes.
+    """
+    day_start = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return [
+        {"$match": {"day": {"$gte": day_start, "$lte": end_date}}},
+        {"$group": {
+            "_id": {
+                "bucket": {"$dateTrunc": {"date": "$day", "unit": unit, "startOfWeek": "monday"}},
+                "action_class": "$action_class",
+                "outcome": outcome_expr("$initial_outcome", "$rerun_outcome"),
+            },
+            "engagements": {"$sum": "$count"}
+        }},
+        _project_buckets("$_id.bucket"),
+    ]
+
+
+def fetch_rollup_breakdown(db, start_date, end_date, unit="day"):
+    """Breakdown documents from the rollup collection."""
+    return list(db[ROLLUP_COLLECTION].aggregate(rollup_breakdown_stages(start_date, end_date, unit)))
+
+
+def breakdown_frame(docs):
+    """
+    Convert breakdown aggregation output into a DataFrame.
+
+    Returns:
+        pandas.DataFrame: BREAKDOWN_COLUMNS, one row per non-empty combination
+    """
+    df = pd.DataFrame(docs)
+    if df.empty:
+        return pd.DataFrame(columns=BREAKDOWN_COLUMNS)
+    df = df.rename(columns={"bucket": "date"})
+    df['date'] = pd.to_datetime(df['date'])
+    return df[BREAKDOWN_COLUMNS].sort_values('date', kind='stable').reset_index(drop=True)
+
+
+def breakdown_series(frame, breakdown, start_date, end_date, unit):
+    """
+    One stacked view of a breakdown frame: a column per category, gap-filled.
+
+    Args:
+        frame (pandas.DataFrame): breakdown_frame() output
+        breakdown (str): "action" or "outcome"
+        start_date (datetime): Start of the range
+        end_date (datetime): End of the range
+        unit (str): Bucket unit the frame was computed with
+
+    Returns:
+        pandas.DataFrame: 'date' plus one engagements column per category,
+        or empty if there are no engagements
+    """
+    if frame.empty:
+        return pd.DataFrame()
+    column, categories = BREAKDOWNS[breakdown]
+    wide = frame.pivot_table(index='date', columns=column, values='engagements', aggfunc='sum', fill_value=0)
+    wide = wide.reindex(
+        index=pd.DatetimeIndex(bucket_range(start_date, end_date, unit)), columns=list(categories), fill_value=0
+    )
+    wide.index.name = 'date'
+    wide.columns.name = None
+    return wide.reset_index()
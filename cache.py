@@ -0,0 +1,380 @@
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import pandas as pd
+
+from logger import setup_logger
+from tenant import current_tenant, existing_resources, tenant_resource
+
+logger = setup_logger(__name__)
+
+# Seconds a cached result stays fresh, per metric. Override any of them with
+# CACHE_TTL_<METRIC> (e.g. CACHE_TTL_TIME_SERIES=600) and the fallback with
+# CACHE_DEFAULT_TTL.
+DEFAULT_TTLS = {
+    "dashboard_metrics": 60,
+    "total_engagements": 60,
+    "successful_engagements": 60,
+    "celebrity_engagement": 300,
+    "user_engagement": 300,
+    "rerun_comparison": 120,
+    "time_series": 120,
+    "time_series_filtered": 120,
+    "time_series_breakdown": 120,
+    "leaderboard_page": 300,
+    "leaderboard_entries": 300,
+    "profile_performance": 300,
+}
+DEFAULT_TTL = 60
+
+# Memory budget of each tenant's cache; least recently used entries are
+# evicted first once it is exceeded
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Set by data functions that fell back to a default value after an error
+_skip_store = contextvars.ContextVar("cache_skip_store", default=False)
+
+# Memo of the script run in progress (see run_scope)
+_run_memo = contextvars.ContextVar("cache_run_memo", default=None)
+
+# How the last cached() call was answered: "memo", "hit", "miss" or "error"
+_last_status = contextvars.ContextVar("cache_last_status", default=None)
+
+
+def ttl_for(metric):
+    """Return the TTL in seconds configured for a metric."""
+    value = os.getenv(f"CACHE_TTL_{metric.upper()}")
+    if value not in (None, ""):
+        return float(value)
+    return DEFAULT_TTLS.get(metric, float(os.getenv("CACHE_DEFAULT_TTL", DEFAULT_TTL)))
+
+
+def estimate_size(value):
+    """
+    Rough number of bytes held by a cached value.
+
+    DataFrames report their deep memory usage, containers are summed
+    recursively and everything else falls back to sys.getsizeof.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + estimate_size(vars(value))
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Thread-safe TTL cache with least-recently-used eviction bounded by memory.
+
+    Entries are shared by every Streamlit session of a tenant in the
+    process. Hit, miss and eviction counters are kept per metric so TTLs can
+    be tuned.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (metric, expires_at, size, value)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {}
+
+    def _metric_stats(self, metric):
+        return self._stats.setdefault(metric, {"hits": 0, "misses": 0, "evictions": 0})
+
+    def _drop(self, key):
+        metric, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        return metric
+
+    def get(self, key, metric):
+        """
+        Look up a key.
+
+        Returns:
+            tuple: (found, value)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._metric_stats(metric)["hits"] += 1
+                return True, entry[3]
+            if entry is not None:
+                self._drop(key)
+            self._metric_stats(metric)["misses"] += 1
+            return False, None
+
+    def set(self, key, metric, value, ttl, size=None):
+        """
+        Store a value for `ttl` seconds, evicting LRU entries over budget.
+
+        `size` overrides estimate_size() for values it can't measure.
+        """
+        if size is None:
+            size = estimate_size(value)
+        if size > self.max_bytes:
+            logger.warning("Not caching %s: %s bytes exceeds the cache budget", metric, size)
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (metric, time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                evicted_metric = self._drop(oldest)
+                self._metric_stats(evicted_metric)["evictions"] += 1
+
+    def invalidate(self, metric=None):
+        """Drop every entry, or only the entries of one metric."""
+        with self._lock:
+            keys = [k for k, entry in self._entries.items() if metric is None or entry[0] == metric]
+            for key in keys:
+                self._drop(key)
+        logger.debug("Invalidated %s cached results%s", len(keys), " for %s" % metric if metric else "")
+        return len(keys)
+
+    def stats(self):
+        """
+        Per-metric counters for the dashboard.
+
+        Returns:
+            pandas.DataFrame: One row per metric with hits, misses, hit rate,
+            evictions, live entries, bytes and TTL
+        """
+        with self._lock:
+            entries = {}
+            sizes = {}
+            for metric, _, size, _ in self._entries.values():
+                entries[metric] = entries.get(metric, 0) + 1
+                sizes[metric] = sizes.get(metric, 0) + size
+            rows = []
+            for metric, counters in sorted(self._stats.items()):
+                lookups = counters["hits"] + counters["misses"]
+                rows.append({
+                    "metric": metric,
+                    "hits": counters["hits"],
+                    "misses": counters["misses"],
+                    "hit_rate": round(counters["hits"] / lookups * 100, 1) if lookups else 0.0,
+                    "evictions": counters["evictions"],
+                    "entries": entries.get(metric, 0),
+                    "bytes": sizes.get(metric, 0),
+                    "ttl_s": ttl_for(metric),
+                })
+        return pd.DataFrame(rows)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+def _create_tenant_cache():
+    max_bytes = current_tenant().cache_max_bytes or int(os.getenv("CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    return ResultCache(max_bytes)
+
+
+def tenant_cache():
+    """Return the current tenant's ResultCache, creating it on first use."""
+    return tenant_resource("result_cache", _create_tenant_cache, close=lambda cache: cache.invalidate())
+
+
+def all_cache_bytes():
+    """Bytes held by the caches of every tenant, without creating any."""
+    return sum(cache.size_bytes for cache in existing_resources("result_cache").values())
+
+
+class _TenantResultCache:
+    """
+    Stand-in for the current tenant's ResultCache.
+
+    Every tenant gets its own entries and memory budget, so one tenant's
+    results are never served to another or evicted by another's traffic.
+    """
+
+    def __getattr__(self, name):
+        return getattr(tenant_cache(), name)
+
+
+result_cache = _TenantResultCache()
+
+
+def dont_cache():
+    """
+    Keep the current call's return value out of the cache.
+
+    Data functions call this from their error handlers so a zero/empty
+    fallback isn't served for the whole TTL after a transient failure.
+    """
+    _skip_store.set(True)
+
+
+class RunMemo:
+    """
+    Results of the queries issued during one script run.
+
+    Each key maps to a Future so that identical calls made concurrently
+    wait for the first one instead of querying again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.duplicates = {}
+
+    def claim(self, key):
+        """
+        Return (future, owner): owner is True if the caller must compute the value.
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.duplicates[key[0]] = self.duplicates.get(key[0], 0) + 1
+                return future, False
+            future = Future()
+            self._futures[key] = future
+            return future, True
+
+    def put(self, key, value):
+        """Record an already known value unless the key is claimed."""
+        with self._lock:
+            if key not in self._futures:
+                future = Future()
+                future.set_result(value)
+                self._futures[key] = future
+
+    def forget(self, key):
+        with self._lock:
+            self._futures.pop(key, None)
+
+    @property
+    def duplicate_count(self):
+        return sum(self.duplicates.values())
+
+
+@contextmanager
+def run_scope(name="render"):
+    """
+    Deduplicate identical data-layer calls for the duration of one script run.
+
+    Logs how many duplicate queries were answered from the run's memo.
+    """
+    memo = RunMemo()
+    token = _run_memo.set(memo)
+    try:
+        yield memo
+    finally:
+        _run_memo.reset(token)
+        if memo.duplicate_count:
+            logger.info(
+                "%s: removed %s duplicate queries %s", name, memo.duplicate_count, memo.duplicates
+            )
+        else:
+            logger.debug("%s: no duplicate queries", name)
+
+
+def remember(metric, args, value):
+    """
+    Record a result obtained elsewhere (e.g. from the $facet engine) as the
+    answer to `metric(*args)` for the rest of the current run.
+    """
+    memo = _run_memo.get()
+    if memo is not None:
+        memo.put((metric, tuple(args), ()), value)
+
+
+def last_cache_status():
+    """How the most recent cached() call in this context was answered, or None."""
+    return _last_status.get()
+
+
+@contextmanager
+def cache_status_scope():
+    """Start the block with no cache status and restore the outer one afterwards."""
+    token = _last_status.set(None)
+    try:
+        yield
+    finally:
+        _last_status.reset(token)
+
+
+def _lookup_or_compute(key, metric, ttl, func, args, kwargs):
+    """
+    Serve `key` from the result cache or compute and store it.
+
+    Returns:
+        tuple: (value, cacheable) where cacheable is False for error fallbacks
+    """
+    found, value = result_cache.get(key, metric)
+    if found:
+        _last_status.set("hit")
+        return value, True
+
+    token = _skip_store.set(False)
+    try:
+        value = func(*args, **kwargs)
+        cacheable = not _skip_store.get()
+        if cacheable:
+            result_cache.set(key, metric, value, ttl if ttl is not None else ttl_for(metric))
+    finally:
+        _skip_store.reset(token)
+    _last_status.set("miss" if cacheable else "error")
+    return value, cacheable
+
+
+def cached(metric, ttl=None):
+    """
+    Decorator caching a data function's result under `metric`.
+
+    The cache key includes every argument, so e.g. each date range of the
+    filtered time series is cached separately. Inside a run_scope(),
+    repeated calls with the same arguments are answered from the run's memo
+    even if the cached entry expired or was evicted meanwhile. The
+    undecorated function is available as `.uncached`.
+
+    Args:
+        metric (str): Name used for TTL lookup, counters and invalidation
+        ttl (float, optional): TTL in seconds, overriding the configured one
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (metric, args, tuple(sorted(kwargs.items())))
+            memo = _run_memo.get()
+            if memo is not None:
+                future, owner = memo.claim(key)
+                if not owner:
+                    value = future.result()
+                    _last_status.set("memo")
+                    return value
+
+            try:
+                value, cacheable = _lookup_or_compute(key, metric, ttl, func, args, kwargs)
+            except BaseException as e:
+                if memo is not None:
+                    memo.forget(key)
+                    future.set_exception(e)
+                raise
+            if memo is not None:
+                if not cacheable:
+                    # Fallback values aren't reused; a later call may succeed
+                    memo.forget(key)
+                future.set_result(value)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,708 @@
+"""
+Plotly figure builders for the dashboard.
+
+Building a figure and validating it costs more than most of the cached
+queries behind it, and reruns usually redraw the same numbers. Each builder
+is therefore cached in the shared result cache under a fingerprint of its
+inputs (the data and the selected filter), so a rerun with unchanged data
+reuses the figure instead of rebuilding it. Cached figures are shared
+between sessions and must not be modified by the caller.
+
+This only saves building the figure: st.plotly_chart still serializes it to
+JSON on every rerun, which is a sizeable part of a chart's render time.
+"""
+import functools
+import hashlib
+import os
+from datetime import timedelta
+
+import pandas as pd
+import plotly.graph_objects as go
+
+from cache import estimate_size, result_cache
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Seconds a built figure is kept; entries are keyed by their data, so this
+# only bounds how long unused figures hold memory
+DEFAULT_FIGURE_TTL = 600
+
+# Cache size estimate of a figure: its template and layout, plus a multiple
+# of its input data (traces hold the values, labels and hover text)
+FIGURE_BASE_BYTES = 64 * 1024
+FIGURE_DATA_FACTOR = 10
+
+# Hover labels of the trend chart per bucket unit (days keep the per-filter labels)
+SERIES_HOVER_FORMATS = {"hour": "%b %d %H:00", "week": "Week of %B %d", "month": "%B %Y"}
+
+
+def _update(digest, value):
+    digest.update(type(value).__name__.encode())
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((list(value.columns), [str(dtype) for dtype in value.dtypes])).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(repr((value.name, str(value.dtype))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=repr):
+            _update(digest, key)
+            _update(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(str(len(value)).encode())
+        for item in value:
+            _update(digest, item)
+    else:
+        digest.update(repr(value).encode())
+    digest.update(b"\x00")
+
+
+def fingerprint(*values):
+    """
+    Hash of the builder inputs, hashing DataFrame contents instead of their identity.
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        _update(digest, value)
+    return digest.hexdigest()
+
+
+def cached_figure(name):
+    """
+    Decorator caching a figure builder by a fingerprint of its arguments.
+
+    Hits and misses are counted as metric `figure_<name>` in the result
+    cache statistics. The undecorated builder is available as `.uncached`.
+
+    A figure's cache size is estimated from its inputs, since measuring the
+    figure itself means serializing it. A hit skips building the figure, not
+    serializing it: st.plotly_chart still converts it to JSON on each rerun.
+
+    Args:
+        name (str): Chart name
+    """
+    metric = f"figure_{name}"
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (metric, fingerprint(args, kwargs))
+            found, figure = result_cache.get(key, metric)
+            if found:
+                return figure
+            figure = func(*args, **kwargs)
+            ttl = float(os.getenv("CACHE_TTL_FIGURES", DEFAULT_FIGURE_TTL))
+            size = FIGURE_BASE_BYTES + FIGURE_DATA_FACTOR * estimate_size((args, kwargs))
+            result_cache.set(key, metric, figure, ttl, size=size)
+            return figure
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def get_max_text_padding(values):
+    """Padding to the right of the longest bar, so its text label fits."""
+    max_value = max(values)
+    return max_value * 0.15  # 15% padding for text
+
+
+@cached_figure("success_ratio")
+def success_ratio_figure(success_ratio):
+    """
+    Donut chart of successful vs failed engagements.
+
+    Args:
+        success_ratio (float): Percentage of successful engagements
+
+    Returns:
+        plotly.graph_objects.Figure: Figure (shared, don't modify)
+    """
+    # Success ratio donut chart
+    fig_success = go.Figure(data=[go.Pie(
+        labels=['Successful', 'Failed'],
+        values=[success_ratio, 100 - success_ratio],
+        hole=0.7,
+        textinfo='none',
+        marker=dict(
+            colors=['#3B7D23', '#D9D9D9'],
+            line=dict(color='white', width=2)
+        )
+    )])
+
+    fig_success.update_layout(
+        showlegend=False,
+        margin=dict(t=0, b=0, l=0, r=0),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        height=250,
+        width=None,
+        annotations=[dict(
+            text=f"{success_ratio:.1f}%",
+            x=0.5, y=0.5,
+            font=dict(size=28, color='#6c3c00', family='Arial Black'),
+            showarrow=False
+        )]
+    )
+
+    return fig_success
+
+
+@cached_figure("rerun_comparison")
+def rerun_comparison_figure(rerun_data):
+    """
+    Initial run vs rerun bars for likes, retweets and comments.
+
+    Args:
+        rerun_data (dict): {"initial": {...}, "rerun": {...}} counts per action class
+
+    Returns:
+        plotly.graph_objects.Figure: Figure (shared, don't modify)
+    """
+    # Create figure
+    fig_combined = go.Figure()
+
+    # Add Initial Run bars (positioned at x=0,1,2)
+    fig_combined.add_trace(go.Bar(
+        name='Initial Run',
+        x=[0, 1, 2],  # Left side positions
+        y=[
+            rerun_data['initial']['likes'],
+            rerun_data['initial']['retweets'],
+            rerun_data['initial']['comments']
+        ],
+        marker_color=['#5CB338', '#FB4141', '#FFC145'],  # Keeping the original bar colors
+        text=[
+            rerun_data['initial']['likes'],
+            rerun_data['initial']['retweets'],
+            rerun_data['initial']['comments']
+        ],
+        textposition='outside',
+        textfont=dict(size=14   , color='#000000', family='Arial Black'),
+        width=0.8,
+        showlegend=False  # Remove legend
+    ))
+
+    # Add Rerun bars (positioned at x=4,5,6)
+    fig_combined.add_trace(go.Bar(
+        name='Rerun',
+        x=[4, 5, 6],  # Right side positions
+        y=[
+            rerun_data['rerun']['likes'],
+            rerun_data['rerun']['retweets'],
+            rerun_data['rerun']['comments']
+        ],
+        marker_color=['#5CB338', '#FB4141', '#FFC145'],  # Keeping the original bar colors
+        text=[
+            rerun_data['rerun']['likes'],
+            rerun_data['rerun']['retweets'],
+            rerun_data['rerun']['comments']
+        ],
+        textposition='outside',
+        textfont=dict(size=14, color='#000000', family='Arial Black'),
+        width=0.8,
+        showlegend=False  # Remove legend
+    ))
+
+    # Update layout with improved background
+    fig_combined.update_layout(
+        # Background colors
+        plot_bgcolor='#FAF3E0',  # Cream background color
+        paper_bgcolor='#FAF3E0', # Same cream background
+
+        # Size and margins
+        height=520,  # Increased height for better visualization
+        margin=dict(l=40, r=40, t=60, b=50),  # Adjusted margins
+
+        # Hide axes
+        xaxis=dict(
+            showgrid=False,
+            showticklabels=False,  # Hide tick labels for a clean look
+            showline=False,
+            zeroline=False  # Remove zero line
+        ),
+        yaxis=dict(
+            showgrid=False,
+            showticklabels=False,  # Hide tick labels
+            showline=False,
+            zeroline=False  # Remove zero line
+        ),
+
+        # Add title with better styling
+        title=dict(
+            text='Initial Run vs Rerun Performance',
+            font=dict(size=16, color='#333333', family='Arial, sans-serif'),
+            x=0.5,  # Center title
+            y=0.98  # Adjusted position
+        )
+    )
+
+    # Find the maximum value across all bars
+    max_value = max([
+        rerun_data['initial']['likes'],
+        rerun_data['initial']['retweets'],
+        rerun_data['initial']['comments'],
+        rerun_data['rerun']['likes'],
+        rerun_data['rerun']['retweets'],
+        rerun_data['rerun']['comments']
+    ])
+
+    # Add some padding (20% more than max value)
+    y_axis_max = max_value * 1.2
+
+    # Update the layout with the new y-axis range
+    fig_combined.update_layout(
+        yaxis=dict(
+            range=[0, y_axis_max],  # Set the range from 0 to max_value + 20%
+            showgrid=False,
+            showticklabels=False,
+            showline=False,
+            zeroline=False
+        )
+    )
+
+    # Add a border around the entire plot
+    fig_combined.update_layout(
+        shapes=[
+            dict(
+                type='rect',
+                xref='paper', yref='paper',
+                x0=0, y0=0, x1=1, y1=1,
+                line=dict(color='#b0bec5', width=1),  # Softer gray border
+                fillcolor='rgba(0,0,0,0)'
+            )
+        ]
+    )
+
+    # Add labels above each set with adjusted positioning
+    fig_combined.add_annotation(
+        x=0.15,  # Moved left (was 0.25)
+        y=1.1,
+        text="Initial Run",
+        showarrow=False,
+        font=dict(size=14, color='#000000', family='Arial Black'),
+        xref="paper",
+        yref="paper",
+        xanchor='center',  # Center align text
+        yanchor='middle'
+    )
+    fig_combined.add_annotation(
+        x=0.85,  # Moved right (was 0.75)
+        y=1.1,
+        text="Rerun",
+        showarrow=False,
+        font=dict(size=14, color='#000000', family='Arial Black'),
+        xref="paper",
+        yref="paper",
+        xanchor='center',  # Center align text
+        yanchor='middle'
+    )
+
+    # Center the main title
+    fig_combined.update_layout(
+        title=dict(
+            text='Initial Run vs Rerun Performance',
+            font=dict(size=16, color='#333333', family='Arial Black'),
+            x=0.5,
+            y=0.95,
+            xanchor='center',
+            yanchor='top'
+        )
+    )
+
+    # Add metric labels below bars with centered positioning
+    for i, metric in enumerate(['Likes', 'Retweets', 'Comments']):
+        # Labels for Initial Run
+        fig_combined.add_annotation(
+            x=i,
+            y=-0.1,
+            text=metric,
+            showarrow=False,
+            font=dict(size=12, color='#000000', family='Arial Black'),
+            yshift=-10,
+            xanchor='center',  # Center align text
+            yanchor='top'
+        )
+        # Labels for Rerun
+        fig_combined.add_annotation(
+            x=i+4,
+            y=-0.1,
+            text=metric,
+            showarrow=False,
+            font=dict(size=12, color='#000000', family='Arial Black'),
+            yshift=-10,
+            xanchor='center',  # Center align text
+            yanchor='top'
+        )
+
+    return fig_combined
+
+
+@cached_figure("trend")
+def trend_figure(time_series_data, start_date, end_date, date_filter, series_bucket="day"):
+    """
+    Engagements over the selected date range.
+
+    Args:
+        time_series_data (pandas.DataFrame): Non-empty ['date', 'engagements'] buckets
+        start_date (datetime): Start of the selected range
+        end_date (datetime): End of the selected range
+        date_filter (str): "last7d", "last30d", "lastQ", "ytd" or "custom"
+        series_bucket (str): Bucket unit of the series ("hour", "day", "week" or "month")
+
+    Returns:
+        plotly.graph_objects.Figure: Figure (shared, don't modify)
+    """
+    # Filter out zero values for x-axis display
+    non_zero_data = time_series_data[time_series_data['engagements'] > 0]
+
+    # Find maximum value
+    max_value = time_series_data['engagements'].max()
+    if max_value == 0:
+        max_value = 1  # Prevent division by zero if no data
+
+    # Calculate a proportional minimum value based on max_value
+    fixed_min = -max_value * 0.05  # Just 5% of max value as padding below zero
+
+    fig_trends = go.Figure()
+
+    # Add the main trace
+    fig_trends.add_trace(go.Scatter(
+        x=time_series_data['date'],
+        y=time_series_data['engagements'],
+        mode='lines+markers+text',
+        name='Engagements',
+        line=dict(
+            color='#1DA1F2',
+            width=4,
+            shape='spline',
+            smoothing=1.3
+        ),
+        marker=dict(
+            size=[10 if val > 0 else 0 for val in time_series_data['engagements']],
+            color='#1DA1F2'
+        ),
+        text=[str(int(val)) if val > 0 else "" for val in time_series_data['engagements']],
+        textposition='top center',
+        textfont=dict(
+            size=14, 
+            color='#000000', 
+            family='Arial Black'
+        ),
+        showlegend=False
+    ))
+
+    fig_trends.update_layout(
+        plot_bgcolor='#FAF3E0',
+        paper_bgcolor='#FAF3E0',
+        height=400,
+        # Increase left and right margins to prevent label cropping
+        margin=dict(l=60, r=60, t=30, b=60),
+        yaxis=dict(
+            range=[fixed_min, max_value * 1.15],
+            showgrid=False,
+            showticklabels=True,
+            showline=True,
+            linewidth=1,
+            linecolor='black',
+            tickfont=dict(size=12, color='#000000', family='Arial Black'),
+            zeroline=True,
+            zerolinecolor='black',
+            zerolinewidth=1
+        ),
+        xaxis=dict(
+            showgrid=False,
+            showticklabels=True,
+            showline=True,
+            linewidth=1,
+            linecolor='black',
+            tickfont=dict(size=12, color='#000000', family='Arial Black'),
+            # Use non_zero_data for tick values
+            tickmode='array',
+            ticktext=[d.strftime("%b %d") for d in non_zero_data['date']],
+            tickvals=non_zero_data['date'],
+            range=[
+                start_date - timedelta(hours=12),  # Add padding to prevent label cropping
+                end_date + timedelta(hours=12)
+            ]
+        )
+    )
+
+    # Special handling for Last 7 days
+    if date_filter == "last7d":
+        # The range is exactly 7 days (default_series_window)
+        # Create array of all 7 dates regardless of data
+        all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
+
+        fig_trends.update_xaxes(
+            range=[
+                start_date - timedelta(hours=12),
+                end_date + timedelta(hours=12)
+            ],
+            tickmode='array',
+            ticktext=[d.strftime("%B %d") for d in all_dates],  # Changed to "March 14" format
+            tickvals=all_dates,
+            tickangle=0,  # Horizontal labels
+            tickfont=dict(size=10, color='#000000', family='Arial Black')  # Smaller font for longer labels
+        )
+    elif date_filter == "last30d":
+        # The range is exactly 30 days
+        fig_trends.update_xaxes(
+            range=[
+                start_date - timedelta(hours=12),  # Start from exactly 30 days ago
+                end_date + timedelta(hours=12)
+            ],
+            showticklabels=False,  # Hide x-axis labels
+            showline=True,
+            linewidth=1,
+            linecolor='black'
+        )
+
+        # Update hover template to show full date
+        fig_trends.update_traces(
+            hovertemplate="<b>%{x|%B %d}</b><br>" +
+                        "Engagements: %{y}<br>" +
+                        "<extra></extra>"
+        )
+    elif date_filter == "lastQ":
+        # The range starts at the beginning of the quarter
+        fig_trends.update_xaxes(
+            range=[
+                start_date - timedelta(hours=12),  # Start from beginning of quarter
+                end_date + timedelta(hours=12)
+            ],
+            showticklabels=False,  # Hide x-axis labels
+            showline=True,
+            linewidth=1,
+            linecolor='black'
+        )
+
+        # Update hover template to show full date
+        fig_trends.update_traces(
+            hovertemplate="<b>%{x|%B %d}</b><br>" +
+                        "Engagements: %{y}<br>" +
+                        "<extra></extra>"  # Removes trace name from hover
+        )
+    elif date_filter == "ytd":
+        # YTD date range is already calculated (Jan 1 to current date)
+        fig_trends.update_xaxes(
+            range=[
+                start_date - timedelta(hours=12),  # Start from Jan 1
+                end_date + timedelta(hours=12)
+            ],
+            showticklabels=False,  # Hide x-axis labels
+            showline=True,
+            linewidth=1,
+            linecolor='black'
+        )
+
+        # Update hover template to show full date
+        fig_trends.update_traces(
+            hovertemplate="<b>%{x|%B %d}</b><br>" +
+                        "Engagements: %{y}<br>" +
+                        "<extra></extra>"
+        )
+    elif date_filter == "custom":
+        fig_trends.update_xaxes(
+            range=[
+                start_date - timedelta(hours=12),
+                end_date + timedelta(hours=12)
+            ],
+            showticklabels=False,  # Hide x-axis labels
+            showline=True,
+            linewidth=1,
+            linecolor='black'
+        )
+
+        # Update hover template to show full date
+        fig_trends.update_traces(
+            hovertemplate="<b>%{x|%B %d}</b><br>" +
+                        "Engagements: %{y}<br>" +
+                        "<extra></extra>"
+        )
+    else:
+        # For Last 30 days and other ranges
+        fig_trends.update_xaxes(
+            range=[
+                non_zero_data['date'].min() - timedelta(hours=12),  # Align with first data point
+                non_zero_data['date'].max() + timedelta(hours=12)
+            ],
+            showticklabels=False,  # Hide x-axis labels
+            showline=True,
+            linewidth=1,
+            linecolor='black'
+        )
+
+        # Update hover template to show full date
+        fig_trends.update_traces(
+            hovertemplate="<b>%{x|%B %d}</b><br>" +
+                          "Engagements: %{y}<br>" +
+                          "<extra></extra>"  # Removes trace name from hover
+        )
+
+    # Label hours, weeks and months by their bucket instead of a day
+    if series_bucket != "day":
+        fig_trends.update_traces(
+            hovertemplate=f"<b>%{{x|{SERIES_HOVER_FORMATS[series_bucket]}}}</b><br>" +
+                        "Engagements: %{y}<br>" +
+                        "<extra></extra>"
+        )
+
+    # Update layout for both cases
+    fig_trends.update_layout(
+        plot_bgcolor='#FAF3E0',
+        paper_bgcolor='#FAF3E0',
+        height=450, # Updated for DATA FILTER CHART & EVEN PURPSOE
+        margin=dict(l=60, r=60, t=30, b=60),
+        yaxis=dict(
+            range=[fixed_min, max_value * 1.15],
+            showgrid=False,
+            showticklabels=True,
+            showline=True,
+            linewidth=1,
+            linecolor='black',
+            tickfont=dict(size=12, color='#000000', family='Arial Black'),
+            zeroline=True,
+            zerolinecolor='black',
+            zerolinewidth=1
+        ),
+        width=None  # This allows the chart to use full container width
+    )
+
+    return fig_trends
+
+
+# Colour of each stacked category, bottom first
+BREAKDOWN_COLORS = {
+    "likes": '#1DA1F2', "retweets": '#17BF63', "comments": '#FFAD1F',
+    "success": '#5CB338', "recovered": '#FFC145', "unsuccessful": '#FB4141',
+}
+
+
+@cached_figure("breakdown")
+def breakdown_figure(series, breakdown, start_date, end_date, series_bucket="day"):
+    """
+    Engagements over the selected date range, stacked by action class or outcome.
+
+    Args:
+        series (pandas.DataFrame): Non-empty breakdown_series() output
+        breakdown (str): "action" or "outcome"
+        start_date (datetime): Start of the selected range
+        end_date (datetime): End of the selected range
+        series_bucket (str): Bucket unit of the series ("hour", "day", "week" or "month")
+
+    Returns:
+        plotly.graph_objects.Figure: Figure (shared, don't modify)
+    """
+    categories = [column for column in series.columns if column != 'date']
+    hover_date = SERIES_HOVER_FORMATS.get(series_bucket, "%B %d")
+
+    fig = go.Figure()
+    for category in categories:
+        fig.add_trace(go.Bar(
+            x=series['date'],
+            y=series[category],
+            name=category.capitalize(),
+            marker_color=BREAKDOWN_COLORS.get(category),
+            hovertemplate=f"<b>%{{x|{hover_date}}}</b><br>{category.capitalize()}: %{{y}}<extra></extra>"
+        ))
+
+    # Half a bucket of padding so the outer bars aren't cropped
+    padding = timedelta(minutes=30) if series_bucket == "hour" else timedelta(hours=12)
+    fig.update_layout(
+        barmode='stack',
+        bargap=0.15,
+        plot_bgcolor='#FAF3E0',
+        paper_bgcolor='#FAF3E0',
+        height=450,
+        margin=dict(l=60, r=60, t=30, b=60),
+        legend=dict(
+            orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1,
+            font=dict(size=12, color='#000000', family='Arial Black')
+        ),
+        yaxis=dict(
+            showgrid=False,
+            showline=True,
+            linewidth=1,
+            linecolor='black',
+            tickfont=dict(size=12, color='#000000', family='Arial Black'),
+            zeroline=True,
+            zerolinecolor='black',
+            zerolinewidth=1
+        ),
+        xaxis=dict(
+            showgrid=False,
+            showline=True,
+            linewidth=1,
+            linecolor='black',
+            tickfont=dict(size=10, color='#000000', family='Arial Black'),
+            range=[start_date - padding, end_date + padding]
+        ),
+        width=None
+    )
+
+    return fig
+
+@cached_figure("leaderboard")
+def leaderboard_figure(data, label_column):
+    """
+    Horizontal bars of a leaderboard page, largest on top.
+
+    Args:
+        data (pandas.DataFrame): Non-empty leaderboard with `label_column` and 'engagements'
+        label_column (str): 'username' for celebrities, 'name' for users
+
+    Returns:
+        plotly.graph_objects.Figure: Figure (shared, don't modify)
+    """
+    # Sort in descending order by engagements
+    data = data.sort_values('engagements', ascending=False)
+    reversed_labels = data[label_column].tolist()[::-1]
+
+    # Calculate padding
+    text_padding = get_max_text_padding(data['engagements'])
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=data[label_column],
+        x=data['engagements'],
+        orientation='h',
+        marker_color='#3498db',
+        text=data['engagements'],
+        textposition='outside',
+        textfont=dict(size=14, color='#000000', family='Arial Black')
+    ))
+
+    fig.update_layout(
+        plot_bgcolor='#FAF3E0',
+        paper_bgcolor='#FAF3E0',
+        # Taller for longer pages, so the bars keep their thickness
+        height=max(450, 40 * len(data) + 60),
+        margin=dict(l=20, r=100, t=20, b=20),  # Increased right margin
+        showlegend=False,
+        xaxis=dict(
+            range=[0, max(data['engagements']) + text_padding],  # Add padding for text
+            showgrid=False,
+            showticklabels=True,
+            showline=True,
+            linewidth=1,
+            linecolor='black',
+            tickfont=dict(size=12, color='#000000', family='Arial Black')
+        ),
+        yaxis=dict(
+            categoryorder='array',
+            categoryarray=reversed_labels,
+            showgrid=False,
+            showticklabels=True,
+            showline=True,
+            linewidth=1,
+            linecolor='black',
+            tickfont=dict(size=12, color='#000000', family='Arial Black')
+        )
+    )
+
+    return fig
@@ -0,0 +1,208 @@
+"""
+Precomputed classification of twitter_actions documents.
+
+The success counters and the rerun comparison classify each action with
+case-insensitive regexes on `action`, `result` and `rerun`, which no index
+can serve. This module stores the outcome of those regexes in three enum
+fields:
+
+    action_type      "likes" | "retweets" | "comments"
+    initial_outcome  "success" | "failed" | "other"
+    rerun_outcome    "success" | "other"
+
+and indexes them, so the counts become equality matches. Documents that
+aren't labelled yet still match through the regex filters (see
+`metrics.with_classification`), so the numbers are correct at any time.
+Run `python classify.py` to backfill and then from cron to label new and
+rerun documents; the dashboard only reads the labels and never writes them.
+
+An incremental pass only relabels documents that are unlabelled or whose
+rerun has succeeded since. A document whose `action` or `result` is edited
+in place keeps its old labels until a `--full` pass, so run one after
+such edits (or on a slower schedule, e.g. nightly).
+"""
+import os
+import re
+import time
+
+from logger import setup_logger
+from metrics import UNCLASSIFIED_FILTER
+
+logger = setup_logger(__name__)
+
+CLASSIFICATION_INDEX = "classification"
+CLASSIFICATION_KEYS = [("initial_outcome", 1), ("rerun_outcome", 1), ("action_type", 1)]
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _matches(field_path, pattern):
+    """Case-insensitive regex test that is false (not an error) for non-strings."""
+    return {
+        "$cond": [
+            {"$eq": [{"$type": field_path}, "string"]},
+            {"$regexMatch": {"input": field_path, "regex": pattern, "options": "i"}},
+            False
+        ]
+    }
+
+
+# Same buckets as metrics.ACTION_CLASS_EXPR
+ACTION_TYPE_EXPR = {
+    "$switch": {
+        "branches": [
+            {"case": _matches("$action", "like"), "then": "likes"},
+            {"case": _matches("$action", "repost|retweet"), "then": "retweets"},
+        ],
+        "default": "comments"
+    }
+}
+
+# "success" if result contains Success, "failed" if it contains Failed
+INITIAL_OUTCOME_EXPR = {
+    "$switch": {
+        "branches": [
+            {"case": _matches("$result", "success"), "then": "success"},
+            {"case": _matches("$result", "failed"), "then": "failed"},
+        ],
+        "default": "other"
+    }
+}
+
+# "success" if the rerun succeeded
+RERUN_OUTCOME_EXPR = {"$cond": [_matches("$rerun", "success"), "success", "other"]}
+
+# Update pipeline writing the three fields
+CLASSIFY_UPDATE = [{
+    "$set": {
+        "action_type": ACTION_TYPE_EXPR,
+        "initial_outcome": INITIAL_OUTCOME_EXPR,
+        "rerun_outcome": RERUN_OUTCOME_EXPR,
+    }
+}]
+
+# Labelled documents whose rerun has succeeded since they were labelled
+RERUN_RESOLVED_FILTER = {
+    "initial_outcome": {"$in": ["failed", "other"]},
+    "rerun_outcome": "other",
+    "rerun": {"$regex": "success", "$options": "i"}
+}
+
+
+def _search(pattern, value):
+    return isinstance(value, str) and re.search(pattern, value, re.IGNORECASE) is not None
+
+
+def action_type_of(action):
+    """Python version of ACTION_TYPE_EXPR for one `action` value."""
+    if _search("like", action):
+        return "likes"
+    if _search("repost|retweet", action):
+        return "retweets"
+    return "comments"
+
+
+def initial_outcome_of(result):
+    """Python version of INITIAL_OUTCOME_EXPR for one `result` value."""
+    if _search("success", result):
+        return "success"
+    if _search("failed", result):
+        return "failed"
+    return "other"
+
+
+def rerun_outcome_of(rerun):
+    """Python version of RERUN_OUTCOME_EXPR for one `rerun` value."""
+    return "success" if _search("success", rerun) else "other"
+
+
+def classify_document(doc):
+    """
+    Classify a document in Python, with the same rules as the expressions above.
+
+    Returns:
+        tuple: (action_type, initial_outcome, rerun_outcome)
+    """
+    return (
+        action_type_of(doc.get("action")),
+        initial_outcome_of(doc.get("result")),
+        rerun_outcome_of(doc.get("rerun")),
+    )
+
+
+def ensure_classification_index(collection):
+    """Create the index serving the classification counts if it is missing."""
+    collection.create_index(CLASSIFICATION_KEYS, name=CLASSIFICATION_INDEX)
+
+
+def _classify_ids(collection, ids):
+    if not ids:
+        return 0
+    return collection.update_many({"_id": {"$in": ids}}, CLASSIFY_UPDATE).modified_count
+
+
+def classify(collection, full=False, batch_size=None):
+    """
+    Label unclassified documents, and documents whose rerun has succeeded.
+
+    Documents are updated in `_id` batches so a backfill of a large
+    collection is a series of short writes instead of one long one.
+
+    Args:
+        collection (pymongo.collection.Collection): twitter_actions collection
+        full (bool): Relabel every document (after changing the rules or editing
+            `action`/`result` in place)
+        batch_size (int, optional): Documents updated per write
+
+    Returns:
+        int: Number of documents whose labels changed
+    """
+    batch_size = batch_size or int(os.getenv("CLASSIFY_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    started = time.perf_counter()
+    ensure_classification_index(collection)
+    updated = 0
+
+    if full:
+        last_id = None
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            ids = [doc["_id"] for doc in
+                   collection.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size)]
+            if not ids:
+                break
+            updated += _classify_ids(collection, ids)
+            last_id = ids[-1]
+    else:
+        # Labelling removes documents from UNCLASSIFIED_FILTER, so each batch
+        # is simply the next unlabelled documents
+        while True:
+            ids = [doc["_id"] for doc in
+                   collection.find(UNCLASSIFIED_FILTER, {"_id": 1}).limit(batch_size)]
+            if not ids:
+                break
+            updated += _classify_ids(collection, ids)
+
+    updated += collection.update_many(RERUN_RESOLVED_FILTER, CLASSIFY_UPDATE).modified_count
+    logger.info(
+        "Classified %s documents (%s) in %.2fs",
+        updated,
+        "full" if full else "incremental",
+        time.perf_counter() - started,
+    )
+    return updated
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+
+    from db import get_collection
+
+    parser = argparse.ArgumentParser(description="Label twitter_actions documents with their action type and outcomes")
+    parser.add_argument("--full", action="store_true", help="Relabel every document")
+    parser.add_argument("--batch-size", type=int, default=None, help="Documents updated per write")
+    args = parser.parse_args()
+
+    load_dotenv()
+    classify(get_collection(), full=args.full, batch_size=args.batch_size)
@@ -0,0 +1,196 @@
+import os
+import threading
+
+import pymongo
+from pymongo import monitoring
+
+from instrumentation import command_recorder
+from logger import setup_logger
+from tenant import current_tenant, drop_tenant_resource, existing_resources, tenant_resource
+
+logger = setup_logger(__name__)
+
+# Collection that the Tweetbot writes every action into
+ACTIONS_COLLECTION = "twitter_actions"
+
+
+def _env_int(name, default):
+    """Read an integer setting from the environment, falling back to default."""
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("Ignoring invalid value for %s: %r", name, value)
+        return default
+
+
+class ConnectionCounter(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener that keeps live counters of the sockets
+    opened by a tenant's client, so the dashboard can show how many
+    connections are open and how many are currently in use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.created_total = 0
+        self.closed_total = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "created_total": self.created_total,
+                "closed_total": self.closed_total,
+            }
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+            self.created_total += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(self.open - 1, 0)
+            self.closed_total += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    # Events we don't need to count
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+
+def client_options():
+    """
+    Build the pool settings for the shared client from environment variables.
+
+    Returns:
+        dict: Keyword arguments for pymongo.MongoClient
+    """
+    return {
+        "maxPoolSize": _env_int("MONGODB_MAX_POOL_SIZE", 20),
+        "minPoolSize": _env_int("MONGODB_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _env_int("MONGODB_MAX_IDLE_TIME_MS", 300000),
+        "connectTimeoutMS": _env_int("MONGODB_CONNECT_TIMEOUT_MS", 10000),
+        "serverSelectionTimeoutMS": _env_int("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 10000),
+        "socketTimeoutMS": _env_int("MONGODB_SOCKET_TIMEOUT_MS", 60000),
+        "waitQueueTimeoutMS": _env_int("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 10000),
+        # How often the driver checks server health in the background
+        "heartbeatFrequencyMS": _env_int("MONGODB_HEARTBEAT_FREQUENCY_MS", 10000),
+    }
+
+
+def _create_client():
+    tenant = current_tenant()
+    options = client_options()
+    if tenant.max_pool_size is not None:
+        options["maxPoolSize"] = tenant.max_pool_size
+    counter = tenant_resource("connection_counter", ConnectionCounter)
+    logger.debug("Creating MongoDB client for tenant %s with options %s", tenant.name, options)
+    return pymongo.MongoClient(
+        tenant.uri or os.getenv("MONGODB_URI"),
+        event_listeners=[counter, command_recorder],
+        **options
+    )
+
+
+def get_client():
+    """
+    Return the current tenant's MongoClient, creating it on first use.
+
+    The client owns a connection pool that is shared by every Streamlit
+    session and every data function of the tenant, so a page render reuses
+    already open sockets instead of doing a TCP/TLS handshake per query.
+    Each tenant has its own pool, bounded by its max_pool_size (or
+    MONGODB_MAX_POOL_SIZE), which is closed when the tenant goes idle.
+
+    Returns:
+        pymongo.MongoClient: The tenant's client
+    """
+    return tenant_resource("client", _create_client, close=lambda client: client.close())
+
+
+def get_database():
+    """Return the current tenant's database from its client."""
+    return get_client()[current_tenant().database]
+
+
+def get_collection(name=ACTIONS_COLLECTION):
+    """Return a collection (twitter_actions by default) from the shared client."""
+    return get_database()[name]
+
+
+def check_health():
+    """
+    Ping the server through the shared pool.
+
+    Returns:
+        bool: True if the server answered the ping
+    """
+    try:
+        get_client().admin.command("ping")
+        return True
+    except Exception as e:
+        logger.error("MongoDB health check failed: %s", e)
+        return False
+
+
+def pool_stats():
+    """
+    Current connection counters of the current tenant's pool.
+
+    Returns:
+        dict: open, checked_out, created_total and closed_total connections
+    """
+    return tenant_resource("connection_counter", ConnectionCounter).snapshot()
+
+
+def all_pool_stats():
+    """
+    Connection counters of every tenant with an open client, summed.
+
+    Unlike pool_stats(), this doesn't open a pool or keep an idle tenant alive.
+
+    Returns:
+        dict: open, checked_out, created_total and closed_total connections
+    """
+    totals = {"open": 0, "checked_out": 0, "created_total": 0, "closed_total": 0}
+    for counter in existing_resources("connection_counter").values():
+        for field, value in counter.snapshot().items():
+            totals[field] += value
+    return totals
+
+
+def close_client():
+    """Close the current tenant's client and its pool (used on shutdown and in scripts)."""
+    drop_tenant_resource("client")
@@ -0,0 +1,360 @@
+import io
+import os
+import tempfile
+import time
+import weakref
+from dataclasses import dataclass
+from datetime import datetime
+
+import pandas as pd
+import xlsxwriter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet and Arrow exports are optional
+    pa = None
+    pq = None
+
+from logger import setup_logger
+from metrics import to_utc
+from normalize import EXPORT_DATE_FORMAT, normalize_dates
+
+logger = setup_logger(__name__)
+
+# Fields of a twitter_actions document, in export column order
+EXPORT_COLUMNS = [
+    'profile_id', 'date', 'name', 'action', 'post_content', 'username',
+    'translated_comments', 'media_link', 'result', 'rerun', 'id', 'date_only'
+]
+
+# Fields holding dates, normalized before writing
+DATE_COLUMNS = ('date', 'date_only')
+
+# Rows per sheet allowed by Excel, including the header row
+EXCEL_MAX_ROWS = 1048576
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+@dataclass
+class ExportStats:
+    """Outcome of one export run."""
+    rows: int = 0
+    seconds: float = 0.0
+    size_bytes: int = 0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ExportFile:
+    """
+    A finished export in a temporary file on disk.
+
+    The file is deleted by close(), or when the object is garbage collected
+    (e.g. with the session state holding it), so callers can keep the
+    object instead of the file's bytes.
+    """
+
+    def __init__(self, path, stats):
+        self.path = path
+        self.stats = stats
+        self._remove = weakref.finalize(self, _remove_file, path)
+
+    def open(self):
+        """The file, opened for reading from the start."""
+        return open(self.path, "rb")
+
+    def close(self):
+        self._remove()
+
+
+def _cell(value):
+    """Convert a BSON value into something xlsxwriter can write."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return value.strftime(EXPORT_DATE_FORMAT)
+    return str(value)
+
+
+def _batches(cursor, size):
+    """Group a cursor's documents into lists of `size`."""
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def batch_frame(docs, columns):
+    """
+    Build a DataFrame for one batch of documents with normalized date columns.
+
+    Values keep their Python types (no numeric inference) and missing fields
+    become None.
+    """
+    frame = pd.DataFrame(docs, columns=columns, dtype=object)
+    for column in DATE_COLUMNS:
+        if column in frame.columns:
+            frame[column] = normalize_dates(frame[column], EXPORT_DATE_FORMAT)
+    return frame.where(frame.notna(), None)
+
+
+class _SheetWriter:
+    """Writes rows into constant-memory worksheets, starting a new sheet when one fills up."""
+
+    def __init__(self, workbook, columns):
+        self.workbook = workbook
+        self.columns = columns
+        self.sheet_count = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self.sheet_count += 1
+        name = 'Data' if self.sheet_count == 1 else f'Data {self.sheet_count}'
+        self.worksheet = self.workbook.add_worksheet(name)
+        self.worksheet.write_row(0, 0, self.columns)
+        self.row = 1
+
+    def write(self, values):
+        if self.row >= EXCEL_MAX_ROWS:
+            self._new_sheet()
+        self.worksheet.write_row(self.row, 0, values)
+        self.row += 1
+
+
+class ExcelExportWriter:
+    """xlsx written row by row through xlsxwriter's constant-memory mode."""
+    label = "Excel (.xlsx)"
+    extension = "xlsx"
+    mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    def __init__(self, output, columns):
+        self.workbook = xlsxwriter.Workbook(output, {
+            'constant_memory': True,
+            # Writing media links as plain text avoids Excel's 65,530 URLs per sheet limit
+            'strings_to_urls': False,
+        })
+        self.sheets = _SheetWriter(self.workbook, columns)
+
+    def write_batch(self, docs, columns):
+        frame = batch_frame(docs, columns)
+        for values in frame.itertuples(index=False, name=None):
+            self.sheets.write([_cell(value) for value in values])
+
+    def close(self):
+        self.workbook.close()
+
+
+class CsvExportWriter:
+    """UTF-8 CSV, one header line followed by every batch appended in turn."""
+    label = "CSV (.csv)"
+    extension = "csv"
+    mime = "text/csv"
+
+    def __init__(self, output, columns):
+        self.text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+        self.header = True
+
+    def write_batch(self, docs, columns):
+        batch_frame(docs, columns).to_csv(self.text, header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        self.text.flush()
+        # Hand the binary file back to the caller instead of closing it
+        self.text.detach()
+
+
+def arrow_schema(columns):
+    """Arrow schema of an export: timestamps for the date fields, strings otherwise."""
+    return pa.schema([
+        (column, pa.timestamp('ms') if column in DATE_COLUMNS else pa.string())
+        for column in columns
+    ])
+
+
+def arrow_batch(docs, columns, schema):
+    """
+    Convert one batch of documents into an Arrow table with a fixed schema.
+
+    Dates that can't be parsed become null, and dates are floored to
+    milliseconds (BSON's precision) since strings may carry microseconds.
+    Every other field is stored as text so batches with differently typed
+    values still share one schema.
+    """
+    frame = pd.DataFrame(docs, columns=columns, dtype=object)
+    for column in columns:
+        if column in DATE_COLUMNS:
+            # normalize_dates leaves only unparseable originals as non-timestamps
+            dates = pd.to_datetime(normalize_dates(frame[column]), errors='coerce', format='ISO8601')
+            frame[column] = dates.dt.floor('ms')
+        else:
+            frame[column] = frame[column].astype('string')
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+class ParquetExportWriter:
+    """Parquet file with one row group per cursor batch."""
+    label = "Parquet (.parquet)"
+    extension = "parquet"
+    mime = "application/vnd.apache.parquet"
+
+    def __init__(self, output, columns):
+        self.schema = arrow_schema(columns)
+        self.writer = pq.ParquetWriter(output, self.schema, compression='snappy')
+
+    def write_batch(self, docs, columns):
+        self.writer.write_table(arrow_batch(docs, columns, self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class ArrowExportWriter:
+    """Arrow IPC file (Feather v2), one record batch per cursor batch."""
+    label = "Arrow IPC (.arrow)"
+    extension = "arrow"
+    mime = "application/vnd.apache.arrow.file"
+
+    def __init__(self, output, columns):
+        self.schema = arrow_schema(columns)
+        self.writer = pa.ipc.new_file(output, self.schema)
+
+    def write_batch(self, docs, columns):
+        self.writer.write_table(arrow_batch(docs, columns, self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+EXPORT_FORMATS = {
+    "xlsx": ExcelExportWriter,
+    "csv": CsvExportWriter,
+    "parquet": ParquetExportWriter,
+    "arrow": ArrowExportWriter,
+}
+
+# Formats that need pyarrow
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+
+def available_formats():
+    """
+    Export formats usable in this environment.
+
+    Returns:
+        dict: Format key -> writer class; Parquet and Arrow need pyarrow
+    """
+    return {
+        key: writer for key, writer in EXPORT_FORMATS.items()
+        if pa is not None or key not in COLUMNAR_FORMATS
+    }
+
+
+def export_query(start_date=None, end_date=None):
+    """
+    Filter selecting the documents of a date range (open ended if a bound is None).
+
+    The bounds are wall-clock times in the dashboard's time zone, like the
+    trend chart's, and are converted to the UTC dates stored in MongoDB.
+
+    Returns:
+        dict: MongoDB filter on the `date` field
+    """
+    date_filter = {}
+    if start_date is not None:
+        date_filter["$gte"] = to_utc(start_date)
+    if end_date is not None:
+        date_filter["$lte"] = to_utc(end_date)
+    return {"date": date_filter} if date_filter else {}
+
+
+def stream_export(collection, fmt="xlsx", columns=EXPORT_COLUMNS, start_date=None,
+                  end_date=None, batch_size=None, progress_callback=None):
+    """
+    Export documents without holding the collection in memory.
+
+    The date range and column selection are pushed down to MongoDB as the
+    find filter and projection, so only the requested fields of the
+    requested documents are transferred. The cursor is read in batches;
+    each batch is converted in one vectorized pass and handed to the
+    format's writer, which streams into a temporary file on disk, so memory
+    use stays flat however large the collection is.
+
+    Args:
+        collection (pymongo.collection.Collection): Source collection
+        fmt (str): One of EXPORT_FORMATS ("xlsx", "csv", "parquet", "arrow")
+        columns (list): Fields to export, in column order
+        start_date (datetime, optional): Only documents dated on or after this
+        end_date (datetime, optional): Only documents dated on or before this
+        batch_size (int, optional): Documents fetched per round trip
+        progress_callback (callable, optional): Called as (fraction, text)
+
+    Returns:
+        tuple: (ExportFile, ExportStats), or (None, stats) when there is
+        nothing to export
+    """
+    writer_class = available_formats().get(fmt)
+    if writer_class is None:
+        raise ValueError(f"Unsupported export format {fmt!r}; pyarrow is required for Parquet and Arrow")
+
+    columns = [column for column in EXPORT_COLUMNS if column in columns] or list(EXPORT_COLUMNS)
+    query = export_query(start_date, end_date)
+    batch_size = batch_size or int(os.getenv("EXPORT_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    started = time.perf_counter()
+    stats = ExportStats()
+
+    expected = collection.count_documents(query) if query else collection.estimated_document_count()
+    if expected == 0:
+        logger.warning("No data found for export")
+        return None, stats
+
+    projection = {column: 1 for column in columns}
+    projection["_id"] = 0
+    cursor = collection.find(query, projection, batch_size=batch_size)
+
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=f".{writer_class.extension}")
+    export_file = ExportFile(path, stats)
+
+    try:
+        with os.fdopen(fd, "w+b") as output:
+            writer = writer_class(output, columns)
+            for docs in _batches(cursor, batch_size):
+                writer.write_batch(docs, columns)
+                stats.rows += len(docs)
+                if progress_callback is not None:
+                    progress_callback(
+                        min(stats.rows / expected, 0.99),
+                        f"Exported {stats.rows:,} of ~{expected:,} rows"
+                    )
+            writer.close()
+            stats.size_bytes = output.tell()
+    except Exception:
+        export_file.close()
+        raise
+    stats.seconds = time.perf_counter() - started
+    logger.info(
+        "Exported %s rows as %s (%s bytes) in %.2fs at %.0f rows/s",
+        stats.rows,
+        fmt,
+        stats.size_bytes,
+        stats.seconds,
+        stats.rows_per_second,
+    )
+    if progress_callback is not None:
+        progress_callback(1.0, f"Exported {stats.rows:,} rows at {stats.rows_per_second:,.0f} rows/s")
+    return export_file, stats
@@ -1,26 +1,38 @@
 # Import necessary libraries
 import streamlit as st
-import pymongo
+import functools
+import math
 import os
 from dotenv import load_dotenv
-import time
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
-import logging
-from logger import setup_logger, log_dataframe
-import io
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("debugger.log"),
-        logging.StreamHandler()
-    ]
+from logger import configure_logging, setup_logger, log_dataframe
+from db import all_pool_stats, get_collection, get_database, pool_stats
+from cache import all_cache_bytes, cached, dont_cache, remember, result_cache, run_scope
+from parallel import QueryTask, run_concurrently
+from breakdown import breakdown_frame, breakdown_series, breakdown_stages, fetch_rollup_breakdown
+from export import EXPORT_COLUMNS, stream_export, available_formats as available_export_formats
+from metrics import (
+    CLASSIFIED_SUCCESSFUL_FILTER, CLASSIFIED_INITIAL_SUCCESS_FILTER,
+    CLASSIFIED_RERUN_SUCCESS_FILTER, DashboardMetrics,
+    action_class_stages, default_series_window, empty_rerun_metrics, fetch_dashboard_metrics,
+    local_now, rerun_metrics, series_timezone, series_unit, time_series_frame, time_series_stages
 )
+from rollup import ensure_rollup_fresh, mark_rollup_stale, rollup_summary, rollup_time_series
+from indexes import plan_problems, start_index_maintenance
+from leaderboard import (
+    BOARDS, DEFAULT_PAGE_SIZE, PAGE_SIZES, empty_page, ensure_leaderboards_fresh, mark_leaderboards_stale,
+    page_entries, rank_entries, read_page
+)
+from live import get_live_watcher
+from profiles import PROFILE_COLUMNS, profile_frame, profile_stages
+from snapshot import get_snapshot
+from instrumentation import call_log, instrumented, start_metrics_server
+from charts import (
+    breakdown_figure, leaderboard_figure, rerun_comparison_figure, success_ratio_figure, trend_figure
+)
+from tenant import tenant_names, use_tenant
+
 logger = setup_logger(__name__)
 
 # Page configuration with dark theme
@@ -392,12 +404,41 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Load environment variables
+# Load environment variables (MONGODB_URI, MONGODB_DATABASE and the pool
+# settings read by db.py)
 load_dotenv()
+# Apply LOG_* settings from .env
+configure_logging()
 
-# Get MongoDB connection details from environment variables
-MONGODB_URI = os.getenv("MONGODB_URI")
-MONGODB_DATABASE = os.getenv("MONGODB_DATABASE")
+# "facet" computes the KPI section with one aggregation, "parallel" runs the
+# individual queries concurrently
+QUERY_MODE = os.getenv("DASHBOARD_QUERY_MODE", "facet")
+# Seconds a single dashboard query may take before its fallback is shown
+QUERY_TIMEOUT = float(os.getenv("DASHBOARD_QUERY_TIMEOUT", 30))
+# Read success, rerun and time series data from the daily rollup (rollup.py)
+USE_ROLLUP = os.getenv("DASHBOARD_USE_ROLLUP", "1") == "1"
+# Page the leaderboards from collections regrouped with $out (leaderboard.py)
+USE_LEADERBOARD_COLLECTIONS = os.getenv("DASHBOARD_LEADERBOARD_COLLECTIONS", "1") == "1"
+# "query" reads from MongoDB on every load, "live" serves the KPI section
+# from counters kept up to date by a change stream (live.py, needs a replica
+# set), "snapshot" computes every metric from an in-memory copy (snapshot.py)
+DATA_MODE = os.getenv("DASHBOARD_DATA_MODE", "query")
+# Seconds between checks for new live data (live mode only)
+LIVE_REFRESH_SECONDS = float(os.getenv("LIVE_REFRESH_SECONDS", 5))
+
+# Rows per page of the profile table
+PROFILE_PAGE_SIZE = 100
+# Sort options of the profile table: column and ascending
+PROFILE_SORTS = {
+    "Actions": ("actions", False),
+    "Success rate": ("success_rate", False),
+    "Successes": ("successes", False),
+    "Reruns recovered": ("reruns_recovered", False),
+    "Last active": ("last_active", False),
+    "Profile": ("profile_id", True),
+}
+# Views of the trend chart: the total, or stacked by a breakdown.py breakdown
+TREND_BREAKDOWNS = {"total": "Total", "action": "By action", "outcome": "By outcome"}
 
 # Twitter color palette
 TWITTER_COLORS = {
@@ -410,6 +451,91 @@ TWITTER_COLORS = {
     'white': '#FFFFFF'
 }
 
+def metrics_gauges():
+    """Pool and cache gauges (summed over the active tenants) added to the Prometheus metrics page."""
+    pool = all_pool_stats()
+    return {
+        "dashboard_pool_connections_open": ("Open MongoDB connections", pool["open"]),
+        "dashboard_pool_connections_in_use": ("MongoDB connections checked out", pool["checked_out"]),
+        "dashboard_cache_bytes": ("Approximate size of the result caches", all_cache_bytes()),
+    }
+
+def selected_tenant():
+    """
+    The tenant this session views: the `tenant` query parameter if it names
+    a configured tenant, else the first configured one.
+    """
+    names = tenant_names()
+    requested = st.query_params.get("tenant")
+    return requested if requested in names else names[0]
+
+def tenant_scoped(func):
+    """
+    Run `func` for the session's tenant, so its queries use that tenant's
+    client, cache and snapshot. Fragments rerun without main(), so they are
+    wrapped too (place it below @st.fragment).
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_tenant(selected_tenant()):
+            return func(*args, **kwargs)
+    return wrapper
+
+def render_tenant_picker():
+    """Sidebar selector between the configured databases, if there are several."""
+    names = tenant_names()
+    if len(names) < 2:
+        return
+    current = selected_tenant()
+    choice = st.sidebar.selectbox("Database", names, index=names.index(current))
+    if choice != current:
+        logger.debug("Switching tenant from %s to %s", current, choice)
+        # The query parameter keeps the choice in the URL, so it can be shared
+        st.query_params["tenant"] = choice
+        # A prepared export and leaderboard positions belong to the previous database
+        discard_export()
+        for board in BOARDS:
+            st.session_state.pop(f"{board}_cursors", None)
+        st.rerun()
+
+def rollup_ready():
+    """
+    Whether the daily rollup is enabled and has been built (starting a
+    background refresh if it is due). When False, data functions query raw
+    twitter_actions documents instead.
+    """
+    return USE_ROLLUP and ensure_rollup_fresh(get_database())
+
+def rollup_series_ready(unit):
+    """
+    Whether the rollup can answer a time series with this bucket unit: its
+    buckets are UTC days, so hourly or non-UTC series query raw documents.
+    """
+    return unit != "hour" and series_timezone() == "UTC" and rollup_ready()
+
+def mark_data_stale():
+    """
+    Make the next reads refresh everything the dashboard keeps between
+    queries: the result cache, and the rollup, leaderboards and snapshot,
+    whose refreshes are otherwise throttled.
+    """
+    result_cache.invalidate()
+    mark_rollup_stale()
+    mark_leaderboards_stale()
+    if DATA_MODE == "snapshot":
+        get_snapshot(get_collection).mark_stale()
+
+def current_snapshot():
+    """
+    The in-memory snapshot, refreshed if stale, when DASHBOARD_DATA_MODE is
+    "snapshot" and it has loaded; None means query MongoDB.
+    """
+    if DATA_MODE != "snapshot":
+        return None
+    return get_snapshot(get_collection).fresh()
+
+@instrumented()
+@cached("total_engagements")
 def get_total_engagements():
     """
     Function to fetch the total number of tweet engagements.
@@ -420,27 +546,27 @@ def get_total_engagements():
     """
     try:
         logger.debug("Fetching total engagements")
-        # Connect to MongoDB
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        
-        # Use the twitter_actions collection
-        collection = db["twitter_actions"]
+        # Use the twitter_actions collection from the shared connection pool
+        collection = get_collection()
         
         # Count total unique engagements based on _id
         # Each document has a unique _id so this counts all documents
-        total_count = collection.estimated_document_count()
-        
-        # Close connection
-        client.close()
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            total_count = snapshot.total()
+        else:
+            total_count = collection.estimated_document_count()
         
-        logger.debug(f"Found {total_count} total engagements")
+        logger.debug("Found %s total engagements", total_count)
         return total_count
     except Exception as e:
-        logger.error(f"MongoDB Connection Error: {str(e)}")
+        dont_cache()
+        logger.error("MongoDB Connection Error: %s", e)
         st.error(f"MongoDB Connection Error: {str(e)}")
         return 0
 
+@instrumented()
+@cached("successful_engagements")
 def get_successful_engagements():
     """
     Function to fetch the total number of successful tweet engagements.
@@ -452,236 +578,169 @@ def get_successful_engagements():
     """
     try:
         logger.debug("Fetching successful engagements")
-        # Connect to MongoDB
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        
-        # Use the twitter_actions collection
-        collection = db["twitter_actions"]
+        # Use the twitter_actions collection from the shared connection pool
+        collection = get_collection()
         
         # Count documents that are either:
         # 1. Have "Success" in result field
         # 2. Have "Failed" in result but "Success" in rerun
-        successful_count = collection.count_documents({
-            "$or": [
-                {"result": {"$regex": "Success", "$options": "i"}},  # Case insensitive Success in result
-                {
-                    "$and": [
-                        {"result": {"$regex": "Failed", "$options": "i"}},  # Failed attempts
-                        {"rerun": {"$regex": "Success", "$options": "i"}}   # But succeeded in rerun
-                    ]
-                }
-            ]
-        })
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            successful_count = snapshot.successful()
+        elif rollup_ready():
+            successful_count = rollup_summary(get_database()).successful
+        else:
+            successful_count = collection.count_documents(CLASSIFIED_SUCCESSFUL_FILTER)
         
-        client.close()
         return successful_count
         
     except Exception as e:
-        logger.error(f"MongoDB Connection Error: {str(e)}")
+        dont_cache()
+        logger.error("MongoDB Connection Error: %s", e)
         st.error(f"MongoDB Connection Error: {str(e)}")
         return 0
 
-def get_success_ratio():
+@instrumented()
+def get_success_ratio(total=None, successful=None):
     """
     Calculate the success ratio percentage.
     
+    Args:
+        total (int, optional): Total engagements if already fetched
+        successful (int, optional): Successful engagements if already fetched
+    
     Returns:
         float: Percentage of successful engagements
     """
     try:
         logger.debug("Calculating success ratio")
-        # Get total and successful counts
-        total = get_total_engagements()
-        successful = get_successful_engagements()
+        # Get total and successful counts, reusing values the caller already has
+        if total is None:
+            total = get_total_engagements()
+        if successful is None:
+            successful = get_successful_engagements()
         
         # Calculate percentage
         if total > 0:
             ratio = (successful / total) * 100
-            logger.debug(f"Success ratio: {ratio:.2f}%")
+            logger.debug("Success ratio: %.2f%%", ratio)
             return ratio
         else:
             logger.warning("No engagements found for success ratio calculation")
             return 0
     except Exception as e:
-        logger.error(f"Error calculating success ratio: {str(e)}")
+        logger.error("Error calculating success ratio: %s", e)
         return 0
 
+@instrumented()
 def get_engagement_time_series():
     """
     Fetches engagement time series data for exactly the last 7 days.
+    
+    Delegates to get_engagement_time_series_with_filter so that the default
+    7-day window is one query, shared with the trend chart's "Last 7d" filter.
     """
-    try:
-        logger.debug("Fetching engagement time series data")
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
-        
-        # Get current date in UTC and set time to end of day
-        end_date = datetime.utcnow().replace(hour=23, minute=59, second=59)
-        # Get start date as 6 days ago (to get exactly 7 days including today)
-        start_date = (end_date - timedelta(days=6)).replace(hour=0, minute=0, second=0)
-        
-        pipeline = [
-            {
-                "$match": {
-                    "date": {
-                        "$gte": start_date,
-                        "$lte": end_date
-                    }
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": "%Y-%m-%d",
-                            "date": "$date"
-                        }
-                    },
-                    "engagements": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"_id": 1}
-            }
-        ]
-        
-        result = list(collection.aggregate(pipeline))
-        client.close()
-        
-        # Convert to DataFrame and handle missing dates
-        df = pd.DataFrame(result)
-        if not df.empty:
-            df = df.rename(columns={"_id": "date", "engagements": "engagements"})
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # Create complete date range for exactly 7 days
-            date_range = pd.date_range(start=start_date.date(), end=end_date.date(), freq='D')
-            all_dates = pd.DataFrame({'date': date_range})
-            
-            # Merge with actual data and fill missing values
-            df = pd.merge(all_dates, df, on='date', how='left')
-            df['engagements'] = df['engagements'].fillna(0)
-            
-            return df
-        return pd.DataFrame()
-        
-    except Exception as e:
-        logger.error(f"Error fetching time series data: {str(e)}")
-        return pd.DataFrame()
+    logger.debug("Fetching engagement time series data")
+    # Exactly 7 days including today, in the dashboard's time zone
+    start_date, end_date = default_series_window()
+    return get_engagement_time_series_with_filter(start_date, end_date)
 
-def get_celebrity_engagement_data():
+@instrumented()
+@cached("leaderboard_entries")
+def get_leaderboard_entries(board):
     """
-    Fetches and aggregates engagement counts by celebrity tweet with case-insensitive matching.
+    Every celebrity or user of a leaderboard, ranked, from one grouping of
+    twitter_actions. Used when the leaderboard collections can't be written;
+    pages are then cut from this cached list.
+    
+    Args:
+        board (str): "celebrities" or "users"
+    
+    Returns:
+        list: Ranked {key, label, engagements, rank, cumulative} entries
+    """
+    logger.debug("Grouping twitter_actions for the %s leaderboard", board)
+    collection = get_collection()
+    entries = list(collection.aggregate(BOARDS[board].entry_stages(), allowDiskUse=True))
+    return rank_entries(entries)
+
+@instrumented()
+@cached("leaderboard_page")
+def get_leaderboard_page(board, size=DEFAULT_PAGE_SIZE, after=None):
+    """
+    One page of the celebrity or user leaderboard, with the engagements of
+    everyone ranked after it.
+    
+    Pages come from the leaderboard collections (refreshed with $out every
+    LEADERBOARD_REFRESH_INTERVAL), the in-memory snapshot, or a cached
+    grouping, so paging never regroups the whole collection.
+    
+    Args:
+        board (str): "celebrities" or "users"
+        size (int): Rows per page
+        after (tuple, optional): Keyset cursor, the previous page's next_after
+    
+    Returns:
+        LeaderboardPage: Rows and the tail after them, empty if the query fails
     """
     try:
-        print("Starting celebrity data fetch with case-insensitive matching...")
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
-        
-        # Case-insensitive aggregation pipeline
-        pipeline = [
-            {
-                "$match": {
-                    "username": {
-                        "$exists": True, 
-                        "$ne": None
-                    }
-                }
-            },
-            {
-                # Convert username to lowercase for grouping
-                "$group": {
-                    "_id": {"$toLower": "$username"},  # Case-insensitive grouping
-                    "originalName": {"$first": "$username"},  # Keep one original username
-                    "engagements": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"engagements": -1}
-            },
-            {
-                "$limit": 5
-            }
-        ]
-        
-        result = list(collection.aggregate(pipeline))
-        print(f"Aggregation result: {result}")
-        
-        client.close()
-        
-        if result:
-            # Convert to DataFrame with proper column names
-            df = pd.DataFrame([
-                {
-                    "username": doc["originalName"],
-                    "engagements": doc["engagements"]
-                } for doc in result
-            ])
-            
-            # Clean up usernames (remove @ if present)
-            df['username'] = df['username'].apply(
-                lambda x: x.replace('@', '') if isinstance(x, str) and x.startswith('@') else x
-            )
-            
-            print("Final DataFrame with case-insensitive aggregation:")
-            print(df)
-            return df
-        
-        print("No celebrity engagement data found")
-        return pd.DataFrame(columns=['username', 'engagements'])
-        
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return page_entries(BOARDS[board], rank_entries(snapshot.leaderboard_entries(board)), size, after)
+        db = get_database()
+        if USE_LEADERBOARD_COLLECTIONS and ensure_leaderboards_fresh(db):
+            page = read_page(db, BOARDS[board], size, after)
+        else:
+            page = page_entries(BOARDS[board], get_leaderboard_entries(board), size, after)
+        log_dataframe(logger, page.rows, f"{board} leaderboard page")
+        return page
     except Exception as e:
-        print(f"Error in celebrity data fetch: {str(e)}")
-        return pd.DataFrame(columns=['username', 'engagements'])
+        dont_cache()
+        logger.error("Error fetching the %s leaderboard: %s", board, e)
+        st.error(f"Failed to fetch the {board} leaderboard")
+        return empty_page(board)
+
+def load_leaderboard_page(board, size=DEFAULT_PAGE_SIZE, after=None):
+    """
+    One page of a leaderboard. In DASHBOARD_DATA_MODE=live it is cut from the
+    change stream counters once they are seeded, so it is as current as the
+    KPIs; otherwise, or until then, get_leaderboard_page.
+    """
+    if DATA_MODE == "live":
+        ranked = get_live_watcher(get_collection).ranked_entries(board)
+        if ranked is not None:
+            return page_entries(BOARDS[board], ranked, size, after)
+        logger.debug("Live counters not seeded yet, querying MongoDB")
+    return get_leaderboard_page(board, size, after)
 
-def get_user_engagement_data():
+@instrumented()
+@cached("profile_performance")
+def get_profile_performance():
     """
-    Fetches and aggregates engagement counts by Twitter users.
-    Returns top 5 users with highest engagement counts.
+    Fetches the performance of every bot profile with one aggregation
+    grouped by profile_id.
     
     Returns:
-        pandas.DataFrame: DataFrame containing user names and their engagement counts
-        Columns: ['name', 'engagements']
-    
-    Raises:
-        Returns empty DataFrame with appropriate error message on failure
+        pandas.DataFrame: One row per profile, most actions first
+        Columns: PROFILE_COLUMNS
     """
     try:
-        logger.debug("Fetching user engagement data")
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
-        
-        pipeline = [
-            {"$group": {
-                "_id": "$name",
-                "count": {"$sum": 1}
-            }},
-            {"$sort": {"count": -1}},
-            {"$limit": 5}
-        ]
-        
-        result = list(collection.aggregate(pipeline))
-        client.close()
-        
-        df = pd.DataFrame(result)
-        if not df.empty:
-            df = df.rename(columns={"_id": "name", "count": "engagements"})
-            logger.debug(f"Found {len(df)} user records")
-            return df
-        
-        logger.warning("No user engagement data found")
-        st.error("No user engagement data available")
-        return pd.DataFrame(columns=['name', 'engagements'])
-        
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return snapshot.profiles()
+        logger.debug("Fetching per-profile performance")
+        collection = get_collection()
+        df = profile_frame(list(collection.aggregate(profile_stages(), allowDiskUse=True)))
+        log_dataframe(logger, df, "profile performance")
+        return df
     except Exception as e:
-        logger.error(f"Error fetching user data: {str(e)}")
-        st.error("Failed to fetch user engagement data")
-        return pd.DataFrame(columns=['name', 'engagements'])
-        
+        dont_cache()
+        logger.error("Error fetching profile performance: %s", e)
+        st.error("Failed to fetch profile performance")
+        return pd.DataFrame(columns=PROFILE_COLUMNS)
+
+@instrumented()
+@cached("rerun_comparison")
 def get_rerun_comparison_data():
     """
     Replicates Excel formula logic for comparing Initial Run vs Rerun metrics.
@@ -692,100 +751,35 @@ def get_rerun_comparison_data():
     """
     try:
         logger.debug("Fetching rerun comparison data using Excel formula logic")
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
-
-        # Pipeline for initial run (equivalent to D7, D8, D9)
-        initial_pipeline = [
-            {
-                "$match": {
-                    "result": {"$regex": "success", "$options": "i"}
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$cond": [
-                            {"$regexMatch": {"input": "$action", "regex": "like", "options": "i"}},
-                            "likes",
-                            {
-                                "$cond": [
-                                    {"$regexMatch": {"input": "$action", "regex": "repost|retweet", "options": "i"}},
-                                    "retweets",  # Changed from "reposts" to "retweets"
-                                    "comments"
-                                ]
-                            }
-                        ]
-                    },
-                    "count": {"$sum": 1}
-                }
-            }
-        ]
+        collection = get_collection()
 
-        # Pipeline for rerun (equivalent to D12, D13, D14)
-        rerun_pipeline = [
-            {
-                "$match": {
-                    "$or": [
-                        {"result": {"$regex": "success", "$options": "i"}},
-                        {"rerun": {"$regex": "success", "$options": "i"}}
-                    ]
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$cond": [
-                            {"$regexMatch": {"input": "$action", "regex": "like", "options": "i"}},
-                            "likes",
-                            {
-                                "$cond": [
-                                    {"$regexMatch": {"input": "$action", "regex": "repost|retweet", "options": "i"}},
-                                    "retweets",  # Changed from "reposts" to "retweets"
-                                    "comments"
-                                ]
-                            }
-                        ]
-                    },
-                    "count": {"$sum": 1}
-                }
-            }
-        ]
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            metrics = snapshot.rerun()
+        elif rollup_ready():
+            metrics = rollup_summary(get_database()).rerun
+        else:
+            # Initial run (equivalent to D7, D8, D9) and rerun (equivalent to D12, D13, D14)
+            initial_results = collection.aggregate(action_class_stages(CLASSIFIED_INITIAL_SUCCESS_FILTER))
+            rerun_results = collection.aggregate(action_class_stages(CLASSIFIED_RERUN_SUCCESS_FILTER))
 
-        initial_results = {doc["_id"]: doc["count"] for doc in collection.aggregate(initial_pipeline)}
-        rerun_results = {doc["_id"]: doc["count"] for doc in collection.aggregate(rerun_pipeline)}
-
-        client.close()
-
-        # Structure data like Excel series
-        metrics = {
-            "initial": {
-                "likes": initial_results.get("likes", 0),
-                "retweets": initial_results.get("retweets", 0),  # Changed from "reposts" to "retweets"
-                "comments": initial_results.get("comments", 0)
-            },
-            "rerun": {
-                "likes": rerun_results.get("likes", 0),
-                "retweets": rerun_results.get("retweets", 0),  # Changed from "reposts" to "retweets"
-                "comments": rerun_results.get("comments", 0)
-            }
-        }
+            # Structure data like Excel series
+            metrics = rerun_metrics(initial_results, rerun_results)
 
         # If no data found, don't use hardcoded values
         if all(v == 0 for v in metrics["initial"].values()) and all(v == 0 for v in metrics["rerun"].values()):
             logger.warning("No rerun comparison data found")
             return metrics
 
-        logger.debug(f"Metrics found - Initial: {metrics['initial']}, Rerun: {metrics['rerun']}")
+        logger.debug("Metrics found - Initial: %s, Rerun: %s", metrics["initial"], metrics["rerun"])
         return metrics
 
     except Exception as e:
-        logger.error(f"Error fetching rerun comparison data: {str(e)}")
-        return {
-            "initial": {"likes": 0, "retweets": 0, "comments": 0},  # Changed from "reposts" to "retweets"
-            "rerun": {"likes": 0, "retweets": 0, "comments": 0}  # Changed from "reposts" to "retweets"
-        }
+        dont_cache()
+        logger.error("Error fetching rerun comparison data: %s", e)
+        return empty_rerun_metrics()
+@instrumented()
+@cached("time_series_filtered")
 def get_engagement_time_series_with_filter(start_date=None, end_date=None):
     """
     Fetches engagement time series data for a specified date range.
@@ -798,126 +792,612 @@ def get_engagement_time_series_with_filter(start_date=None, end_date=None):
         pandas.DataFrame: DataFrame with date and engagement counts
     """
     try:
-        logger.debug(f"Fetching engagement time series data from {start_date} to {end_date}")
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
+        logger.debug("Fetching engagement time series data from %s to %s", start_date, end_date)
+        collection = get_collection()
         
         # If no dates provided, default to last 7 days
         if start_date is None or end_date is None:
-            # Get current date in UTC and set time to end of day
-            end_date = datetime.utcnow().replace(hour=23, minute=59, second=59)
-            # Get start date as 6 days ago (to get exactly 7 days including today)
-            start_date = (end_date - timedelta(days=6)).replace(hour=0, minute=0, second=0)
+            start_date, end_date = default_series_window()
         
-        pipeline = [
-            {
-                "$match": {
-                    "date": {
-                        "$gte": start_date,
-                        "$lte": end_date
-                    }
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": "%Y-%m-%d",
-                            "date": "$date"
-                        }
-                    },
-                    "engagements": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"_id": 1}
-            }
-        ]
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return snapshot.time_series(start_date, end_date)
+        # Hour, day, week or month buckets, depending on the range length
+        unit = series_unit(start_date, end_date)
+        if rollup_series_ready(unit):
+            result = rollup_time_series(get_database(), start_date, end_date, unit)
+        else:
+            result = list(collection.aggregate(time_series_stages(start_date, end_date, unit)))
         
-        result = list(collection.aggregate(pipeline))
-        client.close()
+        # Buckets arrive gap-filled by $densify
+        return time_series_frame(result)
         
-        # Convert to DataFrame and handle missing dates
-        df = pd.DataFrame(result)
-        if not df.empty:
-            df = df.rename(columns={"_id": "date", "engagements": "engagements"})
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # Create complete date range for the filtered period
-            date_range = pd.date_range(start=start_date.date(), end=end_date.date(), freq='D')
-            all_dates = pd.DataFrame({'date': date_range})
-            
-            # Merge with actual data and fill missing values
-            df = pd.merge(all_dates, df, on='date', how='left')
-            df['engagements'] = df['engagements'].fillna(0)
-            
-            return df
+    except Exception as e:
+        dont_cache()
+        logger.error("Error fetching time series data: %s", e)
         return pd.DataFrame()
+
+@instrumented()
+@cached("time_series_breakdown")
+def get_engagement_breakdown(start_date, end_date):
+    """
+    Fetches engagements per time bucket, action class and outcome for a
+    date range, with one $group; both stacked trend views are pivoted from it.
+    
+    Args:
+        start_date (datetime): Start of the range
+        end_date (datetime): End of the range
+    
+    Returns:
+        pandas.DataFrame: date, action_class, outcome and engagements, one
+        row per non-empty combination
+    """
+    try:
+        logger.debug("Fetching engagement breakdown from %s to %s", start_date, end_date)
+        unit = series_unit(start_date, end_date)
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return snapshot.breakdown(start_date, end_date, unit)
+        if rollup_series_ready(unit):
+            result = fetch_rollup_breakdown(get_database(), start_date, end_date, unit)
+        else:
+            result = list(get_collection().aggregate(breakdown_stages(start_date, end_date, unit)))
+        return breakdown_frame(result)
         
     except Exception as e:
-        logger.error(f"Error fetching time series data: {str(e)}")
-        return pd.DataFrame()
-def generate_raw_data_excel():
+        dont_cache()
+        logger.error("Error fetching engagement breakdown: %s", e)
+        return breakdown_frame([])
+
+@instrumented()
+@cached("dashboard_metrics")
+def get_dashboard_metrics():
     """
-    Generate an Excel file with all raw data directly from the database.
-    Handles potential data type issues with robust error handling.
+    Fetches every KPI, rerun and 7-day time series value with a single
+    $facet aggregation (one scan, one round trip), or from the daily rollup
+    when it is enabled. The leaderboards are paged separately
+    (get_leaderboard_page).
     
     Returns:
-        bytes: Excel file as bytes
+        DashboardMetrics: Typed result used by the chart code, with zero/empty
+        values if the query fails
     """
     try:
-        # Connect to MongoDB
-        client = pymongo.MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
-        collection = db["twitter_actions"]
+        collection = get_collection()
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            logger.debug("Computing dashboard metrics from the in-memory snapshot")
+            return snapshot.metrics()
+        if rollup_ready():
+            # Success, rerun and series come from the daily rollup
+            logger.debug("Fetching dashboard metrics from the daily rollup")
+            db = get_database()
+            series_start, series_end = default_series_window()
+            summary = rollup_summary(db)
+            if rollup_series_ready("day"):
+                series = rollup_time_series(db, series_start, series_end)
+            else:
+                series = list(collection.aggregate(time_series_stages(series_start, series_end, "day")))
+            return DashboardMetrics(
+                total_engagements=summary.total,
+                successful_engagements=summary.successful,
+                rerun=summary.rerun,
+                time_series=time_series_frame(series),
+                series_start=series_start,
+                series_end=series_end,
+            )
         
-        # Fetch ALL data from the database without any filtering
-        all_data = list(collection.find({}, {"_id": 0}))  # Exclude MongoDB IDs
+        logger.debug("Fetching dashboard metrics with a single $facet aggregation")
+        return fetch_dashboard_metrics(collection)
+    except Exception as e:
+        dont_cache()
+        logger.error("MongoDB Connection Error: %s", e)
+        st.error(f"MongoDB Connection Error: {str(e)}")
+        return DashboardMetrics()
+
+@instrumented()
+def get_dashboard_metrics_concurrently():
+    """
+    Fetches the same data as get_dashboard_metrics, but as independent queries
+    running concurrently on the shared query pool. Page latency is then roughly
+    the slowest single query; each query keeps its usual zero/empty fallback
+    if it fails or exceeds DASHBOARD_QUERY_TIMEOUT.
+    
+    Returns:
+        DashboardMetrics: Typed result used by the chart code
+    """
+    series_start, series_end = default_series_window()
+    results = run_concurrently([
+        QueryTask("total", get_total_engagements, fallback=0),
+        QueryTask("successful", get_successful_engagements, fallback=0),
+        QueryTask("time_series", get_engagement_time_series_with_filter,
+                  (series_start, series_end), fallback=pd.DataFrame()),
+        QueryTask("rerun", get_rerun_comparison_data, fallback=empty_rerun_metrics()),
+    ], timeout=QUERY_TIMEOUT)
+    
+    return DashboardMetrics(
+        total_engagements=results["total"],
+        successful_engagements=results["successful"],
+        rerun=results["rerun"],
+        time_series=results["time_series"],
+        series_start=series_start,
+        series_end=series_end,
+    )
+
+def load_dashboard_metrics():
+    """
+    Load the dashboard data. In DASHBOARD_DATA_MODE=live the change stream
+    counters are used once they are seeded; otherwise, or until then, the
+    configured DASHBOARD_QUERY_MODE: "facet" (default) runs one $facet
+    aggregation, "parallel" runs the individual queries concurrently.
+    """
+    if DATA_MODE == "live":
+        metrics = get_live_watcher(get_collection).metrics()
+        if metrics is not None:
+            return metrics
+        logger.debug("Live counters not seeded yet, querying MongoDB")
+    if QUERY_MODE == "parallel":
+        return get_dashboard_metrics_concurrently()
+    return get_dashboard_metrics()
+
+
+@instrumented()
+def generate_raw_data_export(fmt="xlsx", columns=EXPORT_COLUMNS, start_date=None, end_date=None,
+                             progress_callback=None):
+    """
+    Generate an export of the raw data directly from the database.
+    The date range and columns are pushed down to MongoDB, and the cursor is
+    streamed in batches into the chosen format in a temporary file, so memory
+    stays flat however many documents there are.
+    
+    Args:
+        fmt (str): "xlsx", "csv", "parquet" or "arrow"
+        columns (list): Fields to include
+        start_date (datetime, optional): Only documents dated on or after this
+        end_date (datetime, optional): Only documents dated on or before this
+        progress_callback (callable, optional): Called as (fraction, text)
+            as the export advances
+    
+    Returns:
+        ExportFile: The exported file, deleted with the object, or None
+    """
+    try:
+        # Use the twitter_actions collection from the shared connection pool
+        collection = get_collection()
         
-        # Convert to DataFrame
-        if all_data:
-            df = pd.DataFrame(all_data)
-            
-            # Handle date conversion with robust error handling
-            if 'date' in df.columns:
-                df['date'] = df['date'].apply(lambda x: str(x) if not isinstance(x, (str, datetime)) else x)
-                
-                def safe_date_parse(date_str):
-                    try:
-                        if pd.isna(date_str) or date_str == '':
-                            return date_str
-                        return pd.to_datetime(date_str)
-                    except:
-                        return date_str
-                
-                df['date'] = df['date'].apply(safe_date_parse)
-                df['date'] = df['date'].apply(
-                    lambda x: x.strftime('%Y-%m-%d %H:%M:%S') if isinstance(x, datetime) else x
-                )
-            
-            # Convert to Excel
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                df.to_excel(writer, index=False, sheet_name='Data')
-            excel_data = output.getvalue()
-            
-            logger.debug(f"Excel generation successful. Data size: {len(excel_data)} bytes")
-            return excel_data
-        else:
-            logger.warning("No data found for Excel generation")
+        export_file, stats = stream_export(
+            collection, fmt=fmt, columns=columns, start_date=start_date, end_date=end_date,
+            progress_callback=progress_callback
+        )
+        if export_file is None:
             return None
         
+        logger.debug(
+            "%s export successful. Data size: %s bytes, %.0f rows/s",
+            fmt,
+            stats.size_bytes,
+            stats.rows_per_second,
+        )
+        return export_file
+        
     except Exception as e:
-        logger.error(f"Error generating Excel file: {str(e)}")
+        logger.error("Error generating %s export: %s", fmt, e)
         return None
-    finally:
-        if 'client' in locals():
-            client.close()
+
+def generate_raw_data_excel(progress_callback=None):
+    """
+    Generate an Excel file with all raw data directly from the database.
+    
+    Returns:
+        ExportFile: The Excel file, or None
+    """
+    return generate_raw_data_export("xlsx", progress_callback=progress_callback)
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+@tenant_scoped
+def refresh_when_live_data_changes(version):
+    """
+    Rerun the page when the live counters have moved past `version`, the
+    version the page was rendered with. Only polls an in-process counter.
+    """
+    watcher = get_live_watcher(get_collection)
+    if watcher.version != version:
+        st.rerun()
+
+def discard_export():
+    """Forget the session's prepared export and delete its file."""
+    export_file = st.session_state.pop("export_file", None)
+    if export_file is not None:
+        export_file.close()
+
+def export_downloaded():
+    """Download button callback: the file has been served, so it isn't kept any longer."""
+    logger.debug("Raw data export downloaded")
+    discard_export()
+
+@st.fragment
+@tenant_scoped
+def render_export_controls():
+    """
+    Raw data export, built only when the user asks for it.
+    
+    Runs as a fragment so preparing or downloading the file reruns only these
+    controls, never the dashboard's queries; the normal render path never
+    touches the export code.
+    """
+    with st.popover("Export", use_container_width=True):
+        formats = available_export_formats()
+        fmt = st.selectbox("Format", list(formats), format_func=lambda key: formats[key].label)
+        columns = st.multiselect("Columns", EXPORT_COLUMNS, default=EXPORT_COLUMNS)
+        
+        start_date = end_date = None
+        if not st.checkbox("All dates", value=True):
+            # Days in the dashboard's time zone; export_query converts them to UTC
+            today = local_now().date()
+            date_range = st.date_input(
+                "Date range", value=(today - timedelta(days=6), today), max_value=today
+            )
+            # The range has only one date while the user is still picking
+            if len(date_range) == 2:
+                start_date = datetime.combine(date_range[0], datetime.min.time())
+                end_date = datetime.combine(date_range[1], datetime.max.time())
+        
+        prepared = st.button("Prepare export", key="prepare_export", use_container_width=True,
+                             disabled=not columns, help="Build the file with the selected data")
+        if prepared:
+            logger.debug("Raw data export requested: %s, %s, %s - %s", fmt, columns, start_date, end_date)
+            progress = st.progress(0.0, text="Starting export...")
+            # Delete the previous export's file right away
+            discard_export()
+            # Only the file's handle is kept in the session, never its bytes
+            st.session_state.export_file = generate_raw_data_export(
+                fmt, columns, start_date, end_date,
+                progress_callback=lambda fraction, text: progress.progress(fraction, text=text)
+            )
+            st.session_state.export_file_name = (
+                f"Buzztracker_Tweetbot_DB_Data_{local_now().strftime('%Y-%m-%d')}.{formats[fmt].extension}"
+            )
+            st.session_state.export_mime = formats[fmt].mime
+            progress.empty()
+            if st.session_state.export_file is None:
+                st.error("Export failed or no data matched this selection")
+        
+        export_file = st.session_state.get("export_file")
+        # Streamlit reads the whole file into memory to serve a download
+        # button, so the button is only built right after the export is
+        # prepared or on request, not on every rerun (live mode reruns the
+        # page on every change). The file is deleted once it is downloaded.
+        if export_file is not None and (
+            prepared or st.button("Show download", key="show_export_download", use_container_width=True)
+        ):
+            with export_file.open() as data:
+                st.download_button(
+                    label="Download",
+                    data=data,
+                    file_name=st.session_state.export_file_name,
+                    mime=st.session_state.export_mime,
+                    on_click=export_downloaded,
+                    use_container_width=True
+                )
+    
+@st.fragment
+@tenant_scoped
+def render_trends_section():
+    """
+    Date filter buttons and the engagement trend chart.
+    
+    Runs as a fragment, so picking a filter or a custom range reruns only
+    this section: one get_engagement_time_series_with_filter call and one
+    chart, not the KPI, leaderboard and rerun queries of the full page.
+    """
+    # Date filter section - ADD THIS NEW SECTION
+    # Create a container for the date filter buttons
+    filter_container = st.container()
+    date_filter_col1, date_filter_col2, date_filter_col3, date_filter_col4, date_filter_col5 = filter_container.columns(5)
+
+    # Store the currently selected filter in session state
+    if 'date_filter_selected' not in st.session_state:
+        st.session_state.date_filter_selected = 'last7d'
+
+    # Store custom date range in session state
+    if 'custom_start_date' not in st.session_state:
+        # Default to 7 days ago
+        st.session_state.custom_start_date = (local_now() - timedelta(days=6)).date()
+
+    if 'custom_end_date' not in st.session_state:
+        # Default to today
+        st.session_state.custom_end_date = local_now().date()
+
+    # Current date for calculations
+    today = local_now()
+
+    # Date filter buttons with styling matching the dashboard
+    filter_buttons_html = """
+    <style>
+    .date-filter-container {
+        display: flex;
+        gap: 8px;
+        margin-bottom: 15px;
+        flex-wrap: wrap;
+    }
+    .date-filter-button {
+        background-color: #722F37;
+        color: #F5DEB3;
+        border: none;
+        border-radius: 5px;
+        padding: 6px 12px;
+        font-weight: 600;
+        cursor: pointer;
+        transition: all 0.2s ease;
+        text-align: center;
+        flex-grow: 1;
+        min-width: 60px;
+    }
+    .date-filter-button:hover {
+        background-color: #8a3a45;
+    }
+    .date-filter-button.active {
+        background-color: #8a3a45;
+        border: 1px solid #F5DEB3;
+    }
+    </style>
+    """
+
+    st.markdown(filter_buttons_html, unsafe_allow_html=True)
+
+    # Button selection logic
+    with date_filter_col1:
+        last7d_active = "active" if st.session_state.date_filter_selected == "last7d" else ""
+        if st.button("Last 7d", key="last7d", use_container_width=True, 
+                   help="View data from the last 7 days"):
+            st.session_state.date_filter_selected = "last7d"
+
+    with date_filter_col2:
+        last30d_active = "active" if st.session_state.date_filter_selected == "last30d" else ""
+        if st.button("Last 30d", key="last30d", use_container_width=True,
+                   help="View data from the last 30 days"):
+            st.session_state.date_filter_selected = "last30d"
+
+    with date_filter_col3:
+        lastQ_active = "active" if st.session_state.date_filter_selected == "lastQ" else ""
+        if st.button("Last Q", key="lastQ", use_container_width=True,
+                   help="View data from the last quarter"):
+            st.session_state.date_filter_selected = "lastQ"
+
+    with date_filter_col4:
+        ytd_active = "active" if st.session_state.date_filter_selected == "ytd" else ""
+        if st.button("YTD", key="ytd", use_container_width=True,
+                   help="View data year to date"):
+            st.session_state.date_filter_selected = "ytd"
+
+    with date_filter_col5:
+        custom_active = "active" if st.session_state.date_filter_selected == "custom" else ""
+        if st.button("Custom", key="custom", use_container_width=True,
+                   help="Select a custom date range"):
+            st.session_state.date_filter_selected = "custom"
+
+    # Show custom date selector if custom filter is selected
+    if st.session_state.date_filter_selected == "custom":
+        custom_col1, custom_col2 = st.columns(2)
+
+        with custom_col1:
+            selected_start = st.date_input(
+                "Start Date",
+                value=st.session_state.custom_start_date,
+                max_value=today
+            )
+            st.session_state.custom_start_date = selected_start
+
+        with custom_col2:
+            selected_end = st.date_input(
+                "End Date",
+                value=st.session_state.custom_end_date,
+                max_value=today
+            )
+            st.session_state.custom_end_date = selected_end
+
+        # Validate date range
+        if selected_start > selected_end:
+            st.markdown('<p style="color:black;">Start date cannot be after end date. Please select a valid date range.</p>', unsafe_allow_html=True)
+            # Swap the dates to fix the range
+            st.session_state.custom_start_date = selected_end
+            st.session_state.custom_end_date = selected_start
+            # Use corrected dates
+            start_date = datetime.combine(selected_end, datetime.min.time())
+            end_date = datetime.combine(selected_start, datetime.max.time())
+        else:
+            start_date = datetime.combine(selected_start, datetime.min.time())
+            end_date = datetime.combine(selected_end, datetime.max.time())
+
+    # Calculate date range based on selected filter
+    # (microseconds are dropped so the range, and its cache key, stay stable across reruns)
+    end_date = local_now().replace(hour=23, minute=59, second=59, microsecond=0)
+
+    if st.session_state.date_filter_selected == "last7d":
+        # Same window as the default series so the query is deduplicated
+        start_date, end_date = default_series_window()
+    elif st.session_state.date_filter_selected == "last30d":
+        start_date = (end_date - timedelta(days=29)).replace(hour=0, minute=0, second=0)
+    elif st.session_state.date_filter_selected == "lastQ":
+        # Calculate start of the last quarter
+        current_month = end_date.month
+        quarter_month = ((current_month - 1) // 3) * 3 + 1  # Find start month of current quarter
+
+        # If we're in the first month of a quarter (Jan/Apr/Jul/Oct)
+        if quarter_month == current_month:
+            # If January, go back to Q4 of previous year
+            if current_month == 1:
+                start_date = datetime(end_date.year - 1, 10, 1)  # Q4 start (Oct 1)
+            else:
+                start_date = datetime(end_date.year, quarter_month - 3, 1)  # Previous quarter start
+        else:
+            start_date = datetime(end_date.year, quarter_month, 1)  # Current quarter start
+
+        # Example: If today is March 15, 2024
+        # quarter_month would be 1 (Jan)
+        # This would show Q1 2024 (Jan 1 - Mar 15)
+
+        # If today is April 2, 2024
+        # It would show Q1 2024 (Jan 1 - Mar 31)
+    elif st.session_state.date_filter_selected == "ytd":
+        start_date = datetime(end_date.year, 1, 1)
+    else:  # custom
+        start_date = datetime.combine(st.session_state.custom_start_date, datetime.min.time())
+        end_date = datetime.combine(st.session_state.custom_end_date, datetime.max.time())
+
+    # Total, or stacked by action class or by outcome
+    breakdown = st.radio(
+        "Breakdown", list(TREND_BREAKDOWNS), key="trend_breakdown", horizontal=True,
+        format_func=TREND_BREAKDOWNS.get, label_visibility="collapsed"
+    )
+    # Bucket size the series was computed with (longer ranges use coarser buckets)
+    series_bucket = series_unit(start_date, end_date)
+
+    if breakdown != "total":
+        # Both stacked views come from the same grouped result
+        series = breakdown_series(
+            get_engagement_breakdown(start_date, end_date), breakdown, start_date, end_date, series_bucket
+        )
+        if not series.empty:
+            st.plotly_chart(
+                breakdown_figure(series, breakdown, start_date, end_date, series_bucket),
+                use_container_width=True
+            )
+        else:
+            st.info("No data available for the selected date range.")
+        return
+
+    # Get filtered time series data
+    time_series_data = get_engagement_time_series_with_filter(start_date, end_date)
+
+    if not time_series_data.empty:
+        st.plotly_chart(
+            trend_figure(time_series_data, start_date, end_date,
+                         st.session_state.date_filter_selected, series_bucket),
+            use_container_width=True
+        )
+    else:
+        st.info("No data available for the selected date range.")
+
+def show_next_page(board, after):
+    st.session_state[f"{board}_cursors"].append(after)
+
+def show_previous_page(board):
+    st.session_state[f"{board}_cursors"].pop()
+
+def show_first_page(board):
+    st.session_state[f"{board}_cursors"] = []
+
+@st.fragment
+@tenant_scoped
+def render_leaderboard(board, title):
+    """
+    One leaderboard with its page size and previous/next controls.
+    
+    Runs as a fragment, so paging reruns only this leaderboard. The keyset
+    cursors of the pages walked so far are kept in the session, so
+    "Previous" goes back without counting rows.
+    
+    Args:
+        board (str): "celebrities" or "users"
+        title (str): Heading, e.g. "Celebrity Engagements"
+    """
+    cursors = st.session_state.setdefault(f"{board}_cursors", [])
+    size = st.session_state.get(f"{board}_page_size", DEFAULT_PAGE_SIZE)
+    page = load_leaderboard_page(board, size, cursors[-1] if cursors else None)
     
+    if cursors and not page.rows.empty:
+        heading = f"{title} #{page.first_rank}-{page.first_rank + len(page.rows) - 1}"
+    else:
+        heading = f"Top {size} {title}"
+    st.markdown(f"""
+        <div style="background: #722F37; padding: 15px; border-radius: 15px; margin: 20px 0;">
+            <h2 style="color: #F5DEB3; font-size: 24px; margin: 0;">{heading}</h2>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    if not page.rows.empty:
+        st.plotly_chart(leaderboard_figure(page.rows, BOARDS[board].label_column), use_container_width=True)
+        if page.others_count:
+            st.caption(f"Others: {page.others:,} engagements from {page.others_count:,} more {board}")
+    
+    previous_col, size_col, next_col = st.columns([1, 2, 1])
+    with previous_col:
+        st.button("‹ Previous", key=f"{board}_previous", disabled=not cursors,
+                  on_click=show_previous_page, args=(board,), use_container_width=True)
+    with size_col:
+        st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                     key=f"{board}_page_size", on_change=show_first_page, args=(board,),
+                     label_visibility="collapsed")
+    with next_col:
+        st.button("Next ›", key=f"{board}_next", disabled=page.next_after is None,
+                  on_click=show_next_page, args=(board, page.next_after), use_container_width=True)
+
+@st.fragment
+@tenant_scoped
+def render_profile_table():
+    """
+    Per-profile performance table with search, sort and pages.
+    
+    The data comes from one cached aggregation; searching, sorting and paging
+    only slice that frame and rerun this fragment. Only the current page is
+    sent to the browser, where st.dataframe draws the visible rows.
+    """
+    profiles = get_profile_performance()
+    if profiles.empty:
+        st.info("No profile data available.")
+        return
+    
+    search_col, sort_col, page_col = st.columns([2, 2, 1])
+    with search_col:
+        query = st.text_input("Search", placeholder="Profile id or name", key="profile_search")
+    with sort_col:
+        sort_label = st.selectbox("Sort by", list(PROFILE_SORTS), key="profile_sort")
+    
+    rows = profiles
+    if query:
+        rows = rows[
+            rows['profile_id'].str.contains(query, case=False, regex=False, na=False)
+            | rows['name'].str.contains(query, case=False, regex=False, na=False)
+        ]
+    column, ascending = PROFILE_SORTS[sort_label]
+    rows = rows.sort_values(column, ascending=ascending, na_position='last', kind='stable')
+    
+    pages = max(1, math.ceil(len(rows) / PROFILE_PAGE_SIZE))
+    with page_col:
+        # No key: a new page count starts again from the first page
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+    start = (page - 1) * PROFILE_PAGE_SIZE
+    shown = rows.iloc[start:start + PROFILE_PAGE_SIZE]
+    
+    st.dataframe(
+        shown,
+        hide_index=True,
+        use_container_width=True,
+        height=400,
+        column_config={
+            "profile_id": st.column_config.TextColumn("Profile"),
+            "name": st.column_config.TextColumn("Name"),
+            "actions": st.column_config.NumberColumn("Actions", format="%d"),
+            "successes": st.column_config.NumberColumn("Successes", format="%d"),
+            "reruns_recovered": st.column_config.NumberColumn("Reruns recovered", format="%d"),
+            "success_rate": st.column_config.ProgressColumn(
+                "Success rate", min_value=0, max_value=100, format="%.1f%%"
+            ),
+            "last_active": st.column_config.DatetimeColumn("Last active", format="YYYY-MM-DD HH:mm"),
+        },
+    )
+    if len(rows):
+        st.caption(f"Profiles {start + 1:,}-{start + len(shown):,} of {len(rows):,}"
+                   + (f" matching \"{query}\"" if query else ""))
+    else:
+        st.caption(f"No profile matches \"{query}\"")
+
+@tenant_scoped
 def main():
     """Main function to run the Streamlit dashboard."""
-    logger.debug("Starting dashboard application")
+    logger.debug("Starting dashboard application for tenant %s", selected_tenant())
+    render_tenant_picker()
     
     # Dashboard Title
     st.markdown("""
@@ -945,27 +1425,42 @@ def main():
     with col1:
         if st.button("🔄 Refresh", use_container_width=True):
             logger.debug("Manual refresh triggered")
+            # Drop cached results and throttled refreshes so the rerun reads fresh data
+            mark_data_stale()
             st.rerun()
             
     with col3:
-        # Direct download of raw data as Excel when button is clicked
-        if st.download_button(
-            label="Download Excel",
-            data=generate_raw_data_excel(),  # Generate Excel data directly on click
-            file_name=f"Buzztracker_Tweetbot_DB_Data_{datetime.now().strftime('%Y-%m-%d')}.xlsx", 
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True
-        ):
-            logger.debug("Raw data export triggered")
+        # Raw data export is built on demand, not on every rerun
+        render_export_controls()
     
+    # Create missing indexes and check the query plans (once per process and tenant)
+    start_index_maintenance(get_database)
+    # Prometheus metrics on METRICS_PORT, if set (once per process)
+    start_metrics_server(gauges=metrics_gauges)
+    problems = plan_problems()
+    if problems:
+        st.warning(
+            "Some dashboard queries scan the whole collection: "
+            + ", ".join(result.check.name for result in problems)
+            + ". Run `python indexes.py` for details."
+        )
+
     # Get all required data
-    total_engagements = get_total_engagements()
-    successful_engagements = get_successful_engagements()
-    success_ratio = get_success_ratio()
-    celebrity_data = get_celebrity_engagement_data()
-    user_data = get_user_engagement_data()
-    time_series_data = get_engagement_time_series()
-    rerun_data = get_rerun_comparison_data()
+    logger.debug("MongoDB pool connections before data load: %s", pool_stats())
+    if DATA_MODE == "live":
+        # Read the version first, so changes during the render trigger a rerun
+        refresh_when_live_data_changes(get_live_watcher(get_collection).version)
+    metrics = load_dashboard_metrics()
+    total_engagements = metrics.total_engagements
+    successful_engagements = metrics.successful_engagements
+    success_ratio = metrics.success_ratio
+    time_series_data = metrics.time_series
+    rerun_data = metrics.rerun
+
+    # The $facet already fetched the default 7-day series; register it so the
+    # trend chart's "Last 7d" query is answered without another round trip
+    if metrics.series_start is not None:
+        remember("time_series_filtered", (metrics.series_start, metrics.series_end), metrics.time_series)
 
     # Create a 2-column layout: Left for KPIs (1/3) and Right for pie chart (2/3)
     left_col, right_col = st.columns([1, 2])
@@ -1003,33 +1498,7 @@ def main():
         """, unsafe_allow_html=True)
         
         # Success ratio donut chart
-        fig_success = go.Figure(data=[go.Pie(
-            labels=['Successful', 'Failed'],
-            values=[success_ratio, 100 - success_ratio],
-            hole=0.7,
-            textinfo='none',
-            marker=dict(
-                colors=['#3B7D23', '#D9D9D9'],
-                line=dict(color='white', width=2)
-            )
-        )])
-        
-        fig_success.update_layout(
-            showlegend=False,
-            margin=dict(t=0, b=0, l=0, r=0),
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            height=250,
-            width=None,
-            annotations=[dict(
-                text=f"{success_ratio:.1f}%",
-                x=0.5, y=0.5,
-                font=dict(size=28, color='#6c3c00', family='Arial Black'),
-                showarrow=False
-            )]
-        )
-        
-        st.plotly_chart(fig_success, use_container_width=True)
+        st.plotly_chart(success_ratio_figure(success_ratio), use_container_width=True)
 
     # Rerun Facility and Tweets Engagements headings
     col1, col2 = st.columns([1, 1])
@@ -1050,704 +1519,53 @@ def main():
 
     # Left column - Performance comparison chart
     with col1:
-        # Create figure
-        fig_combined = go.Figure()
-        
-        # Add Initial Run bars (positioned at x=0,1,2)
-        fig_combined.add_trace(go.Bar(
-            name='Initial Run',
-            x=[0, 1, 2],  # Left side positions
-            y=[
-                rerun_data['initial']['likes'],
-                rerun_data['initial']['retweets'],
-                rerun_data['initial']['comments']
-            ],
-            marker_color=['#5CB338', '#FB4141', '#FFC145'],  # Keeping the original bar colors
-            text=[
-                rerun_data['initial']['likes'],
-                rerun_data['initial']['retweets'],
-                rerun_data['initial']['comments']
-            ],
-            textposition='outside',
-            textfont=dict(size=14   , color='#000000', family='Arial Black'),
-            width=0.8,
-            showlegend=False  # Remove legend
-        ))
-        
-        # Add Rerun bars (positioned at x=4,5,6)
-        fig_combined.add_trace(go.Bar(
-            name='Rerun',
-            x=[4, 5, 6],  # Right side positions
-            y=[
-                rerun_data['rerun']['likes'],
-                rerun_data['rerun']['retweets'],
-                rerun_data['rerun']['comments']
-            ],
-            marker_color=['#5CB338', '#FB4141', '#FFC145'],  # Keeping the original bar colors
-            text=[
-                rerun_data['rerun']['likes'],
-                rerun_data['rerun']['retweets'],
-                rerun_data['rerun']['comments']
-            ],
-            textposition='outside',
-            textfont=dict(size=14, color='#000000', family='Arial Black'),
-            width=0.8,
-            showlegend=False  # Remove legend
-        ))
-        
-        # Update layout with improved background
-        fig_combined.update_layout(
-            # Background colors
-            plot_bgcolor='#FAF3E0',  # Cream background color
-            paper_bgcolor='#FAF3E0', # Same cream background
-            
-            # Size and margins
-            height=520,  # Increased height for better visualization
-            margin=dict(l=40, r=40, t=60, b=50),  # Adjusted margins
-            
-            # Hide axes
-            xaxis=dict(
-                showgrid=False,
-                showticklabels=False,  # Hide tick labels for a clean look
-                showline=False,
-                zeroline=False  # Remove zero line
-            ),
-            yaxis=dict(
-                showgrid=False,
-                showticklabels=False,  # Hide tick labels
-                showline=False,
-                zeroline=False  # Remove zero line
-            ),
-            
-            # Add title with better styling
-            title=dict(
-                text='Initial Run vs Rerun Performance',
-                font=dict(size=16, color='#333333', family='Arial, sans-serif'),
-                x=0.5,  # Center title
-                y=0.98  # Adjusted position
-            )
-        )
-
-        # Find the maximum value across all bars
-        max_value = max([
-            rerun_data['initial']['likes'],
-            rerun_data['initial']['retweets'],
-            rerun_data['initial']['comments'],
-            rerun_data['rerun']['likes'],
-            rerun_data['rerun']['retweets'],
-            rerun_data['rerun']['comments']
-        ])
-
-        # Add some padding (20% more than max value)
-        y_axis_max = max_value * 1.2
-
-        # Update the layout with the new y-axis range
-        fig_combined.update_layout(
-            yaxis=dict(
-                range=[0, y_axis_max],  # Set the range from 0 to max_value + 20%
-                showgrid=False,
-                showticklabels=False,
-                showline=False,
-                zeroline=False
-            )
-        )
-
-        # Add a border around the entire plot
-        fig_combined.update_layout(
-            shapes=[
-                dict(
-                    type='rect',
-                    xref='paper', yref='paper',
-                    x0=0, y0=0, x1=1, y1=1,
-                    line=dict(color='#b0bec5', width=1),  # Softer gray border
-                    fillcolor='rgba(0,0,0,0)'
-                )
-            ]
-        )
-
-        # Add labels above each set with adjusted positioning
-        fig_combined.add_annotation(
-            x=0.15,  # Moved left (was 0.25)
-            y=1.1,
-            text="Initial Run",
-            showarrow=False,
-            font=dict(size=14, color='#000000', family='Arial Black'),
-            xref="paper",
-            yref="paper",
-            xanchor='center',  # Center align text
-            yanchor='middle'
-        )
-        fig_combined.add_annotation(
-            x=0.85,  # Moved right (was 0.75)
-            y=1.1,
-            text="Rerun",
-            showarrow=False,
-            font=dict(size=14, color='#000000', family='Arial Black'),
-            xref="paper",
-            yref="paper",
-            xanchor='center',  # Center align text
-            yanchor='middle'
-        )
-
-        # Center the main title
-        fig_combined.update_layout(
-            title=dict(
-                text='Initial Run vs Rerun Performance',
-                font=dict(size=16, color='#333333', family='Arial Black'),
-                x=0.5,
-                y=0.95,
-                xanchor='center',
-                yanchor='top'
-            )
-        )
-
-        # Add metric labels below bars with centered positioning
-        for i, metric in enumerate(['Likes', 'Retweets', 'Comments']):
-            # Labels for Initial Run
-            fig_combined.add_annotation(
-                x=i,
-                y=-0.1,
-                text=metric,
-                showarrow=False,
-                font=dict(size=12, color='#000000', family='Arial Black'),
-                yshift=-10,
-                xanchor='center',  # Center align text
-                yanchor='top'
-            )
-            # Labels for Rerun
-            fig_combined.add_annotation(
-                x=i+4,
-                y=-0.1,
-                text=metric,
-                showarrow=False,
-                font=dict(size=12, color='#000000', family='Arial Black'),
-                yshift=-10,
-                xanchor='center',  # Center align text
-                yanchor='top'
-            )
-        
-        st.plotly_chart(fig_combined, use_container_width=True)
+        st.plotly_chart(rerun_comparison_figure(rerun_data), use_container_width=True)
     
     # Right column - Daily Engagement Trends
     with col2:
-        # Date filter section - ADD THIS NEW SECTION
-        # Create a container for the date filter buttons
-        filter_container = st.container()
-        date_filter_col1, date_filter_col2, date_filter_col3, date_filter_col4, date_filter_col5 = filter_container.columns(5)
-        
-        # Store the currently selected filter in session state
-        if 'date_filter_selected' not in st.session_state:
-            st.session_state.date_filter_selected = 'last7d'
-        
-        # Store custom date range in session state
-        if 'custom_start_date' not in st.session_state:
-            # Default to 7 days ago
-            st.session_state.custom_start_date = (datetime.now() - timedelta(days=6)).date()
-        
-        if 'custom_end_date' not in st.session_state:
-            # Default to today
-            st.session_state.custom_end_date = datetime.now().date()
-        
-        # Current date for calculations
-        today = datetime.now()
-        
-        # Date filter buttons with styling matching the dashboard
-        filter_buttons_html = """
-        <style>
-        .date-filter-container {
-            display: flex;
-            gap: 8px;
-            margin-bottom: 15px;
-            flex-wrap: wrap;
-        }
-        .date-filter-button {
-            background-color: #722F37;
-            color: #F5DEB3;
-            border: none;
-            border-radius: 5px;
-            padding: 6px 12px;
-            font-weight: 600;
-            cursor: pointer;
-            transition: all 0.2s ease;
-            text-align: center;
-            flex-grow: 1;
-            min-width: 60px;
-        }
-        .date-filter-button:hover {
-            background-color: #8a3a45;
-        }
-        .date-filter-button.active {
-            background-color: #8a3a45;
-            border: 1px solid #F5DEB3;
-        }
-        </style>
-        """
-        
-        st.markdown(filter_buttons_html, unsafe_allow_html=True)
-        
-        # Button selection logic
-        with date_filter_col1:
-            last7d_active = "active" if st.session_state.date_filter_selected == "last7d" else ""
-            if st.button("Last 7d", key="last7d", use_container_width=True, 
-                       help="View data from the last 7 days"):
-                st.session_state.date_filter_selected = "last7d"
-                
-        with date_filter_col2:
-            last30d_active = "active" if st.session_state.date_filter_selected == "last30d" else ""
-            if st.button("Last 30d", key="last30d", use_container_width=True,
-                       help="View data from the last 30 days"):
-                st.session_state.date_filter_selected = "last30d"
-                
-        with date_filter_col3:
-            lastQ_active = "active" if st.session_state.date_filter_selected == "lastQ" else ""
-            if st.button("Last Q", key="lastQ", use_container_width=True,
-                       help="View data from the last quarter"):
-                st.session_state.date_filter_selected = "lastQ"
-                
-        with date_filter_col4:
-            ytd_active = "active" if st.session_state.date_filter_selected == "ytd" else ""
-            if st.button("YTD", key="ytd", use_container_width=True,
-                       help="View data year to date"):
-                st.session_state.date_filter_selected = "ytd"
-                
-        with date_filter_col5:
-            custom_active = "active" if st.session_state.date_filter_selected == "custom" else ""
-            if st.button("Custom", key="custom", use_container_width=True,
-                       help="Select a custom date range"):
-                st.session_state.date_filter_selected = "custom"
-        
-        # Show custom date selector if custom filter is selected
-        if st.session_state.date_filter_selected == "custom":
-            custom_col1, custom_col2 = st.columns(2)
-            
-            with custom_col1:
-                selected_start = st.date_input(
-                    "Start Date",
-                    value=st.session_state.custom_start_date,
-                    max_value=today
-                )
-                st.session_state.custom_start_date = selected_start
-                
-            with custom_col2:
-                selected_end = st.date_input(
-                    "End Date",
-                    value=st.session_state.custom_end_date,
-                    max_value=today
-                )
-                st.session_state.custom_end_date = selected_end
-
-            # Validate date range
-            if selected_start > selected_end:
-                st.markdown('<p style="color:black;">Start date cannot be after end date. Please select a valid date range.</p>', unsafe_allow_html=True)
-                # Swap the dates to fix the range
-                st.session_state.custom_start_date = selected_end
-                st.session_state.custom_end_date = selected_start
-                # Use corrected dates
-                start_date = datetime.combine(selected_end, datetime.min.time())
-                end_date = datetime.combine(selected_start, datetime.max.time())
-            else:
-                start_date = datetime.combine(selected_start, datetime.min.time())
-                end_date = datetime.combine(selected_end, datetime.max.time())
-        
-        # Calculate date range based on selected filter
-        end_date = datetime.now().replace(hour=23, minute=59, second=59)
-        
-        if st.session_state.date_filter_selected == "last7d":
-            start_date = (end_date - timedelta(days=6)).replace(hour=0, minute=0, second=0)
-        elif st.session_state.date_filter_selected == "last30d":
-            start_date = (end_date - timedelta(days=29)).replace(hour=0, minute=0, second=0)
-        elif st.session_state.date_filter_selected == "lastQ":
-            # Calculate start of the last quarter
-            current_month = end_date.month
-            quarter_month = ((current_month - 1) // 3) * 3 + 1  # Find start month of current quarter
-            
-            # If we're in the first month of a quarter (Jan/Apr/Jul/Oct)
-            if quarter_month == current_month:
-                # If January, go back to Q4 of previous year
-                if current_month == 1:
-                    start_date = datetime(end_date.year - 1, 10, 1)  # Q4 start (Oct 1)
-                else:
-                    start_date = datetime(end_date.year, quarter_month - 3, 1)  # Previous quarter start
-            else:
-                start_date = datetime(end_date.year, quarter_month, 1)  # Current quarter start
-
-            # Example: If today is March 15, 2024
-            # quarter_month would be 1 (Jan)
-            # This would show Q1 2024 (Jan 1 - Mar 15)
-            
-            # If today is April 2, 2024
-            # It would show Q1 2024 (Jan 1 - Mar 31)
-        elif st.session_state.date_filter_selected == "ytd":
-            start_date = datetime(end_date.year, 1, 1)
-        else:  # custom
-            start_date = datetime.combine(st.session_state.custom_start_date, datetime.min.time())
-            end_date = datetime.combine(st.session_state.custom_end_date, datetime.max.time())
-        
-        # Get filtered time series data
-        time_series_data = get_engagement_time_series_with_filter(start_date, end_date)
-
-        if not time_series_data.empty:
-            # Filter out zero values for x-axis display
-            non_zero_data = time_series_data[time_series_data['engagements'] > 0]
-            
-            # Find maximum value
-            max_value = time_series_data['engagements'].max()
-            if max_value == 0:
-                max_value = 1  # Prevent division by zero if no data
-                
-            # Calculate a proportional minimum value based on max_value
-            fixed_min = -max_value * 0.05  # Just 5% of max value as padding below zero
-            
-            fig_trends = go.Figure()
-            
-            # Add the main trace
-            fig_trends.add_trace(go.Scatter(
-                x=time_series_data['date'],
-                y=time_series_data['engagements'],
-                mode='lines+markers+text',
-                name='Engagements',
-                line=dict(
-                    color='#1DA1F2',
-                    width=4,
-                    shape='spline',
-                    smoothing=1.3
-                ),
-                marker=dict(
-                    size=[10 if val > 0 else 0 for val in time_series_data['engagements']],
-                    color='#1DA1F2'
-                ),
-                text=[str(int(val)) if val > 0 else "" for val in time_series_data['engagements']],
-                textposition='top center',
-                textfont=dict(
-                    size=14, 
-                    color='#000000', 
-                    family='Arial Black'
-                ),
-                showlegend=False
-            ))
-
-            fig_trends.update_layout(
-                plot_bgcolor='#FAF3E0',
-                paper_bgcolor='#FAF3E0',
-                height=400,
-                # Increase left and right margins to prevent label cropping
-                margin=dict(l=60, r=60, t=30, b=60),
-                yaxis=dict(
-                    range=[fixed_min, max_value * 1.15],
-                    showgrid=False,
-                    showticklabels=True,
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black',
-                    tickfont=dict(size=12, color='#000000', family='Arial Black'),
-                    zeroline=True,
-                    zerolinecolor='black',
-                    zerolinewidth=1
-                ),
-                xaxis=dict(
-                    showgrid=False,
-                    showticklabels=True,
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black',
-                    tickfont=dict(size=12, color='#000000', family='Arial Black'),
-                    # Use non_zero_data for tick values
-                    tickmode='array',
-                    ticktext=[d.strftime("%b %d") for d in non_zero_data['date']],
-                    tickvals=non_zero_data['date'],
-                    range=[
-                        start_date - timedelta(hours=12),  # Add padding to prevent label cropping
-                        end_date + timedelta(hours=12)
-                    ]
-                )
-            )
-
-            # Special handling for Last 7 days
-            if st.session_state.date_filter_selected == "last7d":
-                # Ensure exactly 7 days
-                end_date = datetime.now().replace(hour=23, minute=59, second=59)
-                start_date = (end_date - timedelta(days=6)).replace(hour=0, minute=0, second=0)
-                
-                # Create array of all 7 dates regardless of data
-                all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
-                
-                fig_trends.update_xaxes(
-                    range=[
-                        start_date - timedelta(hours=12),
-                        end_date + timedelta(hours=12)
-                    ],
-                    tickmode='array',
-                    ticktext=[d.strftime("%B %d") for d in all_dates],  # Changed to "March 14" format
-                    tickvals=all_dates,
-                    tickangle=0,  # Horizontal labels
-                    tickfont=dict(size=10, color='#000000', family='Arial Black')  # Smaller font for longer labels
-                )
-            elif st.session_state.date_filter_selected == "last30d":
-                # Ensure exactly 30 days
-                end_date = datetime.now().replace(hour=23, minute=59, second=59)
-                start_date = (end_date - timedelta(days=29)).replace(hour=0, minute=0, second=0)
-                
-                fig_trends.update_xaxes(
-                    range=[
-                        start_date - timedelta(hours=12),  # Start from exactly 30 days ago
-                        end_date + timedelta(hours=12)
-                    ],
-                    showticklabels=False,  # Hide x-axis labels
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black'
-                )
-                
-                # Update hover template to show full date
-                fig_trends.update_traces(
-                    hovertemplate="<b>%{x|%B %d}</b><br>" +
-                                "Engagements: %{y}<br>" +
-                                "<extra></extra>"
-                )
-            elif st.session_state.date_filter_selected == "lastQ":
-                # Calculate start of the last quarter
-                current_month = end_date.month
-                quarter_month = ((current_month - 1) // 3) * 3 + 1  # Find start month of current quarter
-                
-                # If we're in the first month of a quarter (Jan/Apr/Jul/Oct)
-                if quarter_month == current_month:
-                    # If January, go back to Q4 of previous year
-                    if current_month == 1:
-                        start_date = datetime(end_date.year - 1, 10, 1)  # Q4 start (Oct 1)
-                    else:
-                        start_date = datetime(end_date.year, quarter_month - 3, 1)  # Previous quarter start
-                else:
-                    start_date = datetime(end_date.year, quarter_month, 1)  # Current quarter start
-
-                # Example: If today is March 15, 2024
-                # quarter_month would be 1 (Jan)
-                # This would show Q1 2024 (Jan 1 - Mar 15)
-                
-                # If today is April 2, 2024
-                # It would show Q1 2024 (Jan 1 - Mar 31)
-                
-                fig_trends.update_xaxes(
-                    range=[
-                        start_date - timedelta(hours=12),  # Start from beginning of quarter
-                        end_date + timedelta(hours=12)
-                    ],
-                    showticklabels=False,  # Hide x-axis labels
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black'
-                )
-                
-                # Update hover template to show full date
-                fig_trends.update_traces(
-                    hovertemplate="<b>%{x|%B %d}</b><br>" +
-                                "Engagements: %{y}<br>" +
-                                "<extra></extra>"  # Removes trace name from hover
-                )
-            elif st.session_state.date_filter_selected == "ytd":
-                # YTD date range is already calculated (Jan 1 to current date)
-                fig_trends.update_xaxes(
-                    range=[
-                        start_date - timedelta(hours=12),  # Start from Jan 1
-                        end_date + timedelta(hours=12)
-                    ],
-                    showticklabels=False,  # Hide x-axis labels
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black'
-                )
-                
-                # Update hover template to show full date
-                fig_trends.update_traces(
-                    hovertemplate="<b>%{x|%B %d}</b><br>" +
-                                "Engagements: %{y}<br>" +
-                                "<extra></extra>"
-                )
-            elif st.session_state.date_filter_selected == "custom":
-                fig_trends.update_xaxes(
-                    range=[
-                        start_date - timedelta(hours=12),
-                        end_date + timedelta(hours=12)
-                    ],
-                    showticklabels=False,  # Hide x-axis labels
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black'
-                )
-                
-                # Update hover template to show full date
-                fig_trends.update_traces(
-                    hovertemplate="<b>%{x|%B %d}</b><br>" +
-                                "Engagements: %{y}<br>" +
-                                "<extra></extra>"
-                )
-            else:
-                # For Last 30 days and other ranges
-                fig_trends.update_xaxes(
-                    range=[
-                        non_zero_data['date'].min() - timedelta(hours=12),  # Align with first data point
-                        non_zero_data['date'].max() + timedelta(hours=12)
-                    ],
-                    showticklabels=False,  # Hide x-axis labels
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black'
-                )
-                
-                # Update hover template to show full date
-                fig_trends.update_traces(
-                    hovertemplate="<b>%{x|%B %d}</b><br>" +
-                                  "Engagements: %{y}<br>" +
-                                  "<extra></extra>"  # Removes trace name from hover
-                )
-
-            # Update layout for both cases
-            fig_trends.update_layout(
-                plot_bgcolor='#FAF3E0',
-                paper_bgcolor='#FAF3E0',
-                height=450, # Updated for DATA FILTER CHART & EVEN PURPSOE
-                margin=dict(l=60, r=60, t=30, b=60),
-                yaxis=dict(
-                    range=[fixed_min, max_value * 1.15],
-                    showgrid=False,
-                    showticklabels=True,
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black',
-                    tickfont=dict(size=12, color='#000000', family='Arial Black'),
-                    zeroline=True,
-                    zerolinecolor='black',
-                    zerolinewidth=1
-                ),
-                width=None  # This allows the chart to use full container width
-            )
-
-            st.plotly_chart(fig_trends, use_container_width=True)
-        else:
-            st.debug("No data available for the selected date range.")
+        render_trends_section()
 
     # Create a single set of columns for both headers and charts
     col1, col2 = st.columns([1, 1])
 
-
-    # For both Celebrity and User Engagements charts
-    # Calculate maximum text width padding based on the values
-    def get_max_text_padding(values):
-        max_value = max(values)
-        return max_value * 0.15  # 15% padding for text
-
-    # Top 5 Celebrity Engagements
+    # Celebrity and user leaderboards, paged independently
     with col1:
-        # Add header
-        st.markdown("""
-            <div style="background: #722F37; padding: 15px; border-radius: 15px; margin: 20px 0;">
-                <h2 style="color: #F5DEB3; font-size: 24px; margin: 0;">Top 5 Celebrity Engagements</h2>
-            </div>
-        """, unsafe_allow_html=True)
+        render_leaderboard("celebrities", "Celebrity Engagements")
 
-        if not celebrity_data.empty:
-            # Sort in descending order by engagements
-            celebrity_data = celebrity_data.sort_values('engagements', ascending=False)
-            reversed_username_array = celebrity_data['username'].tolist()[::-1]
-            
-            # Calculate padding
-            text_padding = get_max_text_padding(celebrity_data['engagements'])
-            
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                y=celebrity_data['username'],
-                x=celebrity_data['engagements'],
-                orientation='h',
-                marker_color='#3498db',
-                text=celebrity_data['engagements'],
-                textposition='outside',
-                textfont=dict(size=14, color='#000000', family='Arial Black')
-            ))
-            
-            fig.update_layout(
-                plot_bgcolor='#FAF3E0',
-                paper_bgcolor='#FAF3E0',
-                height=450,
-                margin=dict(l=20, r=100, t=20, b=20),  # Increased right margin
-                showlegend=False,
-                xaxis=dict(
-                    range=[0, max(celebrity_data['engagements']) + text_padding],  # Add padding for text
-                    showgrid=False,
-                    showticklabels=True,
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black',
-                    tickfont=dict(size=12, color='#000000', family='Arial Black')
-                ),
-                yaxis=dict(
-                    categoryorder='array',
-                    categoryarray=reversed_username_array,
-                    showgrid=False,
-                    showticklabels=True,
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black',
-                    tickfont=dict(size=12, color='#000000', family='Arial Black')
-                )
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
-
-    # User Engagements - Column 2
     with col2:
-        # Add header
-        st.markdown("""
-            <div style="background: #722F37; padding: 15px; border-radius: 15px; margin: 20px 0;">
-                <h2 style="color: #F5DEB3; font-size: 24px; margin: 0;">Top 5 User Engagements</h2>
-            </div>
-        """, unsafe_allow_html=True)
+        render_leaderboard("users", "User Engagements")
 
-        if not user_data.empty:
-            # Sort in descending order by engagements
-            user_data = user_data.sort_values('engagements', ascending=False)
-            reversed_name_array = user_data['name'].tolist()[::-1]
-            
-            # Calculate padding
-            text_padding = get_max_text_padding(user_data['engagements'])
-            
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                y=user_data['name'],
-                x=user_data['engagements'],
-                orientation='h',
-                marker_color='#3498db',
-                text=user_data['engagements'],
-                textposition='outside',
-                textfont=dict(size=14, color='#000000', family='Arial Black')
-            ))
-            
-            fig.update_layout(
-                plot_bgcolor='#FAF3E0',
-                paper_bgcolor='#FAF3E0',
-                height=450,
-                margin=dict(l=20, r=100, t=20, b=20),  # Increased right margin
-                showlegend=False,
-                xaxis=dict(
-                    range=[0, max(user_data['engagements']) + text_padding],  # Add padding for text
-                    showgrid=False,
-                    showticklabels=True,
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black',
-                    tickfont=dict(size=12, color='#000000', family='Arial Black')
-                ),
-                yaxis=dict(
-                    categoryorder='array',
-                    categoryarray=reversed_name_array,
-                    showgrid=False,
-                    showticklabels=True,
-                    showline=True,
-                    linewidth=1,
-                    linecolor='black',
-                    tickfont=dict(size=12, color='#000000', family='Arial Black')
-                )
+    st.markdown("""
+        <div style="background: #722F37; padding: 15px; border-radius: 15px; margin: 20px 0;">
+            <h2 style="color: #F5DEB3; font-size: 24px; margin: 0;">Profile Performance</h2>
+        </div>
+    """, unsafe_allow_html=True)
+    render_profile_table()
+
+    # Per-call timings, cache and pool counters for tuning the data layer
+    with st.expander("Diagnostics", expanded=False):
+        st.caption(f"Database: {selected_tenant()}")
+        st.caption("Data-layer calls (documents examined come from sampled explains)")
+        st.dataframe(call_log.summary(), hide_index=True, use_container_width=True)
+        st.caption("Recent calls")
+        st.dataframe(call_log.recent(), hide_index=True, use_container_width=True)
+        st.caption(f"Result cache: {result_cache.size_bytes / 1024:.1f} KiB of {result_cache.max_bytes / 1024 / 1024:.0f} MiB used")
+        st.dataframe(result_cache.stats(), hide_index=True, use_container_width=True)
+        pool = pool_stats()
+        st.caption(
+            f"Connection pool: {pool['open']} open, {pool['checked_out']} in use, "
+            f"{pool['created_total']} created, {pool['closed_total']} closed"
+        )
+        if DATA_MODE == "snapshot":
+            snapshot = get_snapshot(get_collection)
+            st.caption(
+                f"Snapshot: {len(snapshot.frame) if snapshot.ready else 0:,} rows, "
+                f"{snapshot.memory_bytes() / 1024 / 1024:.1f} MiB, "
+                f"last refresh took {snapshot.last_refresh_seconds:.2f}s"
             )
-            
-            st.plotly_chart(fig, use_container_width=True)
+            st.dataframe(snapshot.memory_report(), hide_index=True, use_container_width=True)
 
 if __name__ == "__main__":
-    main()
+    # Identical queries within one script run are only executed once
+    with run_scope("dashboard render"):
+        main()
@@ -0,0 +1,290 @@
+"""
+Indexes the dashboard relies on, and a check that its queries use them.
+
+`ensure_indexes` creates every declared index that is missing, and
+`verify_query_plans` runs `explain` on each dashboard pipeline, reporting
+those whose winning plan is a collection scan. Run `python indexes.py` in a
+deployment step (it exits with status 1 when a pipeline scans the
+collection unexpectedly), or let the dashboard do both in a background
+thread at startup and show a warning.
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+from breakdown import breakdown_stages, rollup_breakdown_stages
+from classify import CLASSIFICATION_INDEX, CLASSIFICATION_KEYS, RERUN_RESOLVED_FILTER
+from db import ACTIONS_COLLECTION
+from export import export_query
+from logger import setup_logger
+from metrics import (
+    CLASSIFIED_INITIAL_SUCCESS_FILTER, CLASSIFIED_RERUN_SUCCESS_FILTER, CLASSIFIED_SUCCESSFUL_FILTER,
+    UNCLASSIFIED_FILTER, action_class_stages, build_facet_pipeline, default_series_window,
+    time_series_stages
+)
+from leaderboard import BOARDS, RANK_SORT, keyset_filter
+from profiles import profile_stages
+from rollup import ROLLUP_COLLECTION
+from tenant import tenant_resource
+
+logger = setup_logger(__name__)
+
+
+@dataclass
+class IndexSpec:
+    """An index the dashboard needs."""
+    collection: str
+    keys: list
+    name: str
+    options: dict = field(default_factory=dict)
+
+
+INDEXES = [
+    # Time series, export date range, rollup day ranges
+    IndexSpec(ACTIONS_COLLECTION, [("date", 1)], "date_1"),
+    # Celebrity leaderboard (covered: only username is read)
+    IndexSpec(ACTIONS_COLLECTION, [("username", 1)], "username_1"),
+    # User leaderboard, walked in name order
+    IndexSpec(ACTIONS_COLLECTION, [("name", 1)], "name_1"),
+    # Success and rerun counts; result/rerun themselves are only ever matched
+    # with case-insensitive regexes, which an index can't serve
+    IndexSpec(ACTIONS_COLLECTION, CLASSIFICATION_KEYS, CLASSIFICATION_INDEX),
+    # Time series read from the rollup
+    IndexSpec(ROLLUP_COLLECTION, [("day", 1)], "day_1"),
+    # Keyset pages of the materialized leaderboards
+    *(IndexSpec(board.collection, list(RANK_SORT.items()), "engagements_-1_key_1") for board in BOARDS.values()),
+]
+
+
+@dataclass
+class PlanCheck:
+    """One dashboard pipeline and whether scanning the whole collection is acceptable."""
+    name: str
+    collection: str
+    pipeline: list
+    allow_collscan: bool = False
+    reason: str = ""
+
+
+@dataclass
+class PlanResult:
+    """Outcome of explaining one PlanCheck."""
+    check: PlanCheck
+    stages: list = field(default_factory=list)
+    collscan: bool = False
+    error: str = ""
+
+    @property
+    def ok(self):
+        return not self.error and (not self.collscan or self.check.allow_collscan)
+
+
+def dashboard_plans():
+    """
+    The pipelines the dashboard runs, with their current parameters.
+
+    Returns:
+        list[PlanCheck]: Pipelines to explain
+    """
+    series_start, series_end = default_series_window()
+    return [
+        PlanCheck("successful", ACTIONS_COLLECTION, [{"$match": CLASSIFIED_SUCCESSFUL_FILTER}]),
+        PlanCheck("rerun_initial", ACTIONS_COLLECTION, action_class_stages(CLASSIFIED_INITIAL_SUCCESS_FILTER)),
+        PlanCheck("rerun_rerun", ACTIONS_COLLECTION, action_class_stages(CLASSIFIED_RERUN_SUCCESS_FILTER)),
+        PlanCheck("celebrities", ACTIONS_COLLECTION, BOARDS["celebrities"].entry_stages()),
+        PlanCheck("users", ACTIONS_COLLECTION, BOARDS["users"].entry_stages()),
+        *(PlanCheck(f"{name}_page", board.collection,
+                    [{"$match": keyset_filter((1, ""))}, {"$sort": RANK_SORT}, {"$limit": 6}])
+          for name, board in BOARDS.items()),
+        PlanCheck("time_series", ACTIONS_COLLECTION, time_series_stages(series_start, series_end)),
+        PlanCheck("time_series_breakdown", ACTIONS_COLLECTION, breakdown_stages(series_start, series_end)),
+        PlanCheck("export_range", ACTIONS_COLLECTION,
+                  [{"$match": export_query(series_start, series_end)}]),
+        PlanCheck("unclassified", ACTIONS_COLLECTION, [{"$match": UNCLASSIFIED_FILTER}]),
+        PlanCheck("rerun_resolved", ACTIONS_COLLECTION, [{"$match": RERUN_RESOLVED_FILTER}]),
+        PlanCheck("rollup_time_series", ROLLUP_COLLECTION,
+                  [{"$match": {"day": {"$gte": series_start, "$lte": series_end}}}]),
+        PlanCheck("rollup_breakdown", ROLLUP_COLLECTION, rollup_breakdown_stages(series_start, series_end)),
+        PlanCheck("dashboard_facet", ACTIONS_COLLECTION, build_facet_pipeline(series_start, series_end),
+                  allow_collscan=True, reason="$facet always reads every document; use the rollup"),
+        PlanCheck("profiles", ACTIONS_COLLECTION, profile_stages(),
+                  allow_collscan=True, reason="groups every action by profile"),
+        PlanCheck("rollup_summary", ROLLUP_COLLECTION,
+                  [{"$group": {"_id": "$action_class", "count": {"$sum": "$count"}}}],
+                  allow_collscan=True, reason="one small document per day and bucket"),
+    ]
+
+
+def ensure_indexes(db, specs=None):
+    """
+    Create the declared indexes that don't exist yet.
+
+    Existing indexes are matched on their key pattern, so an index created
+    by hand under another name isn't duplicated. Since MongoDB 4.2 index
+    builds only lock the collection briefly at the start and end, so this is
+    safe while the bot is writing.
+
+    Args:
+        db (pymongo.database.Database): Dashboard database
+        specs (list[IndexSpec], optional): Indexes to ensure, INDEXES by default
+
+    Returns:
+        list: Names of the indexes created
+    """
+    created = []
+    for spec in specs or INDEXES:
+        collection = db[spec.collection]
+        existing = [list(index["key"].items()) for index in collection.list_indexes()]
+        if [tuple(key) for key in spec.keys] in existing:
+            continue
+        started = time.perf_counter()
+        collection.create_index(spec.keys, name=spec.name, **spec.options)
+        logger.info("Created index %s.%s in %.2fs", spec.collection, spec.name, time.perf_counter() - started)
+        created.append(spec.name)
+    return created
+
+
+def plan_stages(explain):
+    """
+    Stage names of the winning plan(s) in an explain document.
+
+    Walks every nested plan (aggregation cursors, $facet, $or branches,
+    classic and slot-based engine layouts) but skips rejected plans.
+    """
+    stages = []
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "rejectedPlans":
+                continue
+            if key == "stage" and isinstance(value, str):
+                stages.append(value)
+            else:
+                stages.extend(plan_stages(value))
+    elif isinstance(explain, list):
+        for item in explain:
+            stages.extend(plan_stages(item))
+    return stages
+
+
+def explain_pipeline(db, collection_name, pipeline):
+    """Query planner output for an aggregation pipeline."""
+    return db.command(
+        "explain",
+        {"aggregate": collection_name, "pipeline": pipeline, "cursor": {}},
+        verbosity="queryPlanner"
+    )
+
+
+def verify_query_plans(db, checks=None):
+    """
+    Explain each dashboard pipeline and flag collection scans.
+
+    Args:
+        db (pymongo.database.Database): Dashboard database
+        checks (list[PlanCheck], optional): Pipelines to explain, dashboard_plans() by default
+
+    Returns:
+        list[PlanResult]: One result per pipeline
+    """
+    results = []
+    for check in checks or dashboard_plans():
+        result = PlanResult(check)
+        try:
+            result.stages = plan_stages(explain_pipeline(db, check.collection, check.pipeline))
+            result.collscan = "COLLSCAN" in result.stages
+        except Exception as e:
+            result.error = str(e)
+        if result.error:
+            logger.error("Could not explain %s: %s", check.name, result.error)
+        elif not result.ok:
+            logger.warning("Pipeline %s scans %s: %s", check.name, check.collection, " > ".join(result.stages))
+        else:
+            logger.debug("Pipeline %s plan: %s", check.name, " > ".join(result.stages))
+        results.append(result)
+    return results
+
+
+_report_lock = threading.Lock()
+
+
+def _tenant_report():
+    """Whether the current tenant's maintenance has started, and its plan results."""
+    return tenant_resource("index_report", lambda: {"started": False, "results": None})
+
+
+def _maintain_indexes(get_db, create, report):
+    try:
+        db = get_db()
+        if create:
+            ensure_indexes(db)
+        report["results"] = verify_query_plans(db)
+    except Exception as e:
+        logger.error("Index maintenance failed: %s", e)
+
+
+def start_index_maintenance(get_db):
+    """
+    Create missing indexes and verify the query plans once per process and
+    tenant, in a background thread so the first page load isn't held up.
+
+    `get_db` is called from that thread, so connection or configuration
+    errors are logged there instead of breaking the page.
+
+    DASHBOARD_ENSURE_INDEXES=0 only verifies (e.g. for a read-only user);
+    DASHBOARD_VERIFY_INDEXES=0 disables both.
+    """
+    if os.getenv("DASHBOARD_VERIFY_INDEXES", "1") != "1":
+        return
+    report = _tenant_report()
+    with _report_lock:
+        if report["started"]:
+            return
+        report["started"] = True
+    create = os.getenv("DASHBOARD_ENSURE_INDEXES", "1") == "1"
+    # get_db() in the thread resolves to the tenant that started it
+    context = contextvars.copy_context()
+    threading.Thread(
+        target=context.run, args=(_maintain_indexes, get_db, create, report),
+        name="index-maintenance", daemon=True
+    ).start()
+
+
+def plan_problems():
+    """
+    Pipelines found scanning a collection (or failing to explain) by the
+    background check; empty until it has finished.
+
+    Returns:
+        list[PlanResult]: Results that aren't ok
+    """
+    return [result for result in _tenant_report()["results"] or [] if not result.ok]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+
+    from db import get_database
+
+    parser = argparse.ArgumentParser(description="Create and verify the dashboard's MongoDB indexes")
+    parser.add_argument("--no-create", action="store_true", help="Only verify the query plans")
+    args = parser.parse_args()
+
+    load_dotenv()
+    database = get_database()
+    if not args.no_create:
+        for index_name in ensure_indexes(database):
+            print(f"created {index_name}")
+    problems = 0
+    for result in verify_query_plans(database):
+        status = "ok" if result.ok else "FAIL"
+        detail = result.error or " > ".join(result.stages)
+        if result.collscan and result.check.allow_collscan:
+            detail += f" (allowed: {result.check.reason})"
+        print(f"{status:4} {result.check.name:20} {detail}")
+        problems += not result.ok
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,403 @@
+"""
+Per-call timing and query statistics for the dashboard's data layer.
+
+Each data function decorated with `instrumented` produces a CallRecord:
+wall time, how the result cache answered, the MongoDB commands it ran
+(count and server-side time, from a pymongo CommandListener), documents
+returned and the size of its result. When DIAGNOSTICS_EXPLAIN_SAMPLE is
+set, a sample of the commands is re-run with `explain` (executionStats) in
+the background to fill in the documents and index keys examined. That
+executes the sampled queries a second time, so it is off by default.
+
+The records feed the dashboard's "Diagnostics" panel and a Prometheus text
+exposition, served on METRICS_PORT when it is set.
+"""
+import contextvars
+import functools
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+from pymongo import monitoring
+
+from cache import cache_status_scope, estimate_size, last_cache_status
+from logger import setup_logger
+from tenant import current_tenant
+
+logger = setup_logger(__name__)
+
+# Recent calls kept for the Diagnostics panel
+DEFAULT_HISTORY = 500
+
+# Share of find/aggregate/count commands re-run with explain to count
+# documents examined; executionStats runs the query again, so it's opt-in
+DEFAULT_EXPLAIN_SAMPLE = 0.0
+
+# Commands explain can run
+EXPLAINABLE_COMMANDS = ("aggregate", "find", "count", "distinct")
+
+# Command fields added by the driver that explain doesn't accept
+_DRIVER_FIELDS = ("lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "apiVersion")
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Call in progress in this context
+_current = contextvars.ContextVar("instrumentation_current", default=None)
+
+
+@dataclass
+class CallRecord:
+    """What one data-layer call cost."""
+    function: str
+    started_at: float
+    tenant: str = None
+    seconds: float = 0.0
+    cache: str = "none"
+    commands: int = 0
+    server_seconds: float = 0.0
+    docs_returned: int = 0
+    docs_examined: int = None
+    keys_examined: int = None
+    explained: int = 0
+    result_bytes: int = 0
+
+
+class CallLog:
+    """Recent CallRecords plus running totals per function for Prometheus."""
+
+    def __init__(self, history=DEFAULT_HISTORY):
+        self._lock = threading.Lock()
+        self.records = deque(maxlen=history)
+        self.totals = {}
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+            totals = self.totals.setdefault(record.function, {
+                "calls": {}, "seconds": 0.0, "buckets": [0] * len(LATENCY_BUCKETS),
+                "commands": 0, "server_seconds": 0.0, "docs_returned": 0, "result_bytes": 0,
+                "docs_examined": 0, "keys_examined": 0, "explained": 0,
+            })
+            totals["calls"][record.cache] = totals["calls"].get(record.cache, 0) + 1
+            totals["seconds"] += record.seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if record.seconds <= bound:
+                    totals["buckets"][i] += 1
+            totals["commands"] += record.commands
+            totals["server_seconds"] += record.server_seconds
+            totals["docs_returned"] += record.docs_returned
+            totals["result_bytes"] = record.result_bytes
+
+    def add_explain(self, record, docs_examined, keys_examined):
+        """Fold the result of a sampled explain into a (possibly finished) record."""
+        with self._lock:
+            record.docs_examined = (record.docs_examined or 0) + docs_examined
+            record.keys_examined = (record.keys_examined or 0) + keys_examined
+            record.explained += 1
+            totals = self.totals.get(record.function)
+            if totals is not None:
+                totals["docs_examined"] += docs_examined
+                totals["keys_examined"] += keys_examined
+                totals["explained"] += 1
+
+    def recent(self, limit=50):
+        """
+        The most recent calls, newest first.
+
+        Returns:
+            pandas.DataFrame: One row per call
+        """
+        with self._lock:
+            records = list(self.records)[-limit:]
+        rows = [asdict(record) for record in reversed(records)]
+        frame = pd.DataFrame(rows, columns=list(CallRecord.__dataclass_fields__))
+        frame['started_at'] = pd.to_datetime(frame['started_at'], unit='s')
+        frame['ms'] = (frame.pop('seconds') * 1000).round(1)
+        return frame
+
+    def summary(self):
+        """
+        Per-function statistics over the recent calls.
+
+        Returns:
+            pandas.DataFrame: calls, cache hit rate, latency percentiles,
+            average documents returned/examined and last result size
+        """
+        with self._lock:
+            records = list(self.records)
+        rows = []
+        for function in sorted({record.function for record in records}):
+            calls = [record for record in records if record.function == function]
+            millis = np.array([record.seconds for record in calls]) * 1000
+            answered = [record for record in calls if record.cache != "none"]
+            hits = sum(record.cache in ("hit", "memo") for record in answered)
+            explained = [record for record in calls if record.explained]
+            rows.append({
+                "function": function,
+                "calls": len(calls),
+                "cache_hit_rate": round(hits / len(answered) * 100, 1) if answered else None,
+                "p50_ms": round(float(np.percentile(millis, 50)), 1),
+                "p95_ms": round(float(np.percentile(millis, 95)), 1),
+                "max_ms": round(float(millis.max()), 1),
+                "commands": round(sum(record.commands for record in calls) / len(calls), 1),
+                "docs_returned": round(sum(record.docs_returned for record in calls) / len(calls), 1),
+                "docs_examined": round(
+                    sum(record.docs_examined for record in explained) / len(explained), 1
+                ) if explained else None,
+                "result_bytes": calls[-1].result_bytes,
+            })
+        return pd.DataFrame(rows)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+            self.totals.clear()
+
+
+call_log = CallLog(int(os.getenv("DIAGNOSTICS_HISTORY", DEFAULT_HISTORY)))
+
+
+@contextmanager
+def track(function):
+    """Record the data-layer call made inside the block as `function`."""
+    record = CallRecord(function=function, started_at=time.time(), tenant=current_tenant().name)
+    token = _current.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - started
+        _current.reset(token)
+        call_log.add(record)
+
+
+def instrumented(name=None):
+    """
+    Decorator recording every call of a data function in the call log.
+
+    Place it above @cached so the cache status is recorded too.
+
+    Args:
+        name (str, optional): Name shown in diagnostics, the function's name by default
+    """
+    def decorator(func):
+        function = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(function) as record:
+                with cache_status_scope():
+                    value = func(*args, **kwargs)
+                    record.cache = last_cache_status() or "none"
+                record.result_bytes = estimate_size(value)
+            return value
+        return wrapper
+    return decorator
+
+
+def _explain_counts(explain):
+    """Sum totalDocsExamined and totalKeysExamined over an executionStats explain."""
+    docs = keys = 0
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key in ("allPlansExecution", "rejectedPlans"):
+                continue
+            if key == "totalDocsExamined" and isinstance(value, (int, float)):
+                docs += int(value)
+            elif key == "totalKeysExamined" and isinstance(value, (int, float)):
+                keys += int(value)
+            else:
+                sub_docs, sub_keys = _explain_counts(value)
+                docs += sub_docs
+                keys += sub_keys
+    elif isinstance(explain, list):
+        for item in explain:
+            sub_docs, sub_keys = _explain_counts(item)
+            docs += sub_docs
+            keys += sub_keys
+    return docs, keys
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """
+    Attributes the MongoDB commands run inside a tracked call to its record.
+
+    pymongo publishes command events on the thread running the operation,
+    so the call in progress is found through the context variable.
+    """
+
+    def __init__(self, explain_sample=None):
+        self.explain_sample = explain_sample if explain_sample is not None else float(
+            os.getenv("DIAGNOSTICS_EXPLAIN_SAMPLE", DEFAULT_EXPLAIN_SAMPLE)
+        )
+        self._pending = {}
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        # At most one explain queued or running; further samples are dropped
+        self._explain_slot = threading.Semaphore(1)
+
+    def started(self, event):
+        record = _current.get()
+        if (record is not None and event.command_name in EXPLAINABLE_COMMANDS
+                and random.random() < self.explain_sample):
+            command = {
+                key: value for key, value in event.command.items()
+                if not key.startswith("$") and key not in _DRIVER_FIELDS
+            }
+            self._pending[event.request_id] = (record, event.database_name, command)
+
+    def succeeded(self, event):
+        pending = self._pending.pop(event.request_id, None)
+        record = _current.get()
+        if record is None:
+            return
+        record.commands += 1
+        record.server_seconds += event.duration_micros / 1e6
+        reply = event.reply or {}
+        cursor = reply.get("cursor")
+        if isinstance(cursor, dict):
+            record.docs_returned += len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+        elif "n" in reply:
+            record.docs_returned += 1
+        if pending is not None and self._explain_slot.acquire(blocking=False):
+            # Explained with the client of the tenant that ran the command
+            self._explainer.submit(contextvars.copy_context().run, self._explain, *pending)
+
+    def failed(self, event):
+        self._pending.pop(event.request_id, None)
+        record = _current.get()
+        if record is not None:
+            record.commands += 1
+            record.server_seconds += event.duration_micros / 1e6
+
+    def _explain(self, record, database_name, command):
+        # Imported here: db registers this listener when creating the client
+        from db import get_client
+
+        try:
+            explain = get_client()[database_name].command(
+                "explain", command, verbosity="executionStats"
+            )
+            call_log.add_explain(record, *_explain_counts(explain))
+        except Exception as e:
+            logger.debug("Sampled explain of %s failed: %s", record.function, e)
+        finally:
+            self._explain_slot.release()
+
+
+command_recorder = CommandRecorder()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(gauges=None):
+    """
+    Call statistics in the Prometheus text exposition format.
+
+    Args:
+        gauges (dict, optional): Extra gauges as name -> (help, value)
+
+    Returns:
+        str: Metrics page
+    """
+    with call_log._lock:
+        totals = {function: dict(values, calls=dict(values["calls"]), buckets=list(values["buckets"]))
+                  for function, values in call_log.totals.items()}
+
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    metric("dashboard_calls_total", "counter", "Data-layer calls by function and cache status", [
+        ({"function": function, "cache": cache}, count)
+        for function, values in totals.items() for cache, count in values["calls"].items()
+    ])
+
+    histogram = []
+    for function, values in totals.items():
+        for bound, count in zip(LATENCY_BUCKETS, values["buckets"]):
+            histogram.append(({"function": function, "le": bound}, count))
+        calls = sum(values["calls"].values())
+        histogram.append(({"function": function, "le": "+Inf"}, calls))
+    lines.append("# HELP dashboard_call_seconds Wall time of data-layer calls")
+    lines.append("# TYPE dashboard_call_seconds histogram")
+    for labels, value in histogram:
+        lines.append(f'dashboard_call_seconds_bucket{{function="{_escape(labels["function"])}",le="{labels["le"]}"}} {value}')
+    for function, values in totals.items():
+        lines.append(f'dashboard_call_seconds_sum{{function="{_escape(function)}"}} {values["seconds"]}')
+        lines.append(f'dashboard_call_seconds_count{{function="{_escape(function)}"}} {sum(values["calls"].values())}')
+
+    for name, key, kind, help_text in (
+        ("dashboard_mongo_commands_total", "commands", "counter", "MongoDB commands run by data-layer calls"),
+        ("dashboard_mongo_server_seconds_total", "server_seconds", "counter", "Time spent in MongoDB commands"),
+        ("dashboard_docs_returned_total", "docs_returned", "counter", "Documents returned by MongoDB"),
+        ("dashboard_docs_examined_total", "docs_examined", "counter",
+         "Documents examined by the sampled explains (see dashboard_explains_total)"),
+        ("dashboard_keys_examined_total", "keys_examined", "counter", "Index keys examined by the sampled explains"),
+        ("dashboard_explains_total", "explained", "counter", "Commands re-run with explain"),
+        ("dashboard_result_bytes", "result_bytes", "gauge", "Approximate size of the last result"),
+    ):
+        metric(name, kind, help_text, [({"function": function}, values[key]) for function, values in totals.items()])
+
+    for name, (help_text, value) in (gauges or {}).items():
+        metric(name, "gauge", help_text, [({}, value)])
+    return "\n".join(lines) + "\n"
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, gauges=None):
+    """
+    Serve render_prometheus() on http://0.0.0.0:<port>/metrics once per process.
+
+    Args:
+        port (int, optional): Port, METRICS_PORT by default; nothing is started if unset
+        gauges (callable, optional): Returns extra gauges for render_prometheus
+    """
+    global _server
+    port = port or os.getenv("METRICS_PORT")
+    if not port or _server is not None:
+        return
+    with _server_lock:
+        if _server is not None:
+            return
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = render_prometheus(gauges() if gauges else None).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics: " + format, *args)
+
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", int(port)), MetricsHandler)
+        except OSError as e:
+            logger.error("Could not serve metrics on port %s: %s", port, e)
+            return
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        logger.info("Serving Prometheus metrics on port %s", port)
@@ -0,0 +1,248 @@
+"""
+Celebrity and user leaderboards materialized with $out, paged by keyset.
+
+Grouping twitter_actions by celebrity or user reads every document, so it
+runs at most once per LEADERBOARD_REFRESH_INTERVAL: the grouping's output
+(every key with its engagements, rank and running total) replaces a small
+collection per board. A page is then an indexed keyset query on
+(engagements, key) that never touches twitter_actions, and the "others"
+total after a page is the board total minus the running total of its last
+row. Run `python leaderboard.py` from cron, or let the dashboard refresh
+them.
+
+When the collections can't be written (e.g. a read-only database user), the
+same grouping is ranked in memory and kept in the result cache, and pages
+are cut from it with the same keyset.
+"""
+import bisect
+import os
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+
+from logger import setup_logger
+from metrics import celebrity_frame, celebrity_group_stages, user_frame, user_group_stages
+from tenant import mark_refresh_stale, throttled_refresh
+
+logger = setup_logger(__name__)
+
+# Rows per page unless the viewer picks another size
+DEFAULT_PAGE_SIZE = 5
+
+# Page sizes offered by the dashboard
+PAGE_SIZES = (5, 10, 25, 50)
+
+# Seconds between refreshes triggered by the dashboard
+DEFAULT_REFRESH_INTERVAL = 300
+
+
+@dataclass(frozen=True)
+class Board:
+    """One leaderboard: how it's grouped, where it's materialized and how it's shown."""
+    name: str
+    collection: str
+    label_column: str
+    # Group stages, and the projection of their output to {key, label, engagements}
+    group_stages: tuple
+    entry_projection: dict
+    # Builds the chart DataFrame from ranked entries
+    to_frame: callable
+
+    def entry_stages(self):
+        """Pipeline stages producing one {key, label, engagements} document per key."""
+        return [*self.group_stages, {"$project": {"_id": 0, **self.entry_projection}}]
+
+    def frame(self, entries):
+        """The board's DataFrame (label column and engagements) for ranked entries."""
+        return self.to_frame(entries)
+
+
+def _celebrity_rows(entries):
+    return celebrity_frame([{"originalName": entry["label"], "engagements": entry["engagements"]} for entry in entries])
+
+
+def _user_rows(entries):
+    return user_frame([{"_id": entry["label"], "count": entry["engagements"]} for entry in entries])
+
+
+BOARDS = {
+    "celebrities": Board(
+        "celebrities", "leaderboard_celebrities", "username", tuple(celebrity_group_stages()),
+        {"key": "$_id", "label": "$originalName", "engagements": 1}, _celebrity_rows,
+    ),
+    "users": Board(
+        "users", "leaderboard_users", "name", tuple(user_group_stages(index_order=True)),
+        {"key": "$_id", "label": "$_id", "engagements": "$count"}, _user_rows,
+    ),
+}
+
+# Rank order: most engagements first, ties by key (null first, as MongoDB sorts it)
+RANK_SORT = {"engagements": -1, "key": 1}
+
+
+@dataclass
+class LeaderboardPage:
+    """One page of a leaderboard and the long tail after it."""
+    rows: pd.DataFrame
+    # Rank of the first row (1 on the first page)
+    first_rank: int = 1
+    # Engagements and keys ranked after this page
+    others: int = 0
+    others_count: int = 0
+    # Keyset cursor (engagements, key) of the next page; None on the last page
+    next_after: tuple = None
+    total: int = 0
+    total_count: int = 0
+
+
+def empty_page(board):
+    """An empty page of the named board, the fallback when it can't be read."""
+    return LeaderboardPage(rows=BOARDS[board].frame([]))
+
+
+def materialize_pipeline(board):
+    """Aggregation ranking every key of the board and replacing its collection with $out."""
+    return [
+        *board.entry_stages(),
+        {"$setWindowFields": {
+            "sortBy": RANK_SORT,
+            "output": {
+                "rank": {"$documentNumber": {}},
+                "cumulative": {"$sum": "$engagements", "window": {"documents": ["unbounded", "current"]}},
+            }
+        }},
+        # $out swaps the collection in atomically and keeps its indexes
+        {"$out": board.collection},
+    ]
+
+
+def refresh_leaderboards(db):
+    """
+    Regroup twitter_actions into every leaderboard collection.
+
+    Args:
+        db (pymongo.database.Database): Dashboard database
+    """
+    collection = db["twitter_actions"]
+    for board in BOARDS.values():
+        started = time.perf_counter()
+        collection.aggregate(materialize_pipeline(board), allowDiskUse=True)
+        db[board.collection].create_index(list(RANK_SORT.items()), name="engagements_-1_key_1")
+        logger.info("Leaderboard %s refreshed in %.2fs", board.name, time.perf_counter() - started)
+
+
+def mark_leaderboards_stale():
+    """Make the next ensure_leaderboards_fresh() call regroup the current tenant's leaderboards."""
+    mark_refresh_stale("leaderboard")
+
+
+def ensure_leaderboards_fresh(db, max_age=None):
+    """
+    Regroup the leaderboards if the last refresh by this process is older than `max_age`.
+
+    While another thread is regrouping, the collections are paged as they
+    are. After a failed refresh, callers group in memory until the next one.
+
+    Returns:
+        bool: True if the leaderboard collections can be read
+    """
+    if max_age is None:
+        max_age = float(os.getenv("LEADERBOARD_REFRESH_INTERVAL", DEFAULT_REFRESH_INTERVAL))
+    return throttled_refresh("leaderboard", lambda: refresh_leaderboards(db), max_age)
+
+
+def keyset_filter(after):
+    """Filter selecting the entries ranked after the cursor (engagements, key)."""
+    if after is None:
+        return {}
+    engagements, key = after
+    # null sorts before every string; a string key only compares to strings
+    tie = {"$ne": None} if key is None else {"$gt": key}
+    return {"$or": [{"engagements": {"$lt": engagements}}, {"engagements": engagements, "key": tie}]}
+
+
+def _page(board, entries, last, size):
+    """Shape ranked entries (one more than `size` if there is a next page) into a page."""
+    has_next = len(entries) > size
+    entries = entries[:size]
+    if not entries or last is None:
+        return LeaderboardPage(rows=board.frame([]))
+    end = entries[-1]
+    return LeaderboardPage(
+        rows=board.frame(entries),
+        first_rank=entries[0]["rank"],
+        others=last["cumulative"] - end["cumulative"],
+        others_count=last["rank"] - end["rank"],
+        next_after=(end["engagements"], end["key"]) if has_next else None,
+        total=last["cumulative"],
+        total_count=last["rank"],
+    )
+
+
+def read_page(db, board, size=DEFAULT_PAGE_SIZE, after=None):
+    """
+    A page of a materialized leaderboard.
+
+    Args:
+        db (pymongo.database.Database): Dashboard database
+        board (Board): Leaderboard to read
+        size (int): Rows per page
+        after (tuple, optional): Cursor of the page, from the previous page's next_after
+
+    Returns:
+        LeaderboardPage: Rows and the tail after them
+    """
+    collection = db[board.collection]
+    entries = list(collection.find(keyset_filter(after), {"_id": 0}).sort(list(RANK_SORT.items())).limit(size + 1))
+    # The last ranked entry carries the board totals
+    last = collection.find_one({}, {"_id": 0}, sort=[("engagements", 1), ("key", -1)])
+    return _page(board, entries, last, size)
+
+
+def _sort_key(entry):
+    key = entry["key"]
+    return (-entry["engagements"], key is not None, "" if key is None else str(key))
+
+
+def rank_entries(entries):
+    """
+    Sort {key, label, engagements} entries in rank order and add rank and running total.
+
+    Returns:
+        list: The entries, ranked
+    """
+    ranked = sorted(entries, key=_sort_key)
+    cumulative = 0
+    for rank, entry in enumerate(ranked, start=1):
+        cumulative += entry["engagements"]
+        entry["rank"] = rank
+        entry["cumulative"] = cumulative
+    return ranked
+
+
+def page_entries(board, ranked, size=DEFAULT_PAGE_SIZE, after=None):
+    """
+    A page cut from entries ranked in memory, with the same keyset as read_page.
+
+    Returns:
+        LeaderboardPage: Rows and the tail after them
+    """
+    start = 0
+    if after is not None:
+        start = bisect.bisect_right(ranked, _sort_key({"engagements": after[0], "key": after[1]}), key=_sort_key)
+    return _page(board, ranked[start:start + size + 1], ranked[-1] if ranked else None, size)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+
+    from db import get_database
+
+    parser = argparse.ArgumentParser(description="Regroup the celebrity and user leaderboards")
+    parser.parse_args()
+
+    load_dotenv()
+    refresh_leaderboards(get_database())
@@ -0,0 +1,417 @@
+"""
+Live dashboard counters maintained from a twitter_actions change stream.
+
+A background thread seeds the counters with one aggregation read in a
+snapshot session, then applies every insert, update and delete from a
+change stream opened at the snapshot's cluster time. Rendering the KPI
+section and the leaderboard pages is then a read of in-process counters
+instead of a set of queries.
+
+Change streams need a replica set (a single-node one is enough, see the
+README). Updates and deletes can only be applied incrementally when the
+collection records pre-images (`python live.py --enable-pre-images`,
+MongoDB 6.0+); without them, an update touching a counted field makes the
+watcher reseed, at most every LIVE_RESEED_INTERVAL seconds.
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from pymongo.errors import OperationFailure
+
+from classify import ACTION_TYPE_EXPR, INITIAL_OUTCOME_EXPR, RERUN_OUTCOME_EXPR, classify_document
+from leaderboard import rank_entries
+from logger import setup_logger
+from metrics import (
+    DashboardMetrics, bucket_range, default_series_window, empty_rerun_metrics, series_timezone,
+    time_series_frame, to_local
+)
+from tenant import tenant_resource
+
+logger = setup_logger(__name__)
+
+# Fields the counters depend on; updates touching only other fields are ignored
+COUNTED_FIELDS = ("action", "result", "rerun", "username", "name", "date")
+
+# Minimum seconds between two reseeds
+DEFAULT_RESEED_INTERVAL = 30
+
+# Seconds to wait before reconnecting after an error
+RETRY_DELAY = 5
+
+
+def seed_pipeline(tz="UTC"):
+    """One pass computing everything the counters hold, with days in time zone `tz`."""
+    return [
+        {
+            "$facet": {
+                "outcomes": [
+                    {"$group": {
+                        "_id": {
+                            "action_type": {"$ifNull": ["$action_type", ACTION_TYPE_EXPR]},
+                            "initial_outcome": {"$ifNull": ["$initial_outcome", INITIAL_OUTCOME_EXPR]},
+                            "rerun_outcome": {"$ifNull": ["$rerun_outcome", RERUN_OUTCOME_EXPR]},
+                        },
+                        "count": {"$sum": 1}
+                    }}
+                ],
+                "celebrities": [
+                    {"$match": {"username": {"$exists": True, "$ne": None}}},
+                    {"$group": {
+                        "_id": {"$toLower": "$username"},
+                        "originalName": {"$first": "$username"},
+                        "engagements": {"$sum": 1}
+                    }}
+                ],
+                "users": [
+                    {"$group": {"_id": "$name", "count": {"$sum": 1}}}
+                ],
+                "days": [
+                    {"$match": {"date": {"$type": "date"}}},
+                    {"$group": {
+                        "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date", "timezone": tz}},
+                        "engagements": {"$sum": 1}
+                    }}
+                ],
+            }
+        }
+    ]
+
+
+class LiveCounters:
+    """Every dashboard KPI as running totals, updated one document at a time."""
+
+    def __init__(self, tz="UTC"):
+        # Time zone of the per-day counts
+        self.tz = tz
+        self.total = 0
+        self.successful = 0
+        self.rerun = empty_rerun_metrics()
+        # lowercased username -> [first username seen, engagements]
+        self.celebrities = {}
+        self.users = Counter()
+        self.days = Counter()
+
+    def add_outcome(self, action_type, initial_outcome, rerun_outcome, count):
+        """Count `count` documents (negative to remove them) of one classification bucket."""
+        initial_success = initial_outcome == "success"
+        rerun_success = rerun_outcome == "success"
+        self.total += count
+        if initial_success or (initial_outcome == "failed" and rerun_success):
+            self.successful += count
+        if initial_success:
+            self.rerun["initial"][action_type] += count
+        if initial_success or rerun_success:
+            self.rerun["rerun"][action_type] += count
+
+    def add_celebrity(self, username, count):
+        key = str(username).lower()
+        entry = self.celebrities.setdefault(key, [username, 0])
+        entry[1] += count
+        if entry[1] <= 0:
+            del self.celebrities[key]
+
+    def apply(self, doc, sign=1):
+        """Add (sign=1) or remove (sign=-1) one document."""
+        self.add_outcome(*classify_document(doc), sign)
+        if doc.get("username") is not None:
+            self.add_celebrity(doc["username"], sign)
+        name = doc.get("name")
+        self.users[name] += sign
+        if self.users[name] <= 0:
+            del self.users[name]
+        if isinstance(doc.get("date"), datetime):
+            day = to_local(doc["date"], self.tz).strftime("%Y-%m-%d")
+            self.days[day] += sign
+            if self.days[day] <= 0:
+                del self.days[day]
+
+    @classmethod
+    def from_seed(cls, facets, tz="UTC"):
+        """Build counters from the output of seed_pipeline(tz)."""
+        counters = cls(tz)
+        for doc in facets.get("outcomes", []):
+            bucket = doc["_id"]
+            counters.add_outcome(
+                bucket["action_type"], bucket["initial_outcome"], bucket["rerun_outcome"], doc["count"]
+            )
+        for doc in facets.get("celebrities", []):
+            counters.celebrities[doc["_id"]] = [doc["originalName"], doc["engagements"]]
+        counters.users.update({doc["_id"]: doc["count"] for doc in facets.get("users", [])})
+        counters.days.update({doc["_id"]: doc["engagements"] for doc in facets.get("days", [])})
+        return counters
+
+    def leaderboard_entries(self, board):
+        """
+        Every celebrity or user as an unranked {key, label, engagements} entry,
+        like the board's grouping.
+
+        Args:
+            board (str): "celebrities" or "users"
+        """
+        if board == "celebrities":
+            return [
+                {"key": key, "label": label, "engagements": count}
+                for key, (label, count) in self.celebrities.items()
+            ]
+        return [{"key": name, "label": name, "engagements": count} for name, count in self.users.items()]
+
+    def to_metrics(self, series_start=None, series_end=None):
+        """
+        Shape the counters like fetch_dashboard_metrics' result (the
+        leaderboards are paged with leaderboard_entries()).
+
+        Returns:
+            DashboardMetrics: Typed result used by the chart code
+        """
+        if series_start is None or series_end is None:
+            series_start, series_end = default_series_window()
+        days = [
+            {"_id": day, "engagements": self.days.get(day.strftime("%Y-%m-%d"), 0)}
+            for day in bucket_range(series_start, series_end, "day")
+        ]
+        return DashboardMetrics(
+            total_engagements=self.total,
+            successful_engagements=self.successful,
+            rerun={key: dict(value) for key, value in self.rerun.items()},
+            time_series=time_series_frame(days),
+            series_start=series_start,
+            series_end=series_end,
+        )
+
+
+class LiveWatcher:
+    """
+    Background thread keeping LiveCounters in sync with a change stream.
+
+    The counters are replaced by a fresh seed when the stream is lost, when
+    the collection is dropped or renamed, or when an update can't be applied
+    incrementally because no pre-image was recorded.
+    """
+
+    def __init__(self, get_collection, reseed_interval=None):
+        # Resolved in the watcher thread, so configuration errors are logged there
+        self.get_collection = get_collection
+        self.collection = None
+        self.reseed_interval = reseed_interval if reseed_interval is not None else float(
+            os.getenv("LIVE_RESEED_INTERVAL", DEFAULT_RESEED_INTERVAL)
+        )
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._counters = None
+        # Board name -> (version, ranked entries)
+        self._ranked = {}
+        self._seeded_at = 0.0
+        self.version = 0
+        self.events = 0
+        self.reseeds = 0
+        self.pre_images = True
+        self.error = None
+
+    @property
+    def ready(self):
+        return self._counters is not None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            # The thread watches the collection of the tenant that started it
+            context = contextvars.copy_context()
+            self._thread = threading.Thread(target=context.run, args=(self._run,), name="live-counters", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def metrics(self):
+        """
+        Current dashboard metrics, or None until the first seed has finished.
+
+        Returns:
+            DashboardMetrics: Typed result used by the chart code
+        """
+        with self._lock:
+            if self._counters is None:
+                return None
+            return self._counters.to_metrics()
+
+    def ranked_entries(self, board):
+        """
+        Every entry of a leaderboard, ranked, or None until the first seed has
+        finished. Ranked once per counter version and shared by the page reads
+        until the next change.
+
+        Returns:
+            list: Ranked {key, label, engagements, rank, cumulative} entries
+        """
+        with self._lock:
+            if self._counters is None:
+                return None
+            version = self.version
+            cached = self._ranked.get(board)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            entries = self._counters.leaderboard_entries(board)
+        ranked = rank_entries(entries)
+        with self._lock:
+            self._ranked[board] = (version, ranked)
+        return ranked
+
+    def _seed(self):
+        """Recompute the counters in a snapshot session and return its cluster time."""
+        wait = self._seeded_at + self.reseed_interval - time.monotonic()
+        if wait > 0 and self._stop.wait(wait):
+            return None
+        started = time.perf_counter()
+        tz = series_timezone()
+        with self.collection.database.client.start_session(snapshot=True) as session:
+            facets = next(self.collection.aggregate(seed_pipeline(tz), session=session), {})
+            operation_time = session.operation_time
+        counters = LiveCounters.from_seed(facets, tz)
+        with self._lock:
+            self._counters = counters
+            self.version += 1
+        self._seeded_at = time.monotonic()
+        self.reseeds += 1
+        logger.info("Live counters seeded with %s actions in %.2fs", counters.total, time.perf_counter() - started)
+        return operation_time
+
+    def _open_stream(self, operation_time):
+        options = {"full_document": "whenAvailable", "start_at_operation_time": operation_time}
+        if self.pre_images:
+            try:
+                return self.collection.watch(full_document_before_change="whenAvailable", **options)
+            except OperationFailure as e:
+                # MongoDB < 6.0 doesn't know the option
+                logger.warning("Change stream pre-images unavailable, updates will trigger reseeds: %s", e)
+                self.pre_images = False
+        return self.collection.watch(**options)
+
+    def _handle(self, change):
+        """
+        Apply one change event.
+
+        Returns:
+            bool: False if the counters can't be updated incrementally and need a reseed
+        """
+        operation = change["operationType"]
+        after = change.get("fullDocument")
+        before = change.get("fullDocumentBeforeChange")
+
+        if operation == "insert":
+            delta = [(after, 1)]
+        elif operation == "delete":
+            if before is None:
+                return False
+            delta = [(before, -1)]
+        elif operation in ("update", "replace"):
+            if before is not None and after is not None:
+                delta = [(before, -1), (after, 1)]
+            elif operation == "update":
+                description = change.get("updateDescription", {})
+                touched = set(description.get("updatedFields", {})) | set(description.get("removedFields", []))
+                if any(path.split(".")[0] in COUNTED_FIELDS for path in touched):
+                    return False
+                delta = []
+            else:
+                return False
+        else:
+            # drop, rename, dropDatabase, invalidate
+            return False
+
+        with self._lock:
+            for doc, sign in delta:
+                self._counters.apply(doc, sign)
+            self.events += 1
+            self.version += 1
+        return True
+
+    def _watch(self, operation_time):
+        with self._open_stream(operation_time) as stream:
+            while not self._stop.is_set():
+                change = stream.try_next()
+                if change is None:
+                    continue
+                # Events at or before the snapshot are already in the seed
+                if change.get("clusterTime") and operation_time and change["clusterTime"] <= operation_time:
+                    continue
+                if not self._handle(change):
+                    logger.info("Live counters can't apply a %s event, reseeding", change["operationType"])
+                    return
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.collection is None:
+                    self.collection = self.get_collection()
+                operation_time = self._seed()
+                if self._stop.is_set():
+                    return
+                self.error = None
+                self._watch(operation_time)
+            except Exception as e:
+                self.error = str(e)
+                logger.error("Live counters stopped, retrying in %ss: %s", RETRY_DELAY, e)
+                self._stop.wait(RETRY_DELAY)
+
+
+def _start_watcher(get_collection):
+    watcher = LiveWatcher(get_collection)
+    watcher.start()
+    return watcher
+
+
+def get_live_watcher(get_collection):
+    """
+    Return the current tenant's watcher, starting it on first use.
+
+    The watcher is stopped when the tenant is evicted for being idle.
+
+    Args:
+        get_collection (callable): Returns the twitter_actions collection
+    """
+    return tenant_resource("live_watcher", lambda: _start_watcher(get_collection), close=lambda watcher: watcher.stop())
+
+
+def enable_pre_images(collection):
+    """Record pre- and post-images for the collection's change events (MongoDB 6.0+)."""
+    collection.database.command(
+        "collMod", collection.name, changeStreamPreAndPostImages={"enabled": True}
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+
+    from db import get_collection
+
+    parser = argparse.ArgumentParser(description="Follow the live dashboard counters")
+    parser.add_argument("--enable-pre-images", action="store_true",
+                        help="Turn on change stream pre-images for twitter_actions first")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.enable_pre_images:
+        enable_pre_images(get_collection())
+        print("pre-images enabled")
+
+    watcher = get_live_watcher(get_collection)
+    seen = -1
+    try:
+        while True:
+            if watcher.version != seen and watcher.ready:
+                seen = watcher.version
+                metrics = watcher.metrics()
+                print(
+                    f"total={metrics.total_engagements} successful={metrics.successful_engagements} "
+                    f"rerun={metrics.rerun} events={watcher.events} reseeds={watcher.reseeds}"
+                )
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        watcher.stop()
@@ -1,47 +1,191 @@
+import atexit
 import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Defaults for the LOG_* environment variables
+DEFAULT_LEVEL = "DEBUG"
+DEFAULT_CONSOLE_LEVEL = "WARNING"
+DEFAULT_DIR = "."
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(filename)s - %(lineno)d - %(message)s'
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the handlers on the listener thread."""
+
+    def prepare(self, record):
+        # QueueHandler.prepare() formats the message (and so every lazy
+        # argument, like a DataFrame summary) on the logging thread. The
+        # records never leave the process, so they can be queued as they are.
+        return record
+
+
+# Records are handed to this queue and written by a background thread, so a
+# log call costs a queue put instead of formatting and disk writes on the
+# render thread
+_queue = queue.SimpleQueue()
+_queue_handler = _DeferredQueueHandler(_queue)
+_listener = None
+_lock = threading.Lock()
+# Loggers created by setup_logger, re-levelled when the configuration changes
+_loggers = set()
+
+
+def _level(name, default):
+    value = os.getenv(name, default).strip().upper()
+    if value in ("OFF", "NONE", ""):
+        return None
+    level = logging.getLevelName(value)
+    return level if isinstance(level, int) else logging.getLevelName(default)
+
+
+class _DataFrameFilter(logging.Filter):
+    """Pass only (or, with keep=False, everything but) log_dataframe records."""
+
+    def __init__(self, keep=True):
+        super().__init__()
+        self.keep = keep
+
+    def filter(self, record):
+        return getattr(record, "dataframe", False) == self.keep
+
+
+def _file_handler(filename, level):
+    handler = RotatingFileHandler(
+        os.path.join(os.getenv("LOG_DIR", DEFAULT_DIR), filename),
+        maxBytes=int(os.getenv("LOG_MAX_BYTES", DEFAULT_MAX_BYTES)),
+        backupCount=int(os.getenv("LOG_BACKUP_COUNT", DEFAULT_BACKUP_COUNT)),
+        encoding='utf-8',
+        delay=True,
+    )
+    handler.setLevel(level)
+    return handler
+
+
+def configure_logging():
+    """
+    (Re)start the background log writer from the LOG_* environment variables.
+
+    Called on first use by setup_logger; call it again after loading a .env
+    file to apply its settings.
+
+    Environment:
+        LOG_LEVEL: Level of the dashboard loggers (DEBUG)
+        LOG_CONSOLE_LEVEL: Level echoed to stderr, or OFF (WARNING)
+        LOG_DIR: Directory of debug.log, info.log and dataframe.log (.)
+        LOG_MAX_BYTES: Size at which a log file is rotated (10 MiB)
+        LOG_BACKUP_COUNT: Rotated files kept per log (3)
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+
+        level = _level("LOG_LEVEL", DEFAULT_LEVEL) or logging.CRITICAL + 1
+        formatter = logging.Formatter(FORMAT)
+        debug_handler = _file_handler('debug.log', logging.DEBUG)
+        info_handler = _file_handler('info.log', logging.INFO)
+        # DataFrame dumps get their own file instead of flooding debug.log
+        df_handler = _file_handler('dataframe.log', logging.DEBUG)
+        df_handler.addFilter(_DataFrameFilter(keep=True))
+        debug_handler.addFilter(_DataFrameFilter(keep=False))
+        info_handler.addFilter(_DataFrameFilter(keep=False))
+        handlers = [debug_handler, info_handler, df_handler]
+
+        console_level = _level("LOG_CONSOLE_LEVEL", DEFAULT_CONSOLE_LEVEL)
+        if console_level is not None:
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(console_level)
+            handlers.append(console_handler)
+
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        _listener = QueueListener(_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        for name in _loggers:
+            logging.getLogger(name).setLevel(level)
+        return level
+
+
+def shutdown_logging():
+    """Write out queued records and stop the background writer."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
+
 
 def setup_logger(name=None):
-    # Clear the info.log file at the beginning of the session
-    open('dataframe.log', 'w').close()
+    """
+    Return a logger whose records are written by the shared background writer.
+
+    Args:
+        name (str, optional): Logger name, usually __name__
+
+    Returns:
+        logging.Logger: Configured logger
+    """
+    if _listener is None:
+        configure_logging()
     # Create a custom logger
     logger = logging.getLogger(name)
+    logger.setLevel(_level("LOG_LEVEL", DEFAULT_LEVEL) or logging.CRITICAL + 1)
+    # The queue handler is the only output; nothing is duplicated through the root logger
+    logger.propagate = False
 
-    # Set level to DEBUG to capture all levels of logs
-    logger.setLevel(logging.DEBUG)
-
-    # Create handlers
-    # Handler for DEBUG logs (append mode)
-    debug_handler = logging.FileHandler('debug.log', mode='a',encoding='utf-8')
-    # Handler for INFO logs (write mode)
-    info_handler = logging.FileHandler('info.log', mode='a',encoding='utf-8')
-    # Handler for DataFrame logs (append mode)
-    df_handler = logging.FileHandler('dataframe.log', mode='a',encoding='utf-8')
-
-    # Set log levels for each handler
-    debug_handler.setLevel(logging.DEBUG)
-    info_handler.setLevel(logging.INFO)
-    df_handler.setLevel(logging.DEBUG)
-
-    # Create formatter and add it to handlers
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(filename)s - %(lineno)d - %(message)s')
-    debug_handler.setFormatter(formatter)
-    info_handler.setFormatter(formatter)
-    df_handler.setFormatter(formatter)
-
-    # Add handlers to the logger only if not already added
-    if not logger.handlers:
-        logger.addHandler(debug_handler)
-        logger.addHandler(info_handler)
-        logger.addHandler(df_handler)
+    # Add the handler only if not already added
+    if _queue_handler not in logger.handlers:
+        logger.addHandler(_queue_handler)
+    _loggers.add(name)
 
     return logger
 
-def log_dataframe(logger, df, operation_name):
-    """Helper function to log DataFrame information"""
-    logger.debug(f"\n{'='*50}")
-    logger.debug(f"DataFrame Operation: {operation_name}")
-    logger.debug(f"Shape: {df.shape}")
-    logger.debug(f"Columns: {list(df.columns)}")
-    logger.debug(f"Data Types:\n{df.dtypes}")
-    logger.debug(f"First few rows:\n{df.head()}")
-    logger.debug(f"{'='*50}\n")
+
+class _DataFrameSummary:
+    """
+    A DataFrame summary, rendered as text by the background writer.
+
+    Only the parts shown are kept (the first rows are copied), so the caller
+    may change the DataFrame after logging it.
+    """
+
+    def __init__(self, df, operation_name):
+        self.operation_name = operation_name
+        self.shape = df.shape
+        self.columns = list(df.columns)
+        self.dtypes = df.dtypes
+        self.head = df.head().copy()
+        self._text = None
+
+    def __str__(self):
+        # Rendered once; the rotating file handler formats a record twice
+        if self._text is None:
+            self._text = self._render()
+        return self._text
+
+    def _render(self):
+        return (
+            f"\n{'='*50}\n"
+            f"DataFrame Operation: {self.operation_name}\n"
+            f"Shape: {self.shape}\n"
+            f"Columns: {self.columns}\n"
+            f"Data Types:\n{self.dtypes}\n"
+            f"First few rows:\n{self.head}\n"
+            f"{'='*50}\n"
+        )
+
+
+def log_dataframe(logger, df, operation_name, level=logging.DEBUG):
+    """Helper function to log DataFrame information to dataframe.log"""
+    if logger.isEnabledFor(level):
+        logger.log(level, "%s", _DataFrameSummary(df, operation_name), extra={"dataframe": True}, stacklevel=2)
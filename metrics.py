@@ -0,0 +1,477 @@
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from logger import setup_logger
+from normalize import normalize_dates
+
+logger = setup_logger(__name__)
+
+# Time zone (IANA name) of the trend chart's date ranges and buckets
+DEFAULT_TIMEZONE = "UTC"
+
+# Most points the trend chart shows; longer ranges use coarser buckets
+DEFAULT_MAX_SERIES_POINTS = 100
+
+# Bucket units from finest to coarsest, with their (longest) length
+SERIES_UNITS = (
+    ("hour", timedelta(hours=1)),
+    ("day", timedelta(days=1)),
+    ("week", timedelta(weeks=1)),
+    ("month", timedelta(days=31)),
+)
+
+# Classifies an action into the buckets used by the rerun comparison chart
+ACTION_CLASS_EXPR = {
+    "$cond": [
+        {"$regexMatch": {"input": "$action", "regex": "like", "options": "i"}},
+        "likes",
+        {
+            "$cond": [
+                {"$regexMatch": {"input": "$action", "regex": "repost|retweet", "options": "i"}},
+                "retweets",
+                "comments"
+            ]
+        }
+    ]
+}
+
+# Documents that are either:
+# 1. Have "Success" in result field
+# 2. Have "Failed" in result but "Success" in rerun
+SUCCESSFUL_FILTER = {
+    "$or": [
+        {"result": {"$regex": "Success", "$options": "i"}},
+        {
+            "$and": [
+                {"result": {"$regex": "Failed", "$options": "i"}},
+                {"rerun": {"$regex": "Success", "$options": "i"}}
+            ]
+        }
+    ]
+}
+
+# Initial run successes (Excel cells D7, D8, D9)
+INITIAL_SUCCESS_FILTER = {"result": {"$regex": "success", "$options": "i"}}
+
+# Successes after the rerun (Excel cells D12, D13, D14)
+RERUN_SUCCESS_FILTER = {
+    "$or": [
+        {"result": {"$regex": "success", "$options": "i"}},
+        {"rerun": {"$regex": "success", "$options": "i"}}
+    ]
+}
+
+# Documents the classification pass (classify.py) hasn't labelled yet
+UNCLASSIFIED_FILTER = {"initial_outcome": None}
+
+# Action class of a document: the precomputed action_type, or the regex
+# classification for documents that aren't labelled yet
+CLASSIFIED_ACTION_EXPR = {"$ifNull": ["$action_type", ACTION_CLASS_EXPR]}
+
+
+def with_classification(classified, raw):
+    """
+    Filter matching labelled documents by equality on the classification
+    fields, and unlabelled ones with the original regex filter.
+    """
+    return {"$or": [classified, {"$and": [UNCLASSIFIED_FILTER, raw]}]}
+
+
+# Same documents as the filters above, as equality matches on the
+# initial_outcome/rerun_outcome fields (index-covered once labelled)
+CLASSIFIED_SUCCESSFUL_FILTER = with_classification(
+    {"$or": [
+        {"initial_outcome": "success"},
+        {"initial_outcome": "failed", "rerun_outcome": "success"}
+    ]},
+    SUCCESSFUL_FILTER
+)
+CLASSIFIED_INITIAL_SUCCESS_FILTER = with_classification(
+    {"initial_outcome": "success"},
+    INITIAL_SUCCESS_FILTER
+)
+CLASSIFIED_RERUN_SUCCESS_FILTER = with_classification(
+    {"$or": [
+        {"initial_outcome": "success"},
+        {"initial_outcome": {"$in": ["failed", "other"]}, "rerun_outcome": "success"}
+    ]},
+    RERUN_SUCCESS_FILTER
+)
+
+
+def empty_rerun_metrics():
+    """Rerun comparison structure with every count at zero."""
+    return {
+        "initial": {"likes": 0, "retweets": 0, "comments": 0},
+        "rerun": {"likes": 0, "retweets": 0, "comments": 0}
+    }
+
+
+def series_timezone():
+    """Time zone of the trend chart, DASHBOARD_TIMEZONE or UTC."""
+    return os.getenv("DASHBOARD_TIMEZONE", DEFAULT_TIMEZONE)
+
+
+def local_now(tz=None):
+    """Current wall-clock time in the dashboard's time zone, as a naive datetime."""
+    return datetime.now(ZoneInfo(tz or series_timezone())).replace(tzinfo=None)
+
+
+def to_utc(moment, tz=None):
+    """Convert a naive wall-clock time in `tz` to the naive UTC time stored in MongoDB."""
+    tz = tz or series_timezone()
+    if tz == "UTC":
+        return moment
+    return moment.replace(tzinfo=ZoneInfo(tz)).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_local(moment, tz=None):
+    """Convert a naive UTC time from MongoDB to naive wall-clock time in `tz`."""
+    tz = tz or series_timezone()
+    if tz == "UTC":
+        return moment
+    return moment.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(tz)).replace(tzinfo=None)
+
+
+def default_series_window(now=None):
+    """
+    Date range of the default trend chart: exactly the last 7 days including today.
+
+    Returns:
+        tuple: (start_date, end_date) as naive datetimes in the dashboard's time zone
+    """
+    # Microseconds are dropped so the window is identical across reruns
+    end_date = (now or local_now()).replace(hour=23, minute=59, second=59, microsecond=0)
+    start_date = (end_date - timedelta(days=6)).replace(hour=0, minute=0, second=0)
+    return start_date, end_date
+
+
+def series_unit(start_date, end_date, max_points=None):
+    """
+    Finest bucket unit ("hour", "day", "week" or "month") keeping the range
+    within DASHBOARD_SERIES_MAX_POINTS points.
+    """
+    if max_points is None:
+        max_points = int(os.getenv("DASHBOARD_SERIES_MAX_POINTS", DEFAULT_MAX_SERIES_POINTS))
+    span = end_date - start_date
+    for unit, length in SERIES_UNITS:
+        if span / length <= max_points:
+            return unit
+    return SERIES_UNITS[-1][0]
+
+
+def truncate(moment, unit):
+    """Start of the bucket containing `moment`, like $dateTrunc (weeks start on Monday)."""
+    if unit == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == "week":
+        return day - timedelta(days=day.weekday())
+    if unit == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(moment, unit):
+    """Start of the bucket after the one starting at `moment`."""
+    if unit == "month":
+        return (moment.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return moment + dict(SERIES_UNITS)[unit]
+
+
+def series_bounds(start_date, end_date, unit):
+    """First bucket start and the (exclusive) end of the last bucket of a range."""
+    return truncate(start_date, unit), next_bucket(truncate(end_date, unit), unit)
+
+
+def bucket_range(start_date, end_date, unit):
+    """Every bucket start of a range."""
+    lower, upper = series_bounds(start_date, end_date, unit)
+    buckets = []
+    while lower < upper:
+        buckets.append(lower)
+        lower = next_bucket(lower, unit)
+    return buckets
+
+
+def truncate_series(dates, unit):
+    """Vectorized `truncate` over a datetime64 Series."""
+    if unit == "hour":
+        return dates.dt.floor("h")
+    days = dates.dt.normalize()
+    if unit == "week":
+        return days - pd.to_timedelta(days.dt.weekday, unit="D")
+    if unit == "month":
+        return days - pd.to_timedelta(days.dt.day - 1, unit="D")
+    return days
+
+
+def local_wall_time_expr(field, tz):
+    """
+    Expression turning a UTC date into the same wall-clock time in `tz`,
+    stored as a UTC date, so $densify steps aren't shifted by DST changes.
+    """
+    if tz == "UTC":
+        return field
+    return {
+        "$dateFromParts": {
+            part: {operator: {"date": field, "timezone": tz}}
+            for part, operator in (
+                ("year", "$year"), ("month", "$month"), ("day", "$dayOfMonth"), ("hour", "$hour")
+            )
+        }
+    }
+
+
+def densify_stages(start_date, end_date, unit, tz="UTC"):
+    """
+    Stages filling the buckets of a range that have no documents with zero
+    engagements, after a $group on the bucket start.
+    """
+    lower, upper = series_bounds(start_date, end_date, unit)
+    stages = [] if tz == "UTC" else [{"$set": {"_id": local_wall_time_expr("$_id", tz)}}]
+    return stages + [
+        {"$densify": {"field": "_id", "range": {"step": 1, "unit": unit, "bounds": [lower, upper]}}},
+        {"$set": {"engagements": {"$ifNull": ["$engagements", 0]}}},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+def time_series_stages(start_date, end_date, unit=None, tz=None):
+    """
+    Pipeline stages counting engagements per bucket between two dates.
+
+    The bucket unit follows series_unit() unless given; buckets are
+    truncated in the dashboard's time zone and gap-filled on the server.
+    """
+    unit = unit or series_unit(start_date, end_date)
+    tz = tz or series_timezone()
+    return [
+        {
+            "$match": {
+                "date": {
+                    "$gte": to_utc(start_date, tz),
+                    "$lte": to_utc(end_date, tz)
+                }
+            }
+        },
+        {
+            "$group": {
+                "_id": {
+                    "$dateTrunc": {
+                        "date": "$date",
+                        "unit": unit,
+                        "timezone": tz,
+                        "startOfWeek": "monday"
+                    }
+                },
+                "engagements": {"$sum": 1}
+            }
+        },
+        *densify_stages(start_date, end_date, unit, tz)
+    ]
+
+
+def celebrity_group_stages():
+    """Pipeline stages counting the engagements of every celebrity, grouped case-insensitively by username."""
+    return [
+        {
+            "$match": {
+                "username": {
+                    "$exists": True,
+                    "$ne": None
+                }
+            }
+        },
+        {
+            # Convert username to lowercase for grouping
+            "$group": {
+                "_id": {"$toLower": "$username"},  # Case-insensitive grouping
+                "originalName": {"$first": "$username"},  # Keep one original username
+                "engagements": {"$sum": 1}
+            }
+        }
+    ]
+
+
+def user_group_stages(index_order=False):
+    """
+    Pipeline stages counting the engagements of every Twitter user by display name.
+
+    With `index_order`, documents are read in `name` order, which lets
+    MongoDB answer the grouping from the name index alone instead of
+    scanning the documents (not useful inside a $facet, which can't use indexes).
+    """
+    stages = [{"$sort": {"name": 1}}] if index_order else []
+    return stages + [
+        {"$group": {
+            "_id": "$name",
+            "count": {"$sum": 1}
+        }}
+    ]
+
+
+def action_class_stages(match):
+    """Pipeline stages counting the documents matching `match` per action class."""
+    return [
+        {"$match": match},
+        {"$group": {"_id": CLASSIFIED_ACTION_EXPR, "count": {"$sum": 1}}}
+    ]
+
+
+def time_series_frame(docs):
+    """
+    Convert gap-filled bucket output into a DataFrame.
+
+    Returns:
+        pandas.DataFrame: Columns ['date', 'engagements'], or empty if every
+        bucket is zero
+    """
+    df = pd.DataFrame(docs)
+    if df.empty or not df['engagements'].any():
+        return pd.DataFrame()
+    df = df.rename(columns={"_id": "date"})
+    df['date'] = normalize_dates(df['date'])
+    return df[['date', 'engagements']].reset_index(drop=True)
+
+
+def celebrity_frame(docs):
+    """
+    Convert celebrity aggregation output into a DataFrame.
+
+    Returns:
+        pandas.DataFrame: Columns ['username', 'engagements']
+    """
+    if not docs:
+        return pd.DataFrame(columns=['username', 'engagements'])
+    df = pd.DataFrame([
+        {
+            "username": doc["originalName"],
+            "engagements": doc["engagements"]
+        } for doc in docs
+    ])
+
+    # Clean up usernames (remove @ if present)
+    df['username'] = df['username'].apply(
+        lambda x: x.replace('@', '') if isinstance(x, str) and x.startswith('@') else x
+    )
+    return df
+
+
+def user_frame(docs):
+    """
+    Convert user aggregation output into a DataFrame.
+
+    Returns:
+        pandas.DataFrame: Columns ['name', 'engagements']
+    """
+    df = pd.DataFrame(docs)
+    if df.empty:
+        return pd.DataFrame(columns=['name', 'engagements'])
+    return df.rename(columns={"_id": "name", "count": "engagements"})
+
+
+def rerun_metrics(initial_docs, rerun_docs):
+    """
+    Structure per-action-class counts like the Excel series.
+
+    Returns:
+        dict: {"initial": {...}, "rerun": {...}} with likes/retweets/comments
+    """
+    initial_results = {doc["_id"]: doc["count"] for doc in initial_docs}
+    rerun_results = {doc["_id"]: doc["count"] for doc in rerun_docs}
+    return {
+        "initial": {
+            "likes": initial_results.get("likes", 0),
+            "retweets": initial_results.get("retweets", 0),
+            "comments": initial_results.get("comments", 0)
+        },
+        "rerun": {
+            "likes": rerun_results.get("likes", 0),
+            "retweets": rerun_results.get("retweets", 0),
+            "comments": rerun_results.get("comments", 0)
+        }
+    }
+
+
+@dataclass
+class DashboardMetrics:
+    """Every number and table shown above the fold of the dashboard."""
+    total_engagements: int = 0
+    successful_engagements: int = 0
+    rerun: dict = field(default_factory=empty_rerun_metrics)
+    time_series: pd.DataFrame = field(default_factory=pd.DataFrame)
+    series_start: datetime = None
+    series_end: datetime = None
+
+    @property
+    def success_ratio(self):
+        """Percentage of successful engagements (0 when there are none)."""
+        if self.total_engagements > 0:
+            return (self.successful_engagements / self.total_engagements) * 100
+        return 0
+
+
+def build_facet_pipeline(series_start, series_end):
+    """
+    Single aggregation computing every KPI section metric in one collection
+    scan. The leaderboards are paged separately (leaderboard.py).
+
+    Args:
+        series_start (datetime): Start of the time series window
+        series_end (datetime): End of the time series window
+
+    Returns:
+        list: Aggregation pipeline with one $facet stage
+    """
+    return [{"$facet": {
+        "total": [{"$count": "count"}],
+        "successful": [{"$match": CLASSIFIED_SUCCESSFUL_FILTER}, {"$count": "count"}],
+        "rerun_initial": action_class_stages(CLASSIFIED_INITIAL_SUCCESS_FILTER),
+        "rerun_rerun": action_class_stages(CLASSIFIED_RERUN_SUCCESS_FILTER),
+        "time_series": time_series_stages(series_start, series_end),
+    }}]
+
+
+def _facet_count(docs):
+    return docs[0]["count"] if docs else 0
+
+
+def fetch_dashboard_metrics(collection, series_start=None, series_end=None):
+    """
+    Compute all KPI, rerun and time series data in one round trip.
+
+    Args:
+        collection (pymongo.collection.Collection): twitter_actions collection
+        series_start (datetime, optional): Start of the time series window
+        series_end (datetime, optional): End of the time series window,
+            both default to the last 7 days
+
+    Returns:
+        DashboardMetrics: Typed result used by the chart code
+    """
+    if series_start is None or series_end is None:
+        series_start, series_end = default_series_window()
+
+    pipeline = build_facet_pipeline(series_start, series_end)
+    facets = next(collection.aggregate(pipeline), {})
+
+    metrics = DashboardMetrics(
+        total_engagements=_facet_count(facets.get("total", [])),
+        successful_engagements=_facet_count(facets.get("successful", [])),
+        rerun=rerun_metrics(facets.get("rerun_initial", []), facets.get("rerun_rerun", [])),
+        time_series=time_series_frame(facets.get("time_series", [])),
+        series_start=series_start,
+        series_end=series_end,
+    )
+    logger.debug(
+        "Facet metrics: total=%s, successful=%s, rerun=%s",
+        metrics.total_engagements,
+        metrics.successful_engagements,
+        metrics.rerun,
+    )
+    return metrics
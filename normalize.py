@@ -0,0 +1,59 @@
+import pandas as pd
+
+# Text format used for dates in exports
+EXPORT_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def normalize_dates(series, output_format=None):
+    """
+    Parse a column mixing BSON dates and date strings in vectorized passes.
+
+    BSON datetimes and ISO 8601 strings are converted in a single
+    `pd.to_datetime` call; only the values it could not parse get a second
+    `format='mixed'` pass. Missing and empty values are left as they are, and
+    values that still can't be parsed keep their original content instead of
+    becoming NaT. Timezone-aware strings are converted to naive UTC, matching
+    the dates pymongo returns.
+
+    Args:
+        series (pandas.Series): Column with datetimes, strings or missing values
+        output_format (str, optional): strftime format; when given, parsed
+            values are returned as formatted strings
+
+    Returns:
+        pandas.Series: datetime64 column if every value parsed and no format
+        was requested, otherwise an object column
+    """
+    if series.empty:
+        return series
+    if pd.api.types.is_datetime64_any_dtype(series):
+        parsed = series
+        if getattr(parsed.dt, "tz", None) is not None:
+            parsed = parsed.dt.tz_convert("UTC").dt.tz_localize(None)
+        unparsed = pd.Series(False, index=series.index)
+        missing = series.isna()
+    else:
+        missing = series.isna() | series.astype(object).eq('')
+        parsed = pd.to_datetime(series, errors='coerce', format='ISO8601', utc=True)
+        unparsed = parsed.isna() & ~missing
+        if unparsed.any():
+            # Second pass, only over the values the ISO 8601 parser rejected
+            retry = pd.to_datetime(
+                series[unparsed].astype(str), errors='coerce', format='mixed', utc=True
+            )
+            parsed = parsed.where(~unparsed, retry)
+            unparsed = parsed.isna() & ~missing
+        parsed = parsed.dt.tz_localize(None)
+
+    if output_format is not None:
+        result = parsed.dt.strftime(output_format).astype(object)
+    elif not (unparsed.any() or missing.any()):
+        return parsed
+    else:
+        result = parsed.astype(object)
+
+    # Keep originals for missing and unparseable values
+    keep = unparsed | missing
+    if keep.any():
+        result = result.where(~keep, series.astype(object))
+    return result
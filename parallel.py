@@ -0,0 +1,107 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+import pymongo
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Upper bound on queries running at the same time across all sessions
+DEFAULT_MAX_WORKERS = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class QueryTask:
+    """One independent data call and the value to use if it fails or times out."""
+    name: str
+    func: Callable
+    args: tuple = ()
+    fallback: Any = None
+    timeout: float = None
+    kwargs: dict = field(default_factory=dict)
+
+
+def get_executor():
+    """Return the process-wide, bounded query thread pool."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                max_workers = int(os.getenv("QUERY_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+    return _executor
+
+
+def _run_task(script_ctx, task, timeout):
+    thread = threading.current_thread()
+    # Pool threads serve every session, so the caller's script context is
+    # only attached for this task and the thread's previous one restored
+    # after it (add_script_run_ctx can't detach a context)
+    previous_ctx = getattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+    # Let st.error/st.warning inside data functions reach the calling session
+    if script_ctx is not None:
+        add_script_run_ctx(thread, script_ctx)
+    try:
+        if timeout:
+            # Client-side operation timeout, so a slow query is aborted on the
+            # server rather than left running after we gave up on it
+            with pymongo.timeout(timeout):
+                return task.func(*task.args, **task.kwargs)
+        return task.func(*task.args, **task.kwargs)
+    finally:
+        setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, previous_ctx)
+
+
+def run_concurrently(tasks, timeout=None):
+    """
+    Run independent data calls on the shared thread pool.
+
+    Each task gets its own deadline; a task that raises or misses it yields
+    its fallback value, so one failing query can't take down the page.
+
+    Args:
+        tasks (list[QueryTask]): Calls to run
+        timeout (float, optional): Default per-query timeout in seconds
+
+    Returns:
+        dict: Task name -> result (or fallback)
+    """
+    executor = get_executor()
+    script_ctx = get_script_run_ctx(suppress_warning=True)
+    started = time.perf_counter()
+
+    futures = {}
+    for task in tasks:
+        task_timeout = task.timeout if task.timeout is not None else timeout
+        # Copy the context so the run-scoped query memo is shared with workers
+        ctx = contextvars.copy_context()
+        future = executor.submit(ctx.run, _run_task, script_ctx, task, task_timeout)
+        futures[task.name] = (task, task_timeout, future)
+
+    results = {}
+    for name, (task, task_timeout, future) in futures.items():
+        remaining = None
+        if task_timeout:
+            remaining = max(task_timeout - (time.perf_counter() - started), 0)
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            logger.warning("Query %s timed out after %ss, using fallback", name, task_timeout)
+            results[name] = task.fallback
+        except Exception as e:
+            logger.error("Query %s failed: %s", name, e)
+            results[name] = task.fallback
+
+    logger.debug("Ran %s queries concurrently in %.3fs", len(tasks), time.perf_counter() - started)
+    return results
@@ -0,0 +1,69 @@
+"""
+Per-profile performance of the bot, grouped by `profile_id`.
+
+One aggregation groups twitter_actions by profile and counts, for each
+profile, its actions, its successful engagements (initial successes plus
+failures recovered by a rerun), the reruns that recovered a failure and
+the date of its last action. Labelled documents use the classification
+fields; unlabelled ones the same regexes as classify.py.
+"""
+import pandas as pd
+
+from classify import INITIAL_OUTCOME_EXPR, RERUN_OUTCOME_EXPR
+from logger import setup_logger
+from metrics import series_timezone
+
+logger = setup_logger(__name__)
+
+# Columns of the profile table, in display order
+PROFILE_COLUMNS = ['profile_id', 'name', 'actions', 'successes', 'reruns_recovered', 'success_rate', 'last_active']
+
+
+def _count_if(condition):
+    return {"$sum": {"$cond": [condition, 1, 0]}}
+
+
+def profile_stages():
+    """Pipeline stages producing one document of counts per profile_id, most actions first."""
+    recovered = {"$and": [{"$eq": ["$initial", "failed"]}, {"$eq": ["$rerun", "success"]}]}
+    return [
+        {"$project": {
+            "_id": 0,
+            "profile_id": 1,
+            "name": 1,
+            # Only BSON dates count as activity, like the time series
+            "date": {"$cond": [{"$eq": [{"$type": "$date"}, "date"]}, "$date", None]},
+            "initial": {"$ifNull": ["$initial_outcome", INITIAL_OUTCOME_EXPR]},
+            "rerun": {"$ifNull": ["$rerun_outcome", RERUN_OUTCOME_EXPR]},
+        }},
+        {"$group": {
+            "_id": "$profile_id",
+            "name": {"$first": "$name"},  # Keep one display name
+            "actions": {"$sum": 1},
+            "successes": _count_if({"$or": [{"$eq": ["$initial", "success"]}, recovered]}),
+            "reruns_recovered": _count_if(recovered),
+            "last_active": {"$max": "$date"},
+        }},
+        {"$sort": {"actions": -1, "_id": 1}},
+    ]
+
+
+def profile_frame(docs):
+    """
+    Convert profile aggregation output into a DataFrame.
+
+    Returns:
+        pandas.DataFrame: PROFILE_COLUMNS, with success_rate in percent and
+        last_active in the dashboard's time zone
+    """
+    df = pd.DataFrame(docs)
+    if df.empty:
+        return pd.DataFrame(columns=PROFILE_COLUMNS)
+    df = df.rename(columns={"_id": "profile_id"})
+    df['profile_id'] = df['profile_id'].astype(str).where(df['profile_id'].notna(), None)
+    df['success_rate'] = (df['successes'] / df['actions'] * 100).round(1)
+    df['last_active'] = pd.to_datetime(df['last_active'], errors='coerce')
+    tz = series_timezone()
+    if tz != "UTC":
+        df['last_active'] = df['last_active'].dt.tz_localize("UTC").dt.tz_convert(tz).dt.tz_localize(None)
+    return df[PROFILE_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,299 @@
+"""
+Daily rollup of twitter_actions, maintained incrementally with $merge.
+
+One rollup document per day x action class x initial outcome x rerun
+outcome holds the number of actions in that bucket, so the success KPIs,
+the rerun comparison and the time series cost O(days) instead of
+O(actions). Run `python rollup.py` (or `python rollup.py --full` to
+rebuild from scratch) from cron, or let the dashboard refresh it in a
+background thread.
+
+An incremental refresh only sees days with new `_id`s and the last
+ROLLUP_RECHECK_DAYS days. An action updated in place on an older day (a
+late rerun result, a corrected date) stays stale until the next full
+rebuild, so refresh_rollup() rebuilds everything once the last full
+rebuild is older than ROLLUP_FULL_REBUILD_INTERVAL. Set it to 0 only if a
+`--full` cron job does that instead.
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from classify import INITIAL_OUTCOME_EXPR, RERUN_OUTCOME_EXPR
+from logger import setup_logger
+from metrics import CLASSIFIED_ACTION_EXPR, densify_stages, empty_rerun_metrics
+from tenant import mark_refresh_stale, throttled_refresh
+
+logger = setup_logger(__name__)
+
+ROLLUP_COLLECTION = "twitter_actions_daily"
+META_COLLECTION = "dashboard_meta"
+
+# Days before today that are recomputed on every refresh, to pick up reruns
+# the bot records on recent actions
+DEFAULT_RECHECK_DAYS = 2
+
+# Seconds between refreshes triggered by the dashboard
+DEFAULT_REFRESH_INTERVAL = 60
+
+# Seconds between full rebuilds, which pick up in-place updates on older days
+DEFAULT_FULL_REBUILD_INTERVAL = 24 * 3600
+
+
+# UTC midnight of the action's date, or null when `date` isn't a BSON date
+DAY_EXPR = {
+    "$cond": [
+        {"$eq": [{"$type": "$date"}, "date"]},
+        {"$dateFromParts": {
+            "year": {"$year": "$date"},
+            "month": {"$month": "$date"},
+            "day": {"$dayOfMonth": "$date"}
+        }},
+        None
+    ]
+}
+
+# Documents whose `date` is not a BSON date, i.e. exactly those DAY_EXPR
+# puts in the day=null bucket
+UNDATED_FILTER = {"date": {"$not": {"$type": "date"}}}
+
+
+@dataclass
+class RollupSummary:
+    """All-time KPIs computed from the rollup."""
+    total: int = 0
+    successful: int = 0
+    rerun: dict = field(default_factory=empty_rerun_metrics)
+
+
+def _day_start(value):
+    return datetime(value.year, value.month, value.day)
+
+
+def rollup_pipeline(match, stamp):
+    """
+    Aggregation grouping the matched actions into rollup buckets and merging
+    them into the rollup collection.
+    """
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "day": DAY_EXPR,
+                # Precomputed labels where classify.py has set them
+                "action_class": CLASSIFIED_ACTION_EXPR,
+                "initial_outcome": {"$ifNull": ["$initial_outcome", INITIAL_OUTCOME_EXPR]},
+                "rerun_outcome": {"$ifNull": ["$rerun_outcome", RERUN_OUTCOME_EXPR]},
+            },
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 1,
+            "day": "$_id.day",
+            "action_class": "$_id.action_class",
+            "initial_outcome": "$_id.initial_outcome",
+            "rerun_outcome": "$_id.rerun_outcome",
+            "count": 1,
+            "refreshed_at": {"$literal": stamp},
+        }},
+        {"$merge": {
+            "into": ROLLUP_COLLECTION,
+            "on": "_id",
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+
+def _changed_days(collection, last_id, recheck_days):
+    """
+    Days touched by documents inserted after the watermark, plus the recheck window.
+
+    Returns:
+        tuple: (sorted days, whether new undated documents were inserted)
+    """
+    days = set()
+    undated = False
+    if last_id is not None:
+        for doc in collection.aggregate([
+            {"$match": {"_id": {"$gt": last_id}}},
+            {"$group": {"_id": DAY_EXPR}}
+        ]):
+            if doc["_id"] is None:
+                undated = True
+            else:
+                days.add(doc["_id"])
+    today = _day_start(datetime.utcnow())
+    for offset in range(recheck_days + 1):
+        days.add(today - timedelta(days=offset))
+    return sorted(days), undated
+
+
+def refresh_rollup(db, full=False, recheck_days=None):
+    """
+    Bring the rollup collection up to date.
+
+    Only the days touched by documents inserted since the last watermark
+    (plus the last few days, where reruns are still being recorded) are
+    reprocessed, and the undated bucket only if undated documents were
+    inserted; `full=True`, or a last full rebuild older than
+    ROLLUP_FULL_REBUILD_INTERVAL, rebuilds everything.
+
+    Args:
+        db (pymongo.database.Database): Dashboard database
+        full (bool): Recompute every bucket
+        recheck_days (int, optional): Days before today always recomputed
+
+    Returns:
+        int: Number of days reprocessed (-1 for a full rebuild)
+    """
+    if recheck_days is None:
+        recheck_days = int(os.getenv("ROLLUP_RECHECK_DAYS", DEFAULT_RECHECK_DAYS))
+    collection = db["twitter_actions"]
+    rollup = db[ROLLUP_COLLECTION]
+    meta = db[META_COLLECTION]
+    started = time.perf_counter()
+    stamp = datetime.utcnow()
+
+    # Capture the newest _id first, so inserts during the refresh are picked
+    # up next time
+    newest = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    watermark = meta.find_one({"_id": ROLLUP_COLLECTION}) or {}
+    last_id = watermark.get("last_id")
+    rebuild_interval = float(os.getenv("ROLLUP_FULL_REBUILD_INTERVAL", DEFAULT_FULL_REBUILD_INTERVAL))
+    rebuilt_at = watermark.get("rebuilt_at")
+    rebuild_due = rebuild_interval > 0 and (
+        rebuilt_at is None or (stamp - rebuilt_at).total_seconds() >= rebuild_interval
+    )
+    full = full or last_id is None or rebuild_due
+
+    if full:
+        collection.aggregate(rollup_pipeline({}, stamp))
+        rollup.delete_many({"refreshed_at": {"$lt": stamp}})
+        reprocessed = -1
+    else:
+        days, undated = _changed_days(collection, last_id, recheck_days)
+        matches = [{"date": {"$gte": day, "$lt": day + timedelta(days=1)}} for day in days]
+        if undated:
+            matches.append(UNDATED_FILTER)
+        collection.aggregate(rollup_pipeline({"$or": matches}, stamp))
+        # Buckets of those days that no longer have any action
+        rollup.delete_many({
+            "day": {"$in": days + [None] if undated else days},
+            "refreshed_at": {"$lt": stamp}
+        })
+        reprocessed = len(days)
+
+    watermark = {"last_id": newest["_id"] if newest else None, "refreshed_at": stamp}
+    if full:
+        watermark["rebuilt_at"] = stamp
+    meta.update_one({"_id": ROLLUP_COLLECTION}, {"$set": watermark}, upsert=True)
+    logger.info(
+        "Rollup refreshed (%s) in %.2fs",
+        "full rebuild" if full else "%s days" % reprocessed,
+        time.perf_counter() - started,
+    )
+    return reprocessed
+
+
+def mark_rollup_stale():
+    """Make the next ensure_rollup_fresh() call refresh the current tenant's rollup."""
+    mark_refresh_stale("rollup")
+
+
+def _rollup_built(db):
+    """Whether a refresh (by any process or cron) has built the rollup."""
+    try:
+        return db[META_COLLECTION].find_one({"_id": ROLLUP_COLLECTION, "last_id": {"$ne": None}}) is not None
+    except Exception as e:
+        logger.warning("Rollup state unavailable, falling back to raw queries: %s", e)
+        return False
+
+
+def ensure_rollup_fresh(db, max_age=None):
+    """
+    Start a refresh of the rollup in a background thread if the last refresh
+    by this process is older than `max_age`.
+
+    The refresh, including the periodic full rebuild, never runs inside the
+    caller's request: callers read the rollup as it is, or fall back to raw
+    queries until it has been built or while it can't be written (e.g. a
+    read-only database user).
+
+    Returns:
+        bool: True if the rollup can be read
+    """
+    if max_age is None:
+        max_age = float(os.getenv("ROLLUP_REFRESH_INTERVAL", DEFAULT_REFRESH_INTERVAL))
+    return throttled_refresh(
+        "rollup", lambda: refresh_rollup(db), max_age, background=True, ready=lambda: _rollup_built(db)
+    )
+
+
+def rollup_summary(db):
+    """
+    Total, successful and rerun comparison counts from the rollup.
+
+    Returns:
+        RollupSummary: All-time KPIs
+    """
+    summary = RollupSummary()
+    for doc in db[ROLLUP_COLLECTION].aggregate([
+        {"$group": {
+            "_id": {
+                "action_class": "$action_class",
+                "initial_outcome": "$initial_outcome",
+                "rerun_outcome": "$rerun_outcome"
+            },
+            "count": {"$sum": "$count"}
+        }}
+    ]):
+        bucket = doc["_id"]
+        count = doc["count"]
+        action_class = bucket["action_class"]
+        initial_success = bucket["initial_outcome"] == "success"
+        rerun_success = bucket["rerun_outcome"] == "success"
+
+        summary.total += count
+        if initial_success or (bucket["initial_outcome"] == "failed" and rerun_success):
+            summary.successful += count
+        if initial_success:
+            summary.rerun["initial"][action_class] += count
+        if initial_success or rerun_success:
+            summary.rerun["rerun"][action_class] += count
+    return summary
+
+
+def rollup_time_series(db, start_date, end_date, unit="day"):
+    """
+    Engagements per day, week or month from the rollup, shaped like the raw
+    time series pipeline output. The rollup's days are UTC days, so it can
+    only answer UTC series.
+
+    Returns:
+        list: [{"_id": bucket start, "engagements": n}, ...] gap-filled and sorted
+    """
+    return list(db[ROLLUP_COLLECTION].aggregate([
+        {"$match": {"day": {"$gte": _day_start(start_date), "$lte": end_date}}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$day", "unit": unit, "startOfWeek": "monday"}},
+            "engagements": {"$sum": "$count"}
+        }},
+        *densify_stages(start_date, end_date, unit)
+    ]))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+
+    from db import get_database
+
+    parser = argparse.ArgumentParser(description="Refresh the twitter_actions daily rollup")
+    parser.add_argument("--full", action="store_true", help="Rebuild every bucket from scratch")
+    args = parser.parse_args()
+
+    load_dotenv()
+    refresh_rollup(get_database(), full=args.full)
@@ -0,0 +1,158 @@
+"""
+Start the dashboard with a warm cache.
+
+Before the Streamlit server opens its port, this imports the dashboard,
+opens the MongoDB pool and runs the queries of a default page view (KPIs,
+first leaderboard pages, profile table, rerun comparison and the 7-day
+series) for every configured tenant, storing their results and chart
+figures in the process-wide caches that the Streamlit script runs read
+from. The port only opens once the warmup has finished (or
+DASHBOARD_WARMUP_TIMEOUT has passed), so a platform that waits for the
+port, like Cloud Run's default startup probe, routes the first visitor to
+a warm process.
+
+Usage:
+    python serve.py [streamlit run options, e.g. --server.port=8080]
+"""
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DASHBOARD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "full-report.py")
+
+# Seconds to wait for the warmup before starting the server anyway
+DEFAULT_WARMUP_TIMEOUT = 120
+
+
+def load_dashboard():
+    """Import full-report.py as a module, sharing the cache, pool and query modules."""
+    # Streamlit warns about every st.* call made outside a script run
+    streamlit_logger = logging.getLogger("streamlit")
+    level = streamlit_logger.level
+    streamlit_logger.setLevel(logging.ERROR)
+    try:
+        spec = importlib.util.spec_from_file_location("dashboard_warmup", DASHBOARD_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        streamlit_logger.setLevel(level)
+    return module
+
+
+def warm_up_tenant(dashboard):
+    """
+    Run the data calls of a default page view for the current tenant and build its figures.
+
+    Returns:
+        bool: True if every call succeeded
+    """
+    from cache import result_cache, run_scope
+    from db import check_health
+    from metrics import default_series_window
+
+    if not check_health():
+        logger.error("Warmup: MongoDB is unreachable, starting cold")
+        return False
+
+    # Same background work main() starts on the first view
+    dashboard.start_index_maintenance(dashboard.get_database)
+
+    with run_scope("warmup"):
+        metrics = dashboard.load_dashboard_metrics()
+        series_start, series_end = default_series_window()
+        time_series = dashboard.get_engagement_time_series_with_filter(series_start, series_end)
+        pages = {board: dashboard.get_leaderboard_page(board) for board in dashboard.BOARDS}
+        dashboard.get_profile_performance()
+
+    dashboard.success_ratio_figure(metrics.success_ratio)
+    dashboard.rerun_comparison_figure(metrics.rerun)
+    if not time_series.empty:
+        dashboard.trend_figure(time_series, series_start, series_end, "last7d", "day")
+    for board, page in pages.items():
+        if not page.rows.empty:
+            dashboard.leaderboard_figure(page.rows, dashboard.BOARDS[board].label_column)
+
+    logger.info("Warmup: %.0f KiB cached", result_cache.size_bytes / 1024)
+    return True
+
+
+def warm_up():
+    """
+    Import the dashboard and warm every configured tenant.
+
+    Returns:
+        bool: True if every tenant was warmed successfully
+    """
+    from tenant import tenant_names, use_tenant
+
+    started = time.perf_counter()
+    dashboard = load_dashboard()
+    logger.info("Warmup: dashboard imported in %.2fs", time.perf_counter() - started)
+
+    ok = True
+    for name in tenant_names():
+        tenant_started = time.perf_counter()
+        with use_tenant(name):
+            warmed = warm_up_tenant(dashboard)
+        logger.info(
+            "Warmup: tenant %s %s after %.2fs", name, "warm" if warmed else "cold", time.perf_counter() - tenant_started
+        )
+        ok = ok and warmed
+
+    logger.info("Warmup: finished in %.2fs", time.perf_counter() - started)
+    return ok
+
+
+def warm_up_with_timeout(timeout):
+    """
+    Run warm_up() in a thread for at most `timeout` seconds.
+
+    A warmup still running after the timeout continues in the background.
+
+    Returns:
+        bool: True if the warmup finished successfully in time
+    """
+    result = {}
+
+    def run():
+        try:
+            result["ok"] = warm_up()
+        except Exception as e:
+            logger.error("Warmup failed: %s", e)
+            result["ok"] = False
+
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        logger.warning("Warmup still running after %ss, starting the server anyway", timeout)
+        return False
+    return result["ok"]
+
+
+def main(argv=None):
+    load_dotenv()
+    if os.getenv("DASHBOARD_WARMUP", "1") != "0":
+        timeout = float(os.getenv("DASHBOARD_WARMUP_TIMEOUT", DEFAULT_WARMUP_TIMEOUT))
+        ready = warm_up_with_timeout(timeout)
+        print(f"Dashboard {'warm' if ready else 'starting cold'}, starting Streamlit", file=sys.stderr)
+
+    # Same process, so the script runs find the warmed caches and pool
+    from streamlit.web import cli
+
+    args = sys.argv[1:] if argv is None else argv
+    sys.argv = ["streamlit", "run", DASHBOARD_PATH, *args]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Compact in-memory copy of the twitter_actions fields the dashboard reads.
+
+The snapshot keeps `date`, `name`, `username`, `action`, `result`, `rerun`
+and `profile_id` for every document, with the text fields stored as pandas
+categoricals: the bot writes a handful of distinct action/result strings
+and a bounded set of names, so each row costs a few bytes plus its date.
+Every dashboard metric is then a vectorized pandas operation over it.
+
+Refreshes are incremental: documents with an `_id` above the watermark
+are appended, and the last SNAPSHOT_RECHECK_DAYS days (by `date`) are
+reloaded to pick up reruns. A full reload every
+SNAPSHOT_FULL_RELOAD_INTERVAL seconds also drops deleted documents.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from breakdown import breakdown_frame
+from classify import action_type_of, initial_outcome_of, rerun_outcome_of
+from logger import setup_logger
+from metrics import (
+    DashboardMetrics, bucket_range, default_series_window, empty_rerun_metrics, rerun_metrics,
+    series_timezone, series_unit, time_series_frame, to_utc, truncate_series
+)
+from profiles import profile_frame
+from tenant import tenant_resource
+
+logger = setup_logger(__name__)
+
+# Fields copied from MongoDB
+SNAPSHOT_FIELDS = ['date', 'name', 'username', 'action', 'result', 'rerun', 'profile_id']
+
+# Text fields stored as categoricals
+CATEGORY_FIELDS = ['name', 'username', 'action', 'result', 'rerun', 'profile_id']
+
+DEFAULT_REFRESH_INTERVAL = 30
+DEFAULT_RECHECK_DAYS = 2
+DEFAULT_FULL_RELOAD_INTERVAL = 3600
+DEFAULT_BATCH_SIZE = 10000
+
+
+def _as_datetime(value):
+    return value if isinstance(value, datetime) else None
+
+
+def _map_categories(column, func):
+    """Apply `func` to each category (and once to missing values) instead of to each row."""
+    labels = np.array([func(category) for category in column.cat.categories] + [func(None)], dtype=object)
+    # Missing values have code -1, which picks the last label
+    return pd.Categorical(labels[column.cat.codes.to_numpy()])
+
+
+def _lower_key(value):
+    return None if value is None else str(value).lower()
+
+
+def _as_text(value):
+    return None if value is None else str(value)
+
+
+def documents_frame(docs):
+    """
+    Convert documents into snapshot rows.
+
+    `date` keeps only BSON dates (NaT otherwise), like the time series
+    aggregation, which only matches date values.
+
+    Returns:
+        pandas.DataFrame: SNAPSHOT_FIELDS columns, text fields as categoricals
+    """
+    frame = pd.DataFrame(docs, columns=SNAPSHOT_FIELDS, dtype=object)
+    frame['date'] = pd.to_datetime(frame['date'].map(_as_datetime), errors='coerce')
+    for column in CATEGORY_FIELDS:
+        frame[column] = frame[column].where(frame[column].notna(), None).astype('category')
+    return frame
+
+
+def derive_columns(frame):
+    """
+    Add the classification and case-insensitive username columns, computed
+    once per distinct value.
+    """
+    frame['action_type'] = _map_categories(frame['action'], action_type_of)
+    frame['initial_outcome'] = _map_categories(frame['result'], initial_outcome_of)
+    frame['rerun_outcome'] = _map_categories(frame['rerun'], rerun_outcome_of)
+    frame['username_key'] = _map_categories(frame['username'], _lower_key)
+    return frame
+
+
+def _combine(frames):
+    """Concatenate snapshot frames, re-categorizing the text columns."""
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return derive_columns(documents_frame([]))
+    frame = pd.concat([frame[SNAPSHOT_FIELDS] for frame in frames], ignore_index=True)
+    for column in CATEGORY_FIELDS:
+        frame[column] = frame[column].astype('category')
+    return derive_columns(frame)
+
+
+class ActionSnapshot:
+    """The snapshot frame, its watermark and the metrics computed from it."""
+
+    def __init__(self, get_collection):
+        self.get_collection = get_collection
+        self.frame = None
+        self.last_id = None
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+        self.last_refresh_seconds = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.frame is not None
+
+    def _load(self, collection, query):
+        batch_size = int(os.getenv("SNAPSHOT_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        projection = {field: 1 for field in SNAPSHOT_FIELDS}
+        cursor = collection.find(query, projection, batch_size=batch_size).sort("_id", 1)
+        frames, docs, last_id = [], [], None
+        for doc in cursor:
+            docs.append(doc)
+            if len(docs) >= batch_size:
+                frames.append(documents_frame(docs))
+                docs = []
+            last_id = doc["_id"]
+        if docs:
+            frames.append(documents_frame(docs))
+        return frames, last_id
+
+    def refresh(self, full=False):
+        """
+        Bring the snapshot up to date.
+
+        Args:
+            full (bool): Reload every document instead of the new and recent ones
+        """
+        started = time.perf_counter()
+        collection = self.get_collection()
+        full = full or self.frame is None or (
+            time.monotonic() - self.loaded_at
+            >= float(os.getenv("SNAPSHOT_FULL_RELOAD_INTERVAL", DEFAULT_FULL_RELOAD_INTERVAL))
+        )
+
+        if full:
+            frames, last_id = self._load(collection, {})
+            frame = _combine(frames)
+            loaded_at = time.monotonic()
+        else:
+            recheck_days = int(os.getenv("SNAPSHOT_RECHECK_DAYS", DEFAULT_RECHECK_DAYS))
+            cutoff = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=recheck_days)
+            id_bound = {"$lte": self.last_id} if self.last_id is not None else {"$exists": True}
+            recent, _ = self._load(collection, {"date": {"$gte": cutoff}, "_id": id_bound})
+            new_query = {"_id": {"$gt": self.last_id}} if self.last_id is not None else {}
+            new, last_id = self._load(collection, new_query)
+            # Recent rows are replaced by their current version
+            kept = self.frame[~(self.frame['date'] >= cutoff)]
+            frame = _combine([kept] + recent + new)
+            last_id = last_id if last_id is not None else self.last_id
+            loaded_at = self.loaded_at
+
+        with self._lock:
+            self.frame = frame
+            self.last_id = last_id
+            self.loaded_at = loaded_at
+        self.refreshed_at = time.monotonic()
+        self.last_refresh_seconds = time.perf_counter() - started
+        logger.info(
+            "Snapshot %s: %s rows, %.1f MiB in %.2fs",
+            "loaded" if full else "refreshed",
+            len(frame),
+            self.memory_bytes() / 1024 / 1024,
+            self.last_refresh_seconds,
+        )
+
+    def mark_stale(self):
+        """Make the next fresh() call refresh the snapshot."""
+        self.refreshed_at = 0.0
+
+    def fresh(self, max_age=None):
+        """
+        Refresh the snapshot if it is older than `max_age` seconds.
+
+        Only one thread refreshes at a time; the others use the current frame.
+
+        Returns:
+            ActionSnapshot: self, or None if it has never loaded successfully
+        """
+        if max_age is None:
+            max_age = float(os.getenv("SNAPSHOT_REFRESH_INTERVAL", DEFAULT_REFRESH_INTERVAL))
+        if time.monotonic() - self.refreshed_at >= max_age and self._refresh_lock.acquire(blocking=False):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("Snapshot refresh failed: %s", e)
+                self.refreshed_at = time.monotonic()
+            finally:
+                self._refresh_lock.release()
+        return self if self.ready else None
+
+    def memory_bytes(self):
+        """Memory used by the snapshot frame, including category labels."""
+        frame = self.frame
+        return int(frame.memory_usage(deep=True).sum()) if frame is not None else 0
+
+    def memory_report(self):
+        """
+        Per-column memory use.
+
+        Returns:
+            pandas.DataFrame: Columns ['column', 'dtype', 'bytes']
+        """
+        frame = self.frame
+        if frame is None:
+            return pd.DataFrame(columns=['column', 'dtype', 'bytes'])
+        usage = frame.memory_usage(deep=True, index=False)
+        return pd.DataFrame({
+            'column': usage.index,
+            'dtype': [str(frame[column].dtype) for column in usage.index],
+            'bytes': usage.values,
+        })
+
+    # Metrics, each one vectorized over the frame
+
+    def total(self):
+        return len(self.frame)
+
+    def successful(self):
+        frame = self.frame
+        mask = (frame['initial_outcome'] == "success") | (
+            (frame['initial_outcome'] == "failed") & (frame['rerun_outcome'] == "success")
+        )
+        return int(mask.sum())
+
+    def rerun(self):
+        frame = self.frame
+        initial = frame['initial_outcome'] == "success"
+        rerun = initial | (frame['rerun_outcome'] == "success")
+
+        def per_class(mask):
+            counts = frame.loc[mask, 'action_type'].value_counts()
+            return [{"_id": key, "count": int(count)} for key, count in counts.items()]
+
+        return rerun_metrics(per_class(initial), per_class(rerun))
+
+    def leaderboard_entries(self, board):
+        """
+        Every celebrity or user as an unranked {key, label, engagements} entry.
+
+        Args:
+            board (str): "celebrities" or "users"
+        """
+        if board == "celebrities":
+            frame = self.frame[self.frame['username'].notna()]
+            grouped = frame.groupby('username_key', observed=True, sort=False)['username'].agg(['first', 'size'])
+            return [
+                {"key": key, "label": row['first'], "engagements": int(row['size'])}
+                for key, row in grouped[grouped['size'] > 0].iterrows()
+            ]
+        counts = self.frame['name'].value_counts(dropna=False)
+        return [
+            {"key": None if pd.isna(name) else name, "label": None if pd.isna(name) else name, "engagements": int(count)}
+            for name, count in counts[counts > 0].items()
+        ]
+
+    def profiles(self):
+        """Per-profile performance, shaped like the profile_stages() aggregation."""
+        frame = self.frame
+        recovered = (frame['initial_outcome'] == "failed") & (frame['rerun_outcome'] == "success")
+        rows = pd.DataFrame({
+            "_id": np.asarray(_map_categories(frame['profile_id'], _as_text), dtype=object),
+            "name": frame['name'].astype(object),
+            "successes": (frame['initial_outcome'] == "success") | recovered,
+            "reruns_recovered": recovered,
+            "date": frame['date'],
+        })
+        grouped = rows.groupby('_id', dropna=False, sort=False).agg(
+            name=('name', 'first'),
+            actions=('successes', 'size'),
+            successes=('successes', 'sum'),
+            reruns_recovered=('reruns_recovered', 'sum'),
+            last_active=('date', 'max'),
+        ).reset_index()
+        grouped = grouped.sort_values(['actions', '_id'], ascending=[False, True], na_position='first')
+        return profile_frame(grouped.to_dict('records'))
+
+    def breakdown(self, start_date, end_date, unit=None):
+        """Engagements per (bucket, action class, outcome), like breakdown_stages()."""
+        unit = unit or series_unit(start_date, end_date)
+        tz = series_timezone()
+        frame = self.frame
+        dates = frame['date']
+        rows = frame[(dates >= to_utc(start_date, tz)) & (dates <= to_utc(end_date, tz))]
+        dates = rows['date']
+        if tz != "UTC":
+            dates = dates.dt.tz_localize("UTC").dt.tz_convert(tz).dt.tz_localize(None)
+        initial = rows['initial_outcome']
+        outcome = np.select(
+            [initial == "success", (initial == "failed") & (rows['rerun_outcome'] == "success")],
+            ["success", "recovered"],
+            "unsuccessful",
+        )
+        counts = pd.DataFrame({
+            "bucket": truncate_series(dates, unit),
+            "action_class": rows['action_type'].astype(object),
+            "outcome": outcome,
+        }).groupby(['bucket', 'action_class', 'outcome']).size()
+        return breakdown_frame([
+            {"bucket": bucket, "action_class": action_class, "outcome": outcome, "engagements": int(count)}
+            for (bucket, action_class, outcome), count in counts.items()
+        ])
+
+    def time_series(self, start_date, end_date, unit=None):
+        unit = unit or series_unit(start_date, end_date)
+        tz = series_timezone()
+        dates = self.frame['date']
+        in_range = dates[(dates >= to_utc(start_date, tz)) & (dates <= to_utc(end_date, tz))]
+        if tz != "UTC":
+            in_range = in_range.dt.tz_localize("UTC").dt.tz_convert(tz).dt.tz_localize(None)
+        counts = truncate_series(in_range, unit).value_counts()
+        # Gap-filled like the $densify output
+        counts = counts.reindex(pd.DatetimeIndex(bucket_range(start_date, end_date, unit)), fill_value=0)
+        return time_series_frame(
+            [{"_id": bucket, "engagements": int(count)} for bucket, count in counts.items()]
+        )
+
+    def metrics(self, series_start=None, series_end=None):
+        """
+        Every KPI section value from the snapshot.
+
+        Returns:
+            DashboardMetrics: Typed result used by the chart code
+        """
+        if series_start is None or series_end is None:
+            series_start, series_end = default_series_window()
+        if self.frame is None:
+            return DashboardMetrics(rerun=empty_rerun_metrics())
+        return DashboardMetrics(
+            total_engagements=self.total(),
+            successful_engagements=self.successful(),
+            rerun=self.rerun(),
+            time_series=self.time_series(series_start, series_end),
+            series_start=series_start,
+            series_end=series_end,
+        )
+
+
+def get_snapshot(get_collection):
+    """
+    Return the current tenant's snapshot (not loaded until the first `fresh()`).
+
+    Args:
+        get_collection (callable): Returns the twitter_actions collection
+    """
+    return tenant_resource("snapshot", lambda: ActionSnapshot(get_collection))
@@ -0,0 +1,280 @@
+"""
+Tenants: the databases one dashboard deployment serves.
+
+DASHBOARD_TENANTS lists them, either as comma-separated database names on
+MONGODB_URI, or as JSON mapping each tenant name to its settings:
+
+    {"fleet_a": {"database": "tweetbot_a"},
+     "fleet_b": {"uri": "mongodb+srv://...", "database": "tweetbot",
+                 "max_pool_size": 5, "cache_max_bytes": 16777216}}
+
+Without it there is a single tenant, "default", for MONGODB_URI and
+MONGODB_DATABASE.
+
+Code works for the tenant set with use_tenant() (a context variable, so it
+follows the query thread pool). Per-tenant resources, such as the MongoClient
+with its pool, the result cache, the snapshot and the live watcher, are
+created on first use through tenant_resource(). They are closed together
+once the tenant has not been used for TENANT_IDLE_SECONDS. Periodic jobs
+such as the rollup and leaderboard refreshes run at most once per interval
+per tenant through throttled_refresh().
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_TENANT = "default"
+
+# Seconds without any use after which a tenant's resources are closed
+DEFAULT_IDLE_SECONDS = 1800
+
+# Minimum seconds between two idle checks
+EVICTION_INTERVAL = 60
+
+
+@dataclass(frozen=True)
+class Tenant:
+    """One database served by the dashboard."""
+    name: str
+    database: str
+    uri: str = None
+    max_pool_size: int = None
+    cache_max_bytes: int = None
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_tenants(raw, default_database):
+    if not raw:
+        return {DEFAULT_TENANT: Tenant(DEFAULT_TENANT, default_database)}
+    if raw.lstrip().startswith("{"):
+        return {
+            name: Tenant(
+                name,
+                settings.get("database", name),
+                settings.get("uri"),
+                settings.get("max_pool_size"),
+                settings.get("cache_max_bytes"),
+            )
+            for name, settings in json.loads(raw).items()
+        }
+    names = [name.strip() for name in raw.split(",") if name.strip()]
+    return {name: Tenant(name, name) for name in names}
+
+
+def tenants():
+    """
+    Configured tenants, in configuration order.
+
+    Returns:
+        dict: Tenant name -> Tenant
+    """
+    return _parse_tenants(os.getenv("DASHBOARD_TENANTS", ""), os.getenv("MONGODB_DATABASE"))
+
+
+def tenant_names():
+    return list(tenants())
+
+
+_current = contextvars.ContextVar("tenant", default=None)
+
+
+def current_tenant():
+    """The tenant set by use_tenant(), or the first configured one."""
+    configured = tenants()
+    name = _current.get()
+    if name in configured:
+        return configured[name]
+    return next(iter(configured.values()))
+
+
+@contextmanager
+def use_tenant(name):
+    """
+    Work for tenant `name` inside the block.
+
+    Raises:
+        ValueError: If `name` isn't configured
+    """
+    if name not in tenants():
+        raise ValueError(f"Unknown tenant {name!r}")
+    token = _current.set(name)
+    try:
+        yield current_tenant()
+    finally:
+        _current.reset(token)
+
+
+class _TenantResources:
+    """Resources of one tenant and when it was last used."""
+
+    def __init__(self):
+        self.items = {}
+        self.closers = {}
+        self.last_used = time.monotonic()
+
+    def close(self):
+        # Newest first, so nothing is closed before what was built on it
+        for key, close in reversed(list(self.closers.items())):
+            try:
+                close(self.items[key])
+            except Exception as e:
+                logger.error("Error closing %s: %s", key, e)
+
+
+# Re-entrant: factories may ask for other resources of the same tenant
+_registry_lock = threading.RLock()
+_registry = {}
+_last_eviction = {"at": time.monotonic()}
+
+
+def tenant_resource(key, factory, close=None):
+    """
+    The current tenant's instance of a resource, created on first use.
+
+    Args:
+        key (str): Resource name
+        factory (callable): Creates the resource; runs for the current tenant
+        close (callable, optional): Releases the resource when the tenant is evicted
+
+    Returns:
+        The resource
+    """
+    name = current_tenant().name
+    _evict_idle_throttled()
+    with _registry_lock:
+        resources = _registry.get(name)
+        if resources is None:
+            resources = _registry[name] = _TenantResources()
+            logger.info("Tenant %s: creating resources", name)
+        resources.last_used = time.monotonic()
+        if key not in resources.items:
+            resources.items[key] = factory()
+            if close is not None:
+                resources.closers[key] = close
+        return resources.items[key]
+
+
+def existing_resources(key):
+    """
+    Every tenant's instance of a resource, without creating any or marking tenants used.
+
+    Returns:
+        dict: Tenant name -> resource
+    """
+    with _registry_lock:
+        return {name: resources.items[key] for name, resources in _registry.items() if key in resources.items}
+
+
+def drop_tenant_resource(key):
+    """Close and forget the current tenant's instance of a resource, if any."""
+    name = current_tenant().name
+    with _registry_lock:
+        resources = _registry.get(name)
+        if resources is None or key not in resources.items:
+            return
+        value = resources.items.pop(key)
+        close = resources.closers.pop(key, None)
+    if close is not None:
+        close(value)
+
+
+def _refresh_state(name):
+    """The current tenant's last run of refresh `name` (time and result) and the lock held during one."""
+    return tenant_resource(f"{name}_refresh", lambda: {"at": 0.0, "ok": None, "lock": threading.Lock()})
+
+
+def mark_refresh_stale(name):
+    """Make the next throttled_refresh() call for `name` run the refresh for the current tenant."""
+    _refresh_state(name)["at"] = 0.0
+
+
+def _run_refresh(name, refresh, state):
+    try:
+        refresh()
+        state["ok"] = True
+    except Exception as e:
+        logger.warning("%s refresh failed: %s", name.capitalize(), e)
+        state["ok"] = False
+    finally:
+        state["at"] = time.monotonic()
+        state["lock"].release()
+
+
+def throttled_refresh(name, refresh, max_age, background=False, ready=None):
+    """
+    Run `refresh` for the current tenant if its last run by this process is
+    older than `max_age` seconds.
+
+    Only one thread runs it at a time; other callers get the last result
+    without waiting. Failures are logged and retried after `max_age` too.
+
+    Args:
+        name (str): Name of the refresh, e.g. "rollup"
+        refresh (callable): Does the work, raising on failure
+        max_age (float): Seconds between two runs
+        background (bool): Run `refresh` in a daemon thread, for the same
+            tenant, instead of in the caller's
+        ready (callable, optional): Whether the refreshed data is usable
+            before this process has run `refresh` (e.g. built by cron)
+
+    Returns:
+        bool: True if the last run succeeded, or `ready()` before the first one finished
+    """
+    state = _refresh_state(name)
+    if state["ok"] is None:
+        state["ok"] = ready is not None and ready()
+    if time.monotonic() - state["at"] < max_age:
+        return state["ok"]
+    if not state["lock"].acquire(blocking=False):
+        return state["ok"]
+    if background:
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(_run_refresh, name, refresh, state), name=f"{name}-refresh", daemon=True
+        ).start()
+    else:
+        _run_refresh(name, refresh, state)
+    return state["ok"]
+
+
+def evict_tenant(name):
+    """Close every resource of tenant `name`."""
+    with _registry_lock:
+        resources = _registry.pop(name, None)
+    if resources is not None:
+        resources.close()
+        logger.info("Tenant %s: resources closed", name)
+
+
+def evict_idle(max_idle=None):
+    """
+    Close the resources of tenants unused for `max_idle` seconds.
+
+    Returns:
+        list: Names of the evicted tenants
+    """
+    if max_idle is None:
+        max_idle = float(os.getenv("TENANT_IDLE_SECONDS", DEFAULT_IDLE_SECONDS))
+    now = time.monotonic()
+    with _registry_lock:
+        idle = [name for name, resources in _registry.items() if now - resources.last_used >= max_idle]
+    for name in idle:
+        evict_tenant(name)
+    return idle
+
+
+def _evict_idle_throttled():
+    now = time.monotonic()
+    if now - _last_eviction["at"] < EVICTION_INTERVAL:
+        return
+    _last_eviction["at"] = now
+    evict_idle()
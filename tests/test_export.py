@@ -0,0 +1,48 @@
+import io
+import warnings
+from datetime import datetime
+
+import pytest
+
+from export import arrow_batch, arrow_schema
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+COLUMNS = ["date", "name"]
+
+
+def test_arrow_batch_mixed_precision_dates():
+    docs = [
+        {"date": "2025-03-01 12:00:00.123456", "name": "alice"},
+        {"date": datetime(2025, 3, 2, 8, 30, 0, 250000), "name": "bob"},
+        {"date": "2025-03-03T09:15:00Z", "name": 42},
+        {"date": "not a date"},
+        {"date": None},
+    ]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        table = arrow_batch(docs, COLUMNS, arrow_schema(COLUMNS))
+
+    assert table.schema == arrow_schema(COLUMNS)
+    assert table.column("date").to_pylist() == [
+        datetime(2025, 3, 1, 12, 0, 0, 123000),
+        datetime(2025, 3, 2, 8, 30, 0, 250000),
+        datetime(2025, 3, 3, 9, 15),
+        None,
+        None,
+    ]
+    assert table.column("name").to_pylist() == ["alice", "bob", "42", None, None]
+
+
+def test_parquet_round_trip():
+    schema = arrow_schema(COLUMNS)
+    output = io.BytesIO()
+    with pq.ParquetWriter(output, schema) as writer:
+        writer.write_table(arrow_batch([{"date": "2025-03-01 12:00:00.999999", "name": "a"}], COLUMNS, schema))
+        writer.write_table(arrow_batch([{"date": "2025-03-01", "name": "b"}], COLUMNS, schema))
+
+    output.seek(0)
+    table = pq.read_table(output)
+    assert table.column("date").to_pylist() == [datetime(2025, 3, 1, 12, 0, 0, 999000), datetime(2025, 3, 1)]
@@ -0,0 +1,75 @@
+from leaderboard import BOARDS, page_entries, rank_entries
+
+USERS = BOARDS["users"]
+
+
+def entries(*pairs):
+    return [{"key": key, "label": key, "engagements": count} for key, count in pairs]
+
+
+def test_rank_entries_orders_ties_by_key_with_null_first():
+    ranked = rank_entries(entries(("carol", 2), ("bob", 5), (None, 2), ("alice", 2)))
+
+    assert [entry["key"] for entry in ranked] == ["bob", None, "alice", "carol"]
+    assert [entry["rank"] for entry in ranked] == [1, 2, 3, 4]
+    assert [entry["cumulative"] for entry in ranked] == [5, 7, 9, 11]
+
+
+def test_page_boundaries():
+    ranked = rank_entries(entries(("a", 9), ("b", 7), ("c", 7), ("d", 3), ("e", 1)))
+
+    first = page_entries(USERS, ranked, size=2)
+    assert list(first.rows["name"]) == ["a", "b"]
+    assert first.first_rank == 1
+    assert first.next_after == (7, "b")
+    assert (first.others, first.others_count) == (11, 3)
+    assert (first.total, first.total_count) == (27, 5)
+
+    # The cursor splits the tie between b and c
+    second = page_entries(USERS, ranked, size=2, after=first.next_after)
+    assert list(second.rows["name"]) == ["c", "d"]
+    assert second.first_rank == 3
+    assert second.next_after == (3, "d")
+    assert (second.others, second.others_count) == (1, 1)
+
+    last = page_entries(USERS, ranked, size=2, after=second.next_after)
+    assert list(last.rows["name"]) == ["e"]
+    assert last.next_after is None
+    assert (last.others, last.others_count) == (0, 0)
+
+
+def test_exact_last_page_has_no_next():
+    ranked = rank_entries(entries(("a", 2), ("b", 1)))
+    page = page_entries(USERS, ranked, size=2)
+    assert page.next_after is None
+    assert page.others_count == 0
+
+
+def test_cursor_on_null_key():
+    ranked = rank_entries(entries((None, 4), ("a", 4), ("b", 1)))
+
+    first = page_entries(USERS, ranked, size=1)
+    assert first.next_after == (4, None)
+    second = page_entries(USERS, ranked, size=1, after=first.next_after)
+    assert list(second.rows["name"]) == ["a"]
+
+
+def test_paging_visits_every_entry_once():
+    ranked = rank_entries(entries(*[(f"k{i}", i % 4) for i in range(23)], (None, 2)))
+
+    seen, after = [], None
+    while True:
+        page = page_entries(USERS, ranked, size=5, after=after)
+        assert page.first_rank == len(seen) + 1
+        seen.extend(page.rows["engagements"])
+        after = page.next_after
+        if after is None:
+            break
+    assert seen == [entry["engagements"] for entry in ranked]
+
+
+def test_empty_board():
+    page = page_entries(BOARDS["celebrities"], [], size=5)
+    assert page.rows.empty
+    assert page.next_after is None
+    assert page.total == 0
@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+
+from live import LiveCounters, LiveWatcher
+
+
+def action(name="alice", username="Star", action="like", result="Success", rerun=None, day=1):
+    return {
+        "name": name,
+        "username": username,
+        "action": action,
+        "result": result,
+        "rerun": rerun,
+        "date": datetime(2025, 3, day, 12, tzinfo=timezone.utc),
+    }
+
+
+def watcher(*docs):
+    """A watcher whose counters hold `docs`, without a thread or a collection."""
+    live = LiveWatcher(get_collection=None, reseed_interval=0)
+    live._counters = LiveCounters()
+    for doc in docs:
+        live._counters.apply(doc)
+    return live
+
+
+def test_insert_counts_every_kpi():
+    live = watcher()
+    assert live._handle({"operationType": "insert", "fullDocument": action()})
+    assert live._handle({"operationType": "insert", "fullDocument": action(
+        name="bob", username="STAR", action="retweet", result="Failed", day=2
+    )})
+
+    counters = live._counters
+    assert counters.total == 2
+    assert counters.successful == 1
+    assert counters.rerun["initial"] == {"likes": 1, "retweets": 0, "comments": 0}
+    assert counters.rerun["rerun"] == {"likes": 1, "retweets": 0, "comments": 0}
+    # Celebrities are grouped case-insensitively under the first spelling seen
+    assert counters.celebrities == {"star": ["Star", 2]}
+    assert counters.users == {"alice": 1, "bob": 1}
+    assert counters.days == {"2025-03-01": 1, "2025-03-02": 1}
+    assert live.version == 2 and live.events == 2
+
+
+def test_update_moves_document_from_pre_image_to_post_image():
+    failed = action(action="comment", result="Failed")
+    live = watcher(failed)
+
+    assert live._handle({
+        "operationType": "update",
+        "fullDocumentBeforeChange": failed,
+        "fullDocument": {**failed, "rerun": "Success", "name": "bob"},
+    })
+
+    counters = live._counters
+    assert counters.total == 1
+    assert counters.successful == 1
+    assert counters.rerun["initial"]["comments"] == 0
+    assert counters.rerun["rerun"]["comments"] == 1
+    assert counters.users == {"bob": 1}
+
+
+def test_update_without_pre_image():
+    doc = action()
+    live = watcher(doc)
+
+    # Fields the counters don't read are ignored
+    assert live._handle({
+        "operationType": "update",
+        "fullDocument": {**doc, "note": "x"},
+        "updateDescription": {"updatedFields": {"note": "x"}, "removedFields": []},
+    })
+    # A counted field can't be applied without the old value
+    assert not live._handle({
+        "operationType": "update",
+        "fullDocument": {**doc, "result": "Failed"},
+        "updateDescription": {"updatedFields": {"result": "Failed"}, "removedFields": []},
+    })
+    assert live._counters.successful == 1
+
+
+def test_delete_removes_pre_image():
+    kept, deleted = action(), action(name="bob", username="Other", day=2)
+    live = watcher(kept, deleted)
+
+    assert live._handle({"operationType": "delete", "fullDocumentBeforeChange": deleted})
+
+    counters = live._counters
+    assert counters.total == 1
+    assert counters.celebrities == {"star": ["Star", 1]}
+    assert counters.users == {"alice": 1}
+    assert counters.days == {"2025-03-01": 1}
+
+
+def test_delete_without_pre_image_needs_reseed():
+    live = watcher(action())
+    assert not live._handle({"operationType": "delete"})
+    assert live._counters.total == 1
+
+
+def test_ranked_entries_follow_changes():
+    live = watcher(action(name="alice"), action(name="bob"), action(name="bob"))
+    assert [entry["key"] for entry in live.ranked_entries("users")] == ["bob", "alice"]
+
+    live._handle({"operationType": "insert", "fullDocument": action(name="alice")})
+    live._handle({"operationType": "insert", "fullDocument": action(name="alice")})
+    assert [entry["key"] for entry in live.ranked_entries("users")] == ["alice", "bob"]
@@ -0,0 +1,81 @@
+"""
+LiveWatcher against a real change stream.
+
+Needs a replica set (a single-node one is enough, see the README's live
+mode section) at LIVE_TEST_MONGODB_URI; skipped otherwise. The test works
+in its own database, dropped afterwards.
+"""
+import os
+import time
+from datetime import datetime, timezone
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure, PyMongoError
+
+from live import LiveWatcher, enable_pre_images
+
+DEFAULT_URI = "mongodb://localhost:27017/?directConnection=true"
+DATABASE = "tweetbot_live_test"
+
+
+@pytest.fixture
+def collection():
+    client = MongoClient(os.getenv("LIVE_TEST_MONGODB_URI", DEFAULT_URI), serverSelectionTimeoutMS=1000)
+    try:
+        replica_set = client.admin.command("hello").get("setName")
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"no MongoDB server: {e}")
+    if not replica_set:
+        client.close()
+        pytest.skip("MongoDB is not running as a replica set")
+    client.drop_database(DATABASE)
+    collection = client[DATABASE]["twitter_actions"]
+    collection.insert_one({"name": "alice", "username": "Star", "action": "like", "result": "Success",
+                           "date": datetime(2025, 3, 1, 12, tzinfo=timezone.utc)})
+    try:
+        yield collection
+    finally:
+        client.drop_database(DATABASE)
+        client.close()
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_watcher_follows_inserts_updates_and_deletes(collection):
+    try:
+        enable_pre_images(collection)
+    except OperationFailure:
+        pytest.skip("change stream pre-images need MongoDB 6.0+")
+
+    watcher = LiveWatcher(lambda: collection, reseed_interval=0)
+    watcher.start()
+    try:
+        assert wait_for(lambda: watcher.ready), watcher.error
+        assert watcher.metrics().total_engagements == 1
+
+        bob = collection.insert_one({"name": "bob", "username": "star", "action": "comment", "result": "Failed",
+                                     "date": datetime(2025, 3, 2, 12, tzinfo=timezone.utc)}).inserted_id
+        assert wait_for(lambda: watcher.metrics().total_engagements == 2)
+        assert watcher.metrics().successful_engagements == 1
+
+        # Applied from the pre- and post-images, without a reseed
+        collection.update_one({"_id": bob}, {"$set": {"rerun": "Success"}})
+        assert wait_for(lambda: watcher.metrics().successful_engagements == 2)
+        assert watcher.metrics().rerun["rerun"]["comments"] == 1
+
+        collection.delete_one({"name": "alice"})
+        assert wait_for(lambda: watcher.metrics().total_engagements == 1)
+        assert [entry["key"] for entry in watcher.ranked_entries("users")] == ["bob"]
+        assert watcher.ranked_entries("celebrities")[0]["engagements"] == 1
+        assert watcher.reseeds == 1
+    finally:
+        watcher.stop()